@@ -11,22 +11,54 @@ without hindering performance.
 * datadog.dogshell: a command-line tool, wrapping datadog.api, to interact with Datadog REST API.
 """
 # stdlib
+import importlib
 import logging
 import os
 import sys
 
 if sys.version_info[0] >= 3:
-    from typing import Any, List, Optional  # noqa: F401
+    from typing import Any, List, Optional, TYPE_CHECKING  # noqa: F401
 
 # datadog
-from datadog import api
 from datadog.dogstatsd import DogStatsd, statsd  # noqa
 from datadog.dogstatsd.base import DEFAULT_HOST, DEFAULT_PORT
-from datadog.threadstats import ThreadStats, datadog_lambda_wrapper, lambda_metric  # noqa
 from datadog.util.compat import iteritems, NullHandler, text
-from datadog.util.hostname import get_hostname
 from datadog.version import __version__  # noqa
 
+# Attributes whose modules are only imported on first access, so that `import datadog`
+# doesn't pay for the API client, its HTTP libraries and ThreadStats when they aren't used.
+# Maps each attribute to its module and name within the module (None for the module itself).
+_LAZY_ATTRIBUTES = {
+    "api": ("datadog.api", None),
+    "ThreadStats": ("datadog.threadstats", "ThreadStats"),
+    "datadog_lambda_wrapper": ("datadog.threadstats", "datadog_lambda_wrapper"),
+    "lambda_metric": ("datadog.threadstats", "lambda_metric"),
+    "get_hostname": ("datadog.util.hostname", "get_hostname"),
+}
+
+if sys.version_info[:2] >= (3, 7):
+    if TYPE_CHECKING:
+        from datadog import api  # noqa: F401
+        from datadog.threadstats import ThreadStats, datadog_lambda_wrapper, lambda_metric  # noqa: F401
+        from datadog.util.hostname import get_hostname  # noqa: F401
+
+    def __getattr__(name):
+        # type: (str) -> Any
+        try:
+            module_name, attribute = _LAZY_ATTRIBUTES[name]
+        except KeyError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        module = importlib.import_module(module_name)
+        value = module if attribute is None else getattr(module, attribute)
+        globals()[name] = value
+        return value
+
+else:
+    # Module-level __getattr__ requires Python 3.7+
+    from datadog import api  # noqa: F401
+    from datadog.threadstats import ThreadStats, datadog_lambda_wrapper, lambda_metric  # noqa: F401
+    from datadog.util.hostname import get_hostname  # noqa: F401
+
 # Loggers
 logging.getLogger("datadog.api").addHandler(NullHandler())
 logging.getLogger("datadog.dogstatsd").addHandler(NullHandler())
@@ -115,6 +147,62 @@ def initialize(
         from datadog.api.HTTPClient (default: True).
     :type mute: boolean
 
+    :param stream_compressed_payload: Compress the payloads of `compress_payload` submissions \
+        as they are sent, with a chunked upload, instead of compressing them in memory first (default: False).
+    :type stream_compressed_payload: boolean
+
+    :param batch_max_workers: Maximum number of API calls run concurrently by `api.batch` (default: 8). \
+        Must be set before the first batch.
+    :type batch_max_workers: int
+
+    :param pool_connections: Number of connection pools, i.e. hosts, kept by the HTTP client (default: 10). \
+        Must be set before the first API call, as the other connection pool settings.
+    :type pool_connections: int
+
+    :param pool_maxsize: Maximum number of connections kept alive per host (default: 10). \
+        More concurrent API calls open connections that are closed after use, unless `pool_block` is set.
+    :type pool_maxsize: int
+
+    :param pool_block: Make API calls wait for a connection of the pool when `pool_maxsize` are in use \
+        (default: False).
+    :type pool_block: boolean
+
+    :param keep_alive: Keep connections alive between API calls (default: True).
+    :type keep_alive: boolean
+
+    :param rate_limit_retries: Number of times API calls answered with HTTP 429 are retried, once the \
+        rate limit advertised by the `X-RateLimit-Reset` header resets (default: 3). Calls also wait for \
+        the rate limit to reset once exhausted. See `APIClient.rate_limit_stats`.
+    :type rate_limit_retries: int
+
+    :param rate_limit_max_wait: Maximum number of seconds to wait for a rate limit to reset, before \
+        a call or its retry (default: 60).
+    :type rate_limit_max_wait: float
+
+    :param cache_ttl: Cache the responses to GET requests for that many seconds, in process (default: 0, \
+        disabled). Writes to a resource invalidate its cached responses, and stale responses with an ETag are \
+        revalidated with `If-None-Match`.
+    :type cache_ttl: float
+
+    :param cache_max_entries: Maximum number of cached responses, least recently used ones being evicted \
+        first (default: 1000).
+    :type cache_max_entries: int
+
+    :param spool_path: Directory where the payloads of `api.Metric.send` and `api.Distribution.send` \
+        are spooled, compressed, when the API can't be reached: on timeouts, connection errors, server \
+        errors, or while backing off after too many timeouts (default: None, disabled). A background thread \
+        replays them once the API is reachable again, oldest first. Each process, forked ones included, \
+        spools to segments of its own, taken over once it exits. On Windows, where processes can't be \
+        told apart, the directory must not be shared by processes running at the same time.
+    :type spool_path: string
+
+    :param spool_max_size: Maximum size of the spool in bytes, its oldest payloads being dropped \
+        first (default: 64 MiB).
+    :type spool_max_size: int
+
+    :param spool_replay_interval: Number of seconds between attempts to replay the spool (default: 10).
+    :type spool_replay_interval: float
+
     :param return_raw_response: Whether or not to return the raw response object in addition \
         to the decoded response content (default: False)
     :type return_raw_response: boolean
@@ -128,6 +216,9 @@ def initialize(
     :type cardinality: string
 
     """
+    from datadog import api  # noqa: F811
+    from datadog.util.hostname import get_hostname  # noqa: F811
+
     # API configuration
     api._api_key = api_key or api._api_key or os.environ.get("DATADOG_API_KEY", os.environ.get("DD_API_KEY"))
     api._application_key = (
@@ -26,6 +26,27 @@ _max_retries = 3
 _backoff_period = 300
 _mute = True
 _return_raw_response = False
+_pool_connections = 10
+_pool_maxsize = 10
+_pool_block = False
+_keep_alive = True
+_stream_compressed_payload = False
+_batch_max_workers = 8
+_rate_limit_retries = 3
+_rate_limit_max_wait = 60
+
+# Response cache settings
+_cache_ttl = 0
+_cache_max_entries = 1000
+
+# Spool of the metric payloads that couldn't be sent
+_spool_path = None  # type: Optional[str]
+_spool_max_size = 64 * 1024 * 1024
+_spool_replay_interval = 10
+
+# Concurrent and asynchronous calls
+from datadog.api.batch_client import batch
+from datadog.api.async_client import aio
 
 # Resources
 from datadog.api.comments import Comment
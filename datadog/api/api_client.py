@@ -2,17 +2,32 @@
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
 # stdlib
+from functools import partial
 import json
 import logging
+import os
+import threading
 import time
 import zlib
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple, Type
 
 # datadog
 from datadog.api import _api_version, _max_timeouts, _backoff_period
-from datadog.api.exceptions import ClientError, ApiError, HttpBackoff, HttpTimeout, ApiNotInitialized
-from datadog.api.http_client import resolve_http_client
-from datadog.util.compat import is_p3k
+from datadog.api.exceptions import (
+    ClientError,
+    ApiError,
+    HttpBackoff,
+    HttpTimeout,
+    HTTPError,
+    ProxyError,
+    ApiNotInitialized,
+)
+from datadog.api.format import PayloadEncoder
+from datadog.api.http_client import _iter_content, _read_content, resolve_http_client
+from datadog.api.rate_limiter import RateLimiter
+from datadog.api.response_cache import ResponseCache
+from datadog.api.response_stream import iter_decompressed, iter_json, iter_text
+from datadog.api.spool import Spool, SpoolReplayer
 from datadog.util.format import construct_url, normalize_tags
 
 if TYPE_CHECKING:
@@ -21,6 +36,111 @@ if TYPE_CHECKING:
 
 log = logging.getLogger("datadog.api")
 
+# Set by `api.aio` resources while setting up an asynchronous call
+_async_calls = threading.local()
+
+# `datadog.api`, holding the settings set by `initialize`, on first use
+_api = None  # type: Any
+
+# Streamed JSON is handed over to the compressor in blocks of about that size
+_STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class EncodedBody(object):
+    """
+    A request body already encoded as JSON, and compressed with zlib if
+    `compressed` is set, that is sent as is.
+    """
+
+    def __init__(self, data, compressed=False):
+        # type: (bytes, bool) -> None
+        self.data = data
+        self.compressed = compressed
+
+
+def _get_api():
+    # type: () -> Any
+    """
+    Getter for the `datadog.api` module, to read its settings without importing
+    them on each call: they can be changed at any time.
+    """
+    global _api
+    if _api is None:
+        from datadog import api
+
+        _api = api
+    return _api
+
+
+def _resource_of(path):
+    # type: (str) -> str
+    """
+    Resource of an API endpoint, e.g. `monitor` for `monitor/1234/mute`.
+    """
+    return path.strip("/").split("/", 1)[0]
+
+
+def _attach_host_name(body, host_name):
+    # type: (Dict[str, Any], Optional[str]) -> None
+    """
+    Set the host name of a body, or of each of its series, unless set.
+    """
+    # Is it a 'series' list of objects ?
+    if "series" in body:
+        # Adding the host name to all objects
+        for obj_params in body["series"]:
+            if obj_params.get("host", "") == "":
+                obj_params["host"] = host_name
+    else:
+        if body.get("host", "") == "":
+            body["host"] = host_name
+
+
+def _iter_json(body, sort_keys=False):
+    # type: (Dict[str, Any], bool) -> Iterator[str]
+    """
+    Encode a dictionary to JSON, piece by piece: lists at the top level, like
+    the series of a metric submission, are encoded one item at a time.
+    """
+    encoder = PayloadEncoder(sort_keys=sort_keys)
+    yield "{"
+    for i, key in enumerate(sorted(body) if sort_keys else body):
+        if i:
+            yield ", "
+        yield encoder.encode(key) + ": "
+        value = body[key]
+        if isinstance(value, list):
+            yield "["
+            for j, item in enumerate(value):
+                if j:
+                    yield ", "
+                yield encoder.encode(item)
+            yield "]"
+        else:
+            yield encoder.encode(value)
+    yield "}"
+
+
+def _iter_compressed_json(body, sort_keys=False):
+    # type: (Dict[str, Any], bool) -> Iterator[bytes]
+    """
+    Encode a dictionary to JSON and compress it with zlib as it goes, so that
+    the body can be sent in chunks without holding it all in memory.
+    """
+    compressor = zlib.compressobj()
+    block = []  # type: List[str]
+    block_size = 0
+    for piece in _iter_json(body, sort_keys):
+        block.append(piece)
+        block_size += len(piece)
+        if block_size >= _STREAM_BLOCK_SIZE:
+            chunk = compressor.compress("".join(block).encode("utf-8"))
+            block = []
+            block_size = 0
+            if chunk:
+                yield chunk
+    yield compressor.compress("".join(block).encode("utf-8")) + compressor.flush()
+
 
 class APIClient(object):
     """
@@ -34,6 +154,18 @@ class APIClient(object):
     _backoff_timestamp = None  # type: Optional[float]
     _timeout_counter = 0
     _sort_keys = False
+    # Responses to GET requests, when caching is enabled
+    _response_cache = None  # type: Optional[ResponseCache]
+    # Rate limits by endpoint family, learnt from the responses
+    _rate_limiter = RateLimiter()
+    # Payloads that couldn't be sent, when spooling is enabled, and their replayer
+    _spool = None  # type: Optional[Spool]
+    _spool_replayer = None  # type: Optional[SpoolReplayer]
+    _spool_pid = None  # type: Optional[int]
+    _spool_lock = threading.Lock()
+
+    # Guards the backoff state, shared by concurrent calls
+    _backoff_lock = threading.Lock()
 
     # Plugged HTTP client
     _http_client = None
@@ -61,6 +193,8 @@ class APIClient(object):
         error_formatter=None,  # type: Optional[Any]
         suppress_response_errors_on_codes=None,  # type: Optional[List[int]]
         compress_payload=False,  # type: bool
+        lazy_response=False,  # type: bool
+        spool=False,  # type: bool
         **params  # type: Any
     ):
         # type: (...) -> Any
@@ -75,8 +209,9 @@ class APIClient(object):
 
         :param api_version: The API version used
 
-        :param body: dictionary to be sent in the body of the request
-        :type body: dictionary
+        :param body: dictionary to be sent in the body of the request, or an already encoded body.
+            `attach_host_name` and `compress_payload` don't apply to the latter.
+        :type body: dictionary or EncodedBody
 
         :param response_formatter: function to format JSON response from HTTP API request
         :type response_formatter: JSON input function
@@ -94,115 +229,475 @@ class APIClient(object):
         :param compress_payload: compress the payload using zlib
         :type compress_payload: bool
 
+        :param lazy_response: return an iterator parsing the response as it is read: the items of \
+            a JSON array, or the `(key, value)` members of an object, with arrays as iterators over \
+            their items. Errors are returned as usual.
+        :type lazy_response: bool
+
+        :param spool: spool the body to disk if the API can't be reached, to replay it later, \
+            when enabled with the `spool_path` setting
+        :type spool: bool
+
         :param params: dictionary to be sent in the query string of the request
         :type params: dictionary
 
         :returns: JSON or formatted response from HTTP API request
         """
+        async_submit = getattr(_async_calls, "submit", None)
+        if async_submit is not None:
+            # Set up by an asynchronous resource call: return a coroutine
+            return async_submit(
+                method,
+                path,
+                api_version,
+                body,
+                attach_host_name=attach_host_name,
+                response_formatter=response_formatter,
+                error_formatter=error_formatter,
+                suppress_response_errors_on_codes=suppress_response_errors_on_codes,
+                compress_payload=compress_payload,
+                lazy_response=lazy_response,
+                spool=spool,
+                **params
+            )
+
         try:
-            # Check if it's ok to submit
-            if not cls._should_submit():
-                _, backoff_time_left = cls._backoff_status()
-                raise HttpBackoff(backoff_time_left)
-
-            # Import API, User and HTTP settings
-            from datadog.api import (
-                _api_key,
-                _application_key,
-                _api_host,
-                _mute,
-                _host_name,
-                _proxies,
-                _max_retries,
-                _timeout,
-                _cacert,
-                _return_raw_response,
+            http_client = cls._get_http_client()
+            prepare_request, request, cached_result = cls._start_call(
+                method, path, api_version, body, attach_host_name, compress_payload, spool, params, http_client
             )
+            if cached_result is not None:
+                return cls._process_response(
+                    cached_result, response_formatter, suppress_response_errors_on_codes, lazy_response
+                )
 
-            # Check keys and add then to params
-            if _api_key is None:
-                raise ApiNotInitialized("API key is not set." " Please run 'initialize' method first.")
-
-            # Set api and app keys in headers
-            headers = {}
-            headers["DD-API-KEY"] = _api_key
-            if _application_key:
-                headers["DD-APPLICATION-KEY"] = _application_key
-
-            # Check if the api_version is provided
-            if not api_version:
-                api_version = _api_version
-
-            # Attach host name to body
-            if attach_host_name and body:
-                # Is it a 'series' list of objects ?
-                if "series" in body:
-                    # Adding the host name to all objects
-                    for obj_params in body["series"]:
-                        if obj_params.get("host", "") == "":
-                            obj_params["host"] = _host_name
-                else:
-                    if body.get("host", "") == "":
-                        body["host"] = _host_name
+            family = _resource_of(path)
+            retries = 0
+            while True:
+                delay = cls._rate_limit_delay(family)
+                if delay:
+                    time.sleep(delay)
+
+                start_time = time.time()
+                result = http_client.request(**request)
+                if not cls._should_retry(http_client, family, request, result, start_time, retries):
+                    break
+                retries += 1
+                request = cls._prepare_retry(prepare_request, request, result)
+
+            return cls._finish_call(
+                method, path, request, result, response_formatter, suppress_response_errors_on_codes, lazy_response
+            )
 
-            # If defined, make sure tags are defined as a comma-separated string
-            if "tags" in params and isinstance(params["tags"], list):
-                tag_list = normalize_tags(params["tags"])
-                params["tags"] = ",".join(tag_list)
+        except (HttpTimeout, HttpBackoff, HTTPError, ProxyError, ClientError, ApiError) as e:
+            return cls._fail_call(e, path, api_version, body, attach_host_name, error_formatter, spool)
 
-            # If defined, make sure monitor_ids are defined as a comma-separated string
-            if "monitor_ids" in params and isinstance(params["monitor_ids"], list):
-                params["monitor_ids"] = ",".join(str(i) for i in params["monitor_ids"])
+    @classmethod
+    def _start_call(
+        cls,
+        method,  # type: str
+        path,  # type: str
+        api_version,  # type: Optional[str]
+        body,  # type: Optional[Any]
+        attach_host_name,  # type: bool
+        compress_payload,  # type: bool
+        spool,  # type: bool
+        params,  # type: Dict[str, Any]
+        http_client,  # type: Any
+    ):
+        # type: (...) -> Tuple[Callable[[], Dict[str, Any]], Dict[str, Any], Optional[Any]]
+        """
+        Set up an API call, for `submit` and `AsyncAPIClient.submit`: return a function
+        preparing its request, the request, and the fresh cached response, if any.
+        """
+        if spool:
+            # Starts replaying the payloads spooled earlier
+            cls._get_spool()
+
+        prepare_request = partial(
+            cls._prepare_request,
+            method,
+            path,
+            api_version,
+            body,
+            attach_host_name,
+            compress_payload,
+            params,
+            supports_chunked_body=http_client.supports_chunked_body,
+            supports_streamed_response=getattr(http_client, "supports_streamed_response", False),
+        )
+        request = prepare_request()
+        return prepare_request, request, cls._get_cached_result(method, path, request)
+
+    @classmethod
+    def _should_retry(cls, http_client, family, request, result, start_time, retries):
+        # type: (Any, str, Dict[str, Any], Any, float, int) -> bool
+        """
+        Log the response to a request sent at `start_time`, and tell whether to retry it.
+        """
+        # Request succeeded: log it and reset the timeout counter
+        duration = round((time.time() - start_time) * 1000.0, 4)
+        log.info("%s %s %s (%sms)", result.status_code, request["method"], request["url"], duration)
+        cls._timeout_counter = 0
+        if log.isEnabledFor(logging.DEBUG) and hasattr(http_client, "pool_stats"):
+            log.debug("HTTP connection pools: %s", http_client.pool_stats())
+
+        return cls._should_retry_rate_limited(family, result, retries)
 
-            # Process the body, if necessary
+    @classmethod
+    def _prepare_retry(cls, prepare_request, request, result):
+        # type: (Callable[[], Dict[str, Any]], Dict[str, Any], Any) -> Dict[str, Any]
+        """
+        Release the connection of a rate limited response, and prepare its request
+        again, as streamed bodies can only be sent once, revalidating the same cached
+        response if any.
+        """
+        # Read to the end, for the connection to go back to the pool
+        _read_content(result)
+        close = getattr(result, "close", None)
+        if close is not None:
+            close()
+
+        etag = request["headers"].get("If-None-Match")
+        request = prepare_request()
+        if etag is not None:
+            request["headers"]["If-None-Match"] = etag
+        return request
+
+    @classmethod
+    def _finish_call(
+        cls, method, path, request, result, response_formatter, suppress_response_errors_on_codes, lazy_response
+    ):
+        # type: (str, str, Dict[str, Any], Any, Optional[Any], Optional[List[int]], bool) -> Any
+        """
+        Cache, decode and format the response of an API call.
+        """
+        result = cls._update_cache(method, path, request, result)
+        return cls._process_response(result, response_formatter, suppress_response_errors_on_codes, lazy_response)
+
+    @classmethod
+    def _fail_call(cls, e, path, api_version, body, attach_host_name, error_formatter, spool):
+        # type: (Exception, str, Optional[str], Optional[Any], bool, Optional[Any], bool) -> Any
+        """
+        Handle the error of an API call: count timeouts towards the backoff, spool the
+        body if requested, and return the formatted errors, or re-raise the error.
+        """
+        if isinstance(e, ApiError):
+            return cls._process_error(e, error_formatter)
+        if isinstance(e, HttpTimeout):
+            with cls._backoff_lock:
+                cls._timeout_counter += 1
+        if spool:
+            cls._spool_body(path, api_version, body, attach_host_name)
+        if isinstance(e, ClientError):
+            return cls._process_error(e, error_formatter)
+        raise e
+
+    @classmethod
+    def _prepare_request(
+        cls,
+        method,  # type: str
+        path,  # type: str
+        api_version,  # type: Optional[str]
+        body,  # type: Optional[Any]
+        attach_host_name,  # type: bool
+        compress_payload,  # type: bool
+        params,  # type: Dict[str, Any]
+        supports_chunked_body=False,  # type: bool
+        supports_streamed_response=False,  # type: bool
+    ):
+        # type: (...) -> Dict[str, Any]
+        """
+        Check that it's ok to submit, and return the arguments of the HTTP
+        client's `request` method for an API call.
+        """
+        # Check if it's ok to submit
+        if not cls._should_submit():
+            _, backoff_time_left = cls._backoff_status()
+            raise HttpBackoff(backoff_time_left)
+
+        # API, User and HTTP settings
+        api = _get_api()
+
+        # Check keys and add then to params
+        if api._api_key is None:
+            raise ApiNotInitialized("API key is not set." " Please run 'initialize' method first.")
+
+        # Set api and app keys in headers
+        headers = {}
+        headers["DD-API-KEY"] = api._api_key
+        if api._application_key:
+            headers["DD-APPLICATION-KEY"] = api._application_key
+
+        # Check if the api_version is provided
+        if not api_version:
+            api_version = _api_version
+
+        # Attach host name to body
+        if attach_host_name and isinstance(body, dict):
+            _attach_host_name(body, api._host_name)
+
+        # If defined, make sure tags are defined as a comma-separated string
+        if "tags" in params and isinstance(params["tags"], list):
+            tag_list = normalize_tags(params["tags"])
+            params["tags"] = ",".join(tag_list)
+
+        # If defined, make sure monitor_ids are defined as a comma-separated string
+        if "monitor_ids" in params and isinstance(params["monitor_ids"], list):
+            params["monitor_ids"] = ",".join(str(i) for i in params["monitor_ids"])
+
+        # Process the body, if necessary
+        data = body  # type: Any
+        if isinstance(body, EncodedBody):
+            headers["Content-Type"] = "application/json"
+            if body.compressed:
+                headers["Content-Encoding"] = "deflate"
+            data = body.data
+        elif compress_payload and api._stream_compressed_payload and isinstance(body, dict) and supports_chunked_body:
+            # Compressed as it is sent, with a chunked upload
+            headers["Content-Type"] = "application/json"
+            headers["Content-Encoding"] = "deflate"
+            data = _iter_compressed_json(body, sort_keys=cls._sort_keys)
+        else:
             if isinstance(body, dict):
-                body = json.dumps(body, sort_keys=cls._sort_keys)
+                data = PayloadEncoder(sort_keys=cls._sort_keys).encode(body)
                 headers["Content-Type"] = "application/json"
 
             if compress_payload:
-                assert body is not None
-                body = zlib.compress(body.encode("utf-8"))
+                assert data is not None
+                data = zlib.compress(data.encode("utf-8"))
                 headers["Content-Encoding"] = "deflate"
 
-            # Construct the URL
-            assert _api_host is not None
-            url = construct_url(_api_host, api_version, path)
-
-            # Process requesting
-            start_time = time.time()
-
-            result = cls._get_http_client().request(
-                method=method,
-                url=url,
-                headers=headers,
-                params=params,
-                data=body,
-                timeout=_timeout,
-                max_retries=_max_retries,
-                proxies=_proxies,
-                verify=_cacert,
-            )
+        # Construct the URL
+        assert api._api_host is not None
+        url = construct_url(api._api_host, api_version, path)
+
+        request = dict(
+            method=method,
+            url=url,
+            headers=headers,
+            params=params,
+            data=data,
+            timeout=api._timeout,
+            max_retries=api._max_retries,
+            proxies=api._proxies,
+            verify=api._cacert,
+        )
+        if supports_streamed_response:
+            # The body is read as it is decoded, see `_process_response`
+            request["stream"] = True
+        return request
 
-            # Request succeeded: log it and reset the timeout counter
-            duration = round((time.time() - start_time) * 1000.0, 4)
-            log.info("%s %s %s (%sms)" % (result.status_code, method, url, duration))
-            cls._timeout_counter = 0
+    @classmethod
+    def _rate_limit_delay(cls, family):
+        # type: (str) -> float
+        """
+        Reserve a call to an endpoint family, and return the number of seconds to wait
+        for its rate limit to reset first, if exhausted, up to `rate_limit_max_wait`.
+        """
+        delay = cls._rate_limiter.reserve(family)
+        if delay <= 0 or delay > _get_api()._rate_limit_max_wait:
+            return 0
+        log.info("Rate limit of %s exhausted, waiting %.2f seconds for it to reset", family, delay)
+        cls._rate_limiter.waited(family, delay)
+        return delay
 
-            # Format response content
-            content = result.content
+    @classmethod
+    def _should_retry_rate_limited(cls, family, result, retries):
+        # type: (str, Any, int) -> bool
+        """
+        Update the rate limit of an endpoint family from a response, and tell whether
+        to retry it, for HTTP 429 responses advertising when the limit resets.
+        """
+        reset = cls._rate_limiter.update(family, result.status_code, result.headers)
+        if reset is None:
+            return False
+        api = _get_api()
+        if retries >= api._rate_limit_retries or reset > api._rate_limit_max_wait:
+            return False
+        log.info("Rate limited on %s, retrying in %s seconds", family, reset)
+        cls._rate_limiter.retried(family)
+        return True
+
+    @classmethod
+    def rate_limit_stats(cls):
+        # type: () -> Dict[str, Dict[str, Any]]
+        """
+        Rate limits by endpoint family, i.e. API resource, as last advertised by the API,
+        and the calls made: `requests` sent, `rate_limited` with HTTP 429, `retries` of
+        those, and seconds `waited` for the limit to reset.
+        """
+        return cls._rate_limiter.stats()
 
-            if content and result.headers.get("Content-Encoding") == "gzip":
+    @classmethod
+    def _get_spool(cls):
+        # type: () -> Optional[Spool]
+        """
+        Getter for the spool, if enabled with the `spool_path` setting. Its replayer is
+        started along with it.
+        """
+        api = _get_api()
+        if not api._spool_path:
+            return None
+        with cls._spool_lock:
+            spool = cls._spool
+            # A forked child gets a spool of its own, as it writes segments of its own
+            if (
+                spool is None
+                or cls._spool_pid != os.getpid()
+                or (spool.path, spool.max_size) != (api._spool_path, api._spool_max_size)
+            ):
+                if cls._spool_replayer is not None:
+                    cls._spool_replayer.stop()
+                    cls._spool = cls._spool_replayer = None
                 try:
-                    content = zlib.decompress(content, zlib.MAX_WBITS | 16)
-                except zlib.error:
-                    pass
+                    spool = Spool(api._spool_path, api._spool_max_size)
+                except (IOError, OSError, ValueError) as e:
+                    log.error("Could not open the spool at %s: %s", api._spool_path, e)
+                    return None
+                cls._spool = spool
+                cls._spool_pid = os.getpid()
+            if cls._spool_replayer is None or not cls._spool_replayer.is_alive():
+                cls._spool_replayer = SpoolReplayer(spool, cls._send_spooled, api._spool_replay_interval)
+                cls._spool_replayer.start()
+            return spool
+
+    @classmethod
+    def _spool_body(cls, path, api_version, body, attach_host_name):
+        # type: (str, Optional[str], Any, bool) -> None
+        """
+        Spool the body of an API call that couldn't be sent, to replay it later.
+        """
+        spool = cls._get_spool()
+        if spool is None:
+            return
+        try:
+            if isinstance(body, EncodedBody):
+                data = body.data if body.compressed else zlib.compress(body.data)
+            else:
+                if attach_host_name and isinstance(body, dict):
+                    # Not attached yet while backing off
+                    _attach_host_name(body, _get_api()._host_name)
+                data = zlib.compress(PayloadEncoder(sort_keys=cls._sort_keys).encode(body).encode("utf-8"))
+            spool.append(path, api_version, data)
+        except (IOError, OSError) as e:
+            log.error("Could not spool a %s payload: %s", path, e)
+            return
+        log.info("Spooled a %s payload of %s bytes, to replay it later", path, len(data))
+
+    @classmethod
+    def _send_spooled(cls, path, api_version, data):
+        # type: (str, Optional[str], bytes) -> bool
+        """
+        Send a spooled body. Return False if the API still can't be reached, or True once
+        done with the body: accepted, or rejected by the API.
+        """
+        family = _resource_of(path)
+        try:
+            delay = cls._rate_limit_delay(family)
+            if delay:
+                time.sleep(delay)
+            request = cls._prepare_request(
+                "POST", path, api_version, EncodedBody(data, compressed=True), False, False, {}
+            )
+            result = cls._get_http_client().request(**request)
+        except HttpTimeout:
+            with cls._backoff_lock:
+                cls._timeout_counter += 1
+            return False
+        except (HttpBackoff, HTTPError, ProxyError, ClientError):
+            return False
+
+        cls._timeout_counter = 0
+        cls._rate_limiter.update(family, result.status_code, result.headers)
+        if result.status_code == 429:
+            return False
+        if not 200 <= result.status_code < 300:
+            log.error("Dropping a spooled %s payload rejected by the API: HTTP %s", path, result.status_code)
+        return True
+
+    @classmethod
+    def _get_response_cache(cls):
+        # type: () -> Optional[ResponseCache]
+        """
+        Getter for the response cache, if enabled with the `cache_ttl` setting.
+        """
+        api = _get_api()
+        if not api._cache_ttl:
+            return None
+        cache = cls._response_cache
+        if cache is None or (cache.ttl, cache.max_entries) != (api._cache_ttl, api._cache_max_entries):
+            cache = cls._response_cache = ResponseCache(api._cache_ttl, api._cache_max_entries)
+        return cache
+
+    @classmethod
+    def _get_cached_result(cls, method, path, request):
+        # type: (str, str, Dict[str, Any]) -> Optional[Any]
+        """
+        Return the fresh cached response to a GET request, if any. Stale responses with
+        an ETag are revalidated by the request.
+        """
+        cache = cls._get_response_cache()
+        if cache is None or method != "GET":
+            return None
+        entry = cache.get(cache.key(_resource_of(path), request))
+        if entry is None:
+            return None
+        if entry.is_fresh():
+            return entry.result
+        request["headers"]["If-None-Match"] = entry.etag
+        return None
+
+    @classmethod
+    def _update_cache(cls, method, path, request, result):
+        # type: (str, str, Dict[str, Any], Any) -> Any
+        """
+        Cache the response to a GET request, or invalidate the responses cached for
+        the resource written to. Return the response, or the cached one if still valid.
+        """
+        cache = cls._get_response_cache()
+        if cache is None:
+            return result
+        resource = _resource_of(path)
+        if method != "GET":
+            cache.invalidate(resource)
+            return result
+
+        key = cache.key(resource, request)
+        if result.status_code == 304:
+            entry = cache.get(key)
+            if entry is not None:
+                cache.refresh(key)
+                return entry.result
+        elif 200 <= result.status_code < 300:
+            cache.set(key, result)
+        return result
 
+    @classmethod
+    def _process_response(
+        cls, result, response_formatter=None, suppress_response_errors_on_codes=None, lazy_response=False
+    ):
+        # type: (Any, Optional[Any], Optional[List[int]], bool) -> Any
+        """
+        Decode and format the response of an API call, raising `ApiError` on errors.
+        """
+        return_raw_response = _get_api()._return_raw_response
+        if return_raw_response:
+            # Buffered for the caller
+            _read_content(result)
+
+        # Format response content, decompressed and decoded as it is read
+        body = _iter_content(result)
+        response_obj = None  # type: Any
+        if lazy_response and 200 <= result.status_code < 300:
+            chunks = iter_decompressed(cls._iter_lazy_content(body), result.headers.get("Content-Encoding"))
+            response_obj = iter_json(iter_text(chunks))
+        else:
+            chunks = iter_decompressed(body, result.headers.get("Content-Encoding"))
+            content = "".join(iter_text(chunks))
             if content:
                 try:
-                    if is_p3k():
-                        response_obj = json.loads(content.decode("utf-8"))
-                    else:
-                        response_obj = json.loads(content)
+                    response_obj = json.loads(content)
                 except ValueError:
                     raise ValueError("Invalid JSON response: {0}".format(content))
 
@@ -215,39 +710,49 @@ class APIClient(object):
                             and result.status_code in suppress_response_errors_on_codes
                         ):
                             raise ApiError(response_obj)
-            else:
-                response_obj = None
 
-            if response_formatter is not None:
-                response_obj = response_formatter(response_obj)
+        if response_formatter is not None:
+            response_obj = response_formatter(response_obj)
 
-            if _return_raw_response:
-                return response_obj, result
-            else:
-                return response_obj
+        if return_raw_response:
+            return response_obj, result
+        else:
+            return response_obj
 
+    @classmethod
+    def _iter_lazy_content(cls, body):
+        # type: (Iterator[bytes]) -> Iterator[bytes]
+        """
+        Iterate over the body of a lazy response, read once the call returned: count its
+        read timeouts towards the backoff, as those of the requests.
+        """
+        try:
+            for chunk in body:
+                yield chunk
         except HttpTimeout:
-            cls._timeout_counter += 1
+            with cls._backoff_lock:
+                cls._timeout_counter += 1
             raise
-        except ClientError as e:
-            if _mute:
-                log.error(str(e))
-                if error_formatter is None:
-                    return {"errors": e.args[0]}
-                else:
-                    return error_formatter({"errors": e.args[0]})
-            else:
-                raise
-        except ApiError as e:
-            if _mute:
-                for error in e.args[0].get("errors") or []:
-                    log.error(error)
-                if error_formatter is None:
-                    return e.args[0]
-                else:
-                    return error_formatter(e.args[0])
-            else:
-                raise
+
+    @classmethod
+    def _process_error(cls, e, error_formatter=None):
+        # type: (Exception, Optional[Any]) -> Any
+        """
+        Return the formatted errors of a `ClientError` or `ApiError`, or re-raise it if not muted.
+        """
+        if not _get_api()._mute:
+            raise e
+        if isinstance(e, ClientError):
+            log.error(str(e))
+            errors = {"errors": e.args[0]}
+        else:
+            for error in e.args[0].get("errors") or []:
+                log.error(error)
+            errors = e.args[0]
+        if error_formatter is None:
+            return errors
+        else:
+            return error_formatter(errors)
 
     @classmethod
     def _should_submit(cls):
@@ -256,43 +761,44 @@ class APIClient(object):
         Returns True if we're in a state where we should make a request
         (backoff expired, no backoff in effect), false otherwise.
         """
-        now = time.time()
-        should_submit = False
-
-        # If we're not backing off, but the timeout counter exceeds the max
-        # number of timeouts, then enter the backoff state, recording the time
-        # we started backing off
-        if not cls._backoff_timestamp and cls._timeout_counter >= cls._max_timeouts:
-            log.info(
-                "Max number of datadog timeouts exceeded, backing off for %s seconds",
-                cls._backoff_period,
-            )
-            cls._backoff_timestamp = now
+        with cls._backoff_lock:
+            now = time.time()
             should_submit = False
 
-        # If we are backing off but the we've waiting sufficiently long enough
-        # (backoff_retry_age), exit the backoff state and reset the timeout
-        # counter so that we try submitting metrics again
-        elif cls._backoff_timestamp:
-            backed_off_time, backoff_time_left = cls._backoff_status()
-            if backoff_time_left < 0:
+            # If we're not backing off, but the timeout counter exceeds the max
+            # number of timeouts, then enter the backoff state, recording the time
+            # we started backing off
+            if not cls._backoff_timestamp and cls._timeout_counter >= cls._max_timeouts:
                 log.info(
-                    "Exiting backoff state after %s seconds, will try to submit metrics again",
-                    backed_off_time,
-                )
-                cls._backoff_timestamp = None
-                cls._timeout_counter = 0
-                should_submit = True
-            else:
-                log.info(
-                    "In backoff state, won't submit metrics for another %s seconds",
-                    backoff_time_left,
+                    "Max number of datadog timeouts exceeded, backing off for %s seconds",
+                    cls._backoff_period,
                 )
+                cls._backoff_timestamp = now
                 should_submit = False
-        else:
-            should_submit = True
 
-        return should_submit
+            # If we are backing off but the we've waiting sufficiently long enough
+            # (backoff_retry_age), exit the backoff state and reset the timeout
+            # counter so that we try submitting metrics again
+            elif cls._backoff_timestamp:
+                backed_off_time, backoff_time_left = cls._backoff_status()
+                if backoff_time_left < 0:
+                    log.info(
+                        "Exiting backoff state after %s seconds, will try to submit metrics again",
+                        backed_off_time,
+                    )
+                    cls._backoff_timestamp = None
+                    cls._timeout_counter = 0
+                    should_submit = True
+                else:
+                    log.info(
+                        "In backoff state, won't submit metrics for another %s seconds",
+                        backoff_time_left,
+                    )
+                    should_submit = False
+            else:
+                should_submit = True
+
+            return should_submit
 
     @classmethod
     def _backoff_status(cls):
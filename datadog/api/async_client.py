@@ -0,0 +1,349 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Asynchronous API calls, e.g. `await api.aio.Monitor.get_all()`.
+
+Resources have the same methods as in `datadog.api`, returning awaitables.
+Requests go through `AsyncAPIClient`, which shares the request and response
+handling of `APIClient`, and its backoff state. They are sent with the 3rd
+party `aiohttp` module if available, over a connection pool per event loop,
+or else with the blocking HTTP client in the event loop's default executor.
+
+Methods making several calls, `Metric.query_range` and the `iter_*` methods,
+aren't asynchronous: they block the event loop while they fetch, as they do in
+`datadog.api`. Run them in an executor instead, e.g. with
+`loop.run_in_executor(None, api.Metric.query_range, ...)`.
+
+Warning: requires Python 3.5 or higher.
+"""
+# stdlib
+from functools import wraps
+import sys
+from typing import Any
+
+# datadog
+from datadog.api.api_client import _async_calls
+
+# Wrap the Python 3.5+ code in a docstring to avoid syntax errors on older
+# versions, as in `datadog.dogstatsd.context_async`.
+ASYNC_SOURCE = r'''
+import asyncio
+from functools import partial
+from inspect import isawaitable
+import logging
+import time
+import weakref
+
+from datadog.api.api_client import APIClient, _resource_of
+from datadog.api.exceptions import ApiError, ClientError, HttpBackoff, HTTPError, HttpTimeout, ProxyError
+from datadog.api.http_client import _get_user_agent_header, _remove_context
+
+# 3p, imported on first use only
+aiohttp = None
+
+log = logging.getLogger("datadog.api")
+
+
+class AsyncHTTPClient(object):
+    """
+    An abstract asynchronous HTTP client. Subclasses must implement the `request`
+    coroutine, with the same arguments, result and exceptions as `HTTPClient.request`.
+    """
+
+    supports_chunked_body = False
+
+    @classmethod
+    async def request(cls, method, url, headers, params, data, timeout, proxies, verify, max_retries):
+        raise NotImplementedError(u"Must be implemented by AsyncHTTPClient subclasses.")
+
+    @classmethod
+    async def close(cls):
+        """
+        Close the connections opened from the current event loop.
+        """
+
+
+class AiohttpResponse(object):
+    """
+    Response fields of an `aiohttp` request, as used by `APIClient`.
+    """
+
+    def __init__(self, status_code, reason, headers, content):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+
+class AiohttpClient(AsyncHTTPClient):
+    """
+    HTTP client based on 3rd party `aiohttp` module, using a session per event loop.
+    """
+
+    _sessions = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def _get_session(cls):
+        loop = asyncio.get_event_loop()
+        session = cls._sessions.get(loop)
+        if session is None or session.closed:
+            session = cls._sessions[loop] = aiohttp.ClientSession(headers={"User-Agent": _get_user_agent_header()})
+        return session
+
+    @staticmethod
+    def _format_params(params):
+        # Encoded like `requests` does
+        formatted = []
+        for key, value in params.items():
+            for v in value if isinstance(value, (list, tuple)) else [value]:
+                if v is not None:
+                    formatted.append((key, v if isinstance(v, str) else str(v)))
+        return formatted
+
+    @classmethod
+    async def request(cls, method, url, headers, params, data, timeout, proxies, verify, max_retries):
+        session = cls._get_session()
+        if isinstance(verify, str):
+            import ssl
+
+            verify = ssl.create_default_context(cafile=verify)
+        try:
+            retries = 0
+            while True:
+                try:
+                    async with session.request(
+                        method,
+                        url,
+                        headers=headers,
+                        params=cls._format_params(params or {}),
+                        data=data,
+                        timeout=aiohttp.ClientTimeout(total=timeout),
+                        proxy=(proxies or {}).get(url.split(":", 1)[0]),
+                        ssl=None if verify is True else verify,
+                    ) as response:
+                        content = await response.read()
+                        result = AiohttpResponse(response.status, response.reason, response.headers, content)
+                    break
+                except aiohttp.ClientConnectorError:
+                    # Connection errors are retried, as with `requests`
+                    if retries >= max_retries:
+                        raise
+                    retries += 1
+
+        except aiohttp.ClientProxyConnectionError as e:
+            raise _remove_context(ProxyError(method, url, e))
+        except asyncio.TimeoutError:
+            raise _remove_context(HttpTimeout(method, url, timeout))
+        except aiohttp.ClientConnectionError as e:
+            raise _remove_context(ClientError(method, url, e))
+
+        # 304 answers the revalidation of a cached response
+        if not 200 <= result.status_code < 300 and result.status_code not in (304, 400, 401, 403, 404, 409, 429):
+            raise HTTPError(result.status_code, result.reason)
+        return result
+
+    @classmethod
+    async def close(cls):
+        session = cls._sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+class ExecutorClient(AsyncHTTPClient):
+    """
+    Fallback running the blocking HTTP client of `APIClient` in the event loop's
+    default executor.
+    """
+
+    @classmethod
+    async def request(cls, method, url, headers, params, data, timeout, proxies, verify, max_retries):
+        return await asyncio.get_event_loop().run_in_executor(
+            None,
+            partial(
+                APIClient._get_http_client().request,
+                method=method,
+                url=url,
+                headers=headers,
+                params=params,
+                data=data,
+                timeout=timeout,
+                proxies=proxies,
+                verify=verify,
+                max_retries=max_retries,
+            ),
+        )
+
+
+def resolve_async_http_client():
+    """
+    Resolve an appropriate asynchronous HTTP client based on the user environment.
+    """
+    global aiohttp
+    try:
+        aiohttp = __import__("aiohttp")
+    except ImportError:
+        log.debug(u"Use the blocking HTTP client in an executor.")
+        return ExecutorClient
+
+    log.debug(u"Use `aiohttp` based HTTP client.")
+    return AiohttpClient
+
+
+class AsyncAPIClient(object):
+    """
+    Asynchronous counterpart of `APIClient`.
+    """
+
+    # Plugged HTTP client
+    _http_client = None
+
+    @classmethod
+    def _get_http_client(cls):
+        """
+        Getter for the embedded asynchronous HTTP client.
+        """
+        if not cls._http_client:
+            cls._http_client = resolve_async_http_client()
+
+        return cls._http_client
+
+    @classmethod
+    async def submit(
+        cls,
+        method,
+        path,
+        api_version=None,
+        body=None,
+        attach_host_name=False,
+        response_formatter=None,
+        error_formatter=None,
+        suppress_response_errors_on_codes=None,
+        compress_payload=False,
+        lazy_response=False,
+        spool=False,
+        **params
+    ):
+        """
+        Make an HTTP API request, as `APIClient.submit` does.
+        """
+        try:
+            http_client = cls._get_http_client()
+            prepare_request, request, cached_result = APIClient._start_call(
+                method, path, api_version, body, attach_host_name, compress_payload, spool, params, http_client
+            )
+            if cached_result is not None:
+                return APIClient._process_response(
+                    cached_result, response_formatter, suppress_response_errors_on_codes, lazy_response
+                )
+
+            family = _resource_of(path)
+            retries = 0
+            while True:
+                delay = APIClient._rate_limit_delay(family)
+                if delay:
+                    await asyncio.sleep(delay)
+
+                start_time = time.time()
+                result = await http_client.request(**request)
+                if not APIClient._should_retry(http_client, family, request, result, start_time, retries):
+                    break
+                retries += 1
+                request = APIClient._prepare_retry(prepare_request, request, result)
+
+            return APIClient._finish_call(
+                method, path, request, result, response_formatter, suppress_response_errors_on_codes, lazy_response
+            )
+
+        except (HttpTimeout, HttpBackoff, HTTPError, ProxyError, ClientError, ApiError) as e:
+            return APIClient._fail_call(e, path, api_version, body, attach_host_name, error_formatter, spool)
+
+
+async def _completed(result):
+    return result
+
+
+def _awaitable(result):
+    return result if isawaitable(result) else _completed(result)
+
+
+_submit = AsyncAPIClient.submit
+
+
+async def _close():
+    if AsyncAPIClient._http_client is not None:
+        await AsyncAPIClient._http_client.close()
+'''
+
+
+def _submit(*args, **kwargs):
+    # type: (*Any, **Any) -> Any
+    raise NotImplementedError(u"Asynchronous API calls require Python 3.5 or higher.")
+
+
+def _awaitable(result):
+    # type: (Any) -> Any
+    raise NotImplementedError(u"Asynchronous API calls require Python 3.5 or higher.")
+
+
+def _close():
+    # type: () -> Any
+    raise NotImplementedError(u"Asynchronous API calls require Python 3.5 or higher.")
+
+
+if sys.version_info >= (3, 5):
+    exec(compile(ASYNC_SOURCE, __file__, "exec"))
+
+
+class AsyncResource(object):
+    """
+    Asynchronous counterpart of an API resource: its methods return awaitables.
+    """
+
+    def __init__(self, resource):
+        # type: (type) -> None
+        self._resource = resource
+
+    def __getattr__(self, name):
+        # type: (str) -> Any
+        attr = getattr(self._resource, name)
+        if not callable(attr):
+            return attr
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            # type: (*Any, **Any) -> Any
+            # `APIClient.submit` returns a coroutine while the resource method runs
+            _async_calls.submit = _submit
+            try:
+                result = attr(*args, **kwargs)
+            finally:
+                _async_calls.submit = None
+            return _awaitable(result)
+
+        return call
+
+
+class AsyncAPI(object):
+    """
+    Asynchronous API resources, e.g. `await api.aio.Monitor.get_all()`.
+    """
+
+    def __getattr__(self, name):
+        # type: (str) -> AsyncResource
+        from datadog import api
+
+        resource = getattr(api, name)
+        if not isinstance(resource, type):
+            raise AttributeError(name)
+        return AsyncResource(resource)
+
+    def close(self):
+        # type: () -> Any
+        """
+        Close the connections opened from the current event loop: `await api.aio.close()`.
+        """
+        return _close()
+
+
+aio = AsyncAPI()
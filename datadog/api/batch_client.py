@@ -0,0 +1,72 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Concurrent API calls, run on a shared thread pool.
+"""
+# stdlib
+import logging
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor  # noqa: F401
+
+    Call = Union[Callable[[], Any], Tuple[Any, ...]]
+
+
+log = logging.getLogger("datadog.api")
+
+# Shared thread pool, created on first use
+_executor = None  # type: Optional[ThreadPoolExecutor]
+_executor_lock = Lock()
+
+
+def _get_executor():
+    # type: () -> ThreadPoolExecutor
+    """
+    Getter for the shared thread pool, sized after `api._batch_max_workers`.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Not imported with the module, as few users need it
+            from concurrent.futures import ThreadPoolExecutor  # noqa: F811
+            from datadog.api import _batch_max_workers
+
+            _executor = ThreadPoolExecutor(max_workers=_batch_max_workers)
+        return _executor
+
+
+def _run(call):
+    # type: (Call) -> Any
+    if callable(call):
+        return call()
+    func = call[0]
+    args = call[1] if len(call) > 1 else ()
+    kwargs = call[2] if len(call) > 2 else {}
+    return func(*args, **kwargs)
+
+
+def batch(calls):
+    # type: (Iterable[Call]) -> List[Future]
+    """
+    Run API calls concurrently, on a thread pool of at most `batch_max_workers`
+    threads (see `initialize`) sharing the HTTP client's connection pool.
+
+    :param calls: API calls to run, as callables taking no arguments, or as \
+        `(function, args)` or `(function, args, kwargs)` tuples
+    :type calls: iterable
+
+    :returns: A `concurrent.futures.Future` per call, in the same order. Each \
+        future holds the call's response, or the exception it raised.
+
+    Calls go through `APIClient.submit` as usual: while it backs off after too
+    many timeouts, the remaining calls fail fast with `HttpBackoff`. With `mute`
+    enabled, errors returned by the API are in the responses.
+
+    >>> futures = api.batch((api.Monitor.mute, (monitor_id,)) for monitor_id in monitor_ids)
+    >>> responses = [future.result() for future in futures]
+    """
+    executor = _get_executor()
+    return [executor.submit(_run, call) for call in calls]
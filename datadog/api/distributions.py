@@ -12,6 +12,7 @@ class Distribution(SendableAPIResource):
     """A wrapper around Distribution HTTP API"""
 
     _resource_name = "distribution_points"
+    _spool_failed_sends = True
 
     @classmethod
     def send(  # type: ignore[override]
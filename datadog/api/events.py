@@ -1,9 +1,10 @@
 # Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional
 
 from datadog.api.exceptions import ApiError
+from datadog.api.pagination import iter_items, iter_pages, next_page_number
 from datadog.api.resources import GetableAPIResource, CreateableAPIResource, SearchableAPIResource
 
 
@@ -14,6 +15,8 @@ class Event(GetableAPIResource, CreateableAPIResource, SearchableAPIResource):
 
     _resource_name = "events"
     _timestamp_keys = frozenset({"start", "end"})
+    # Number of events per page of `query`
+    _page_size = 1000
 
     @classmethod
     def create(cls, attach_host_name=True, method="POST", id=None, params=None, **body):
@@ -97,3 +100,27 @@ class Event(GetableAPIResource, CreateableAPIResource, SearchableAPIResource):
         params = {k: timestamp_to_integer(k, v) for k, v in params.items()}
 
         return super(Event, cls)._search(**params)
+
+    @classmethod
+    def iter_query(cls, prefetch=False, **params):
+        # type: (bool, **Any) -> Iterator[Any]
+        """
+        Iterate over all the events matching a query, fetching them lazily one page
+        of 1000 events at a time.
+
+        :param prefetch: fetch the next page in the background while iterating
+        :type prefetch: bool
+
+        Other parameters are the same as `query`.
+
+        :returns: Iterator over the events, as dictionaries
+
+        >>> for event in api.Event.iter_query(start=1313769783, end=1419436870):
+        ...     print(event["title"])
+        """
+        params["page"] = params.get("page", 0)
+        events = lambda page: page.get("events", [])  # noqa: E731
+        return iter_items(
+            iter_pages(cls.query, params, next_page_number("page", cls._page_size, events), prefetch=prefetch),
+            events,
+        )
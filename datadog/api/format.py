@@ -1,30 +1,184 @@
 # Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
+from array import array
+import json
 from numbers import Number
 import sys
 import time
-from typing import Any, List, Tuple, cast
+from typing import Any, List, Optional, Tuple, Union, cast
 
 if sys.version_info[0] >= 3:
     from collections.abc import Iterable
 else:
     from collections import Iterable
 
+# Stands for points encoded to JSON in bulk, until they are spliced into the payload
+_BULK_PLACEHOLDER = "\x00datadog-bulk-points\x00"
+_ENCODED_BULK_PLACEHOLDER = json.dumps(_BULK_PLACEHOLDER)
+
+
+def _is_array(values):
+    # type: (Any) -> bool
+    """
+    Whether `values` is an `array.array` or a 1-D NumPy array.
+    """
+    if isinstance(values, array):
+        return True
+    # Checked without importing NumPy, optional
+    return type(values).__module__ == "numpy" and getattr(values, "ndim", None) == 1
+
+
+def _as_float_array(values):
+    # type: (Any) -> Any
+    """
+    Convert a sequence of numbers to an array of floats, in bulk: to an `array('d')`,
+    or to a `float64` NumPy array for NumPy arrays. Raise `TypeError` or `ValueError`
+    for other values, as `float()` does.
+    """
+    if isinstance(values, array):
+        return values if values.typecode == "d" else array("d", values)
+    if _is_array(values):
+        return values.astype("float64", copy=False)
+    return array("d", values)
+
+
+class ColumnarPoints(object):
+    """
+    Points as columns of timestamps and float values, in arrays of the same length,
+    encoded to JSON as `(timestamp, value)` pairs. `timestamp` is set when all the
+    points share it, e.g. for an array of values submitted now.
+    """
+
+    __slots__ = ("timestamps", "values", "timestamp")
+
+    def __init__(self, timestamps, values, timestamp=None):
+        # type: (Any, Any, Optional[float]) -> None
+        if len(timestamps) != len(values):
+            raise ValueError(
+                "Timestamps and values must have the same length, got {0} and {1}".format(len(timestamps), len(values))
+            )
+        self.timestamps = timestamps
+        self.values = values
+        self.timestamp = timestamp
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.values)
+
+    def __iter__(self):
+        # type: () -> Any
+        return iter(zip(self.timestamps, self.values))
+
+    def tolist(self):
+        # type: () -> List[Tuple[float, float]]
+        return list(zip(self.timestamps.tolist(), self.values.tolist()))
+
+    def to_json(self):
+        # type: () -> str
+        """
+        Encode the points to JSON. Values sharing a timestamp are encoded as one list,
+        the timestamp being inserted between them as text, without building a pair
+        for each point.
+        """
+        if self.timestamp is None or not len(self.values):
+            return json.dumps(self.tolist())
+        prefix = "[" + json.dumps(self.timestamp) + ", "
+        return "[" + prefix + json.dumps(self.values.tolist())[1:-1].replace(", ", "], " + prefix) + "]]"
+
+
+def json_default(obj):
+    # type: (Any) -> Any
+    """
+    `default` of the JSON encoder of API payloads: encode columnar points, and
+    arrays of distribution values, in bulk.
+    """
+    if isinstance(obj, ColumnarPoints) or _is_array(obj):
+        return obj.tolist()
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(obj).__name__))
+
+
+class PayloadEncoder(json.JSONEncoder):
+    """
+    JSON encoder of API payloads, splicing in the points encoded to JSON in bulk
+    by `ColumnarPoints.to_json`.
+    """
+
+    def __init__(self, sort_keys=False):
+        # type: (bool) -> None
+        super(PayloadEncoder, self).__init__(sort_keys=sort_keys)
+        self._bulk = []  # type: List[str]
+
+    def default(self, obj):
+        # type: (Any) -> Any
+        if isinstance(obj, ColumnarPoints) and obj.timestamp is not None:
+            self._bulk.append(obj.to_json())
+            return _BULK_PLACEHOLDER
+        return json_default(obj)
+
+    def encode(self, obj):
+        # type: (Any) -> str
+        self._bulk = []
+        data = super(PayloadEncoder, self).encode(obj)
+        if not self._bulk:
+            return data
+        pieces = data.split(_ENCODED_BULK_PLACEHOLDER)
+        if len(pieces) != len(self._bulk) + 1:
+            # The placeholder is also in a string of the payload
+            return json.dumps(obj, sort_keys=self.sort_keys, default=json_default)
+        spliced = [pieces[0]]
+        for points, piece in zip(self._bulk, pieces[1:]):
+            spliced.append(points)
+            spliced.append(piece)
+        return "".join(spliced)
+
+
+def _format_columns(points, now):
+    # type: (Any, float) -> Union[ColumnarPoints, None]
+    """
+    Fast path of `format_points` for arrays of values, and `(timestamps, values)`
+    pairs of sequences: return them as columnar points, or None for other inputs.
+    """
+    if _is_array(points):
+        values = _as_float_array(points)
+        if isinstance(values, array):
+            timestamps = array("d", [now]) * len(values)  # type: Any
+        else:
+            timestamps = values.copy()
+            timestamps.fill(now)
+        return ColumnarPoints(timestamps, values, now)
+
+    if (
+        isinstance(points, tuple)
+        and len(points) == 2
+        and (_is_array(points[0]) or isinstance(points[0], list))
+        and (_is_array(points[1]) or isinstance(points[1], list))
+    ):
+        return ColumnarPoints(_as_float_array(points[0]), _as_float_array(points[1]))
+
+    return None
+
 
 def format_points(points):
-    # type: (Any) -> List[Tuple[float, Any]]
+    # type: (Any) -> Union[List[Tuple[float, Any]], ColumnarPoints]
     """
     Format `points` parameter.
 
     Input:
-        a value or (timestamp, value) pair or a list of value or (timestamp, value) pairs
+        a value or (timestamp, value) pair or a list of value or (timestamp, value) pairs,
+        an array of values (`array.array` or NumPy array), or a (timestamps, values) pair
+        of arrays or lists
 
     Returns:
-        list of (timestamp, float value) pairs
+        list of (timestamp, float value) pairs, or columnar points for arrays and
+        (timestamps, values) pairs
 
     """
     now = time.time()
+    columns = _format_columns(points, now)
+    if columns is not None:
+        return columns
+
     if not isinstance(points, list):
         points = [points]
 
@@ -36,7 +190,9 @@ def format_points(points):
         # Distributions contain a list of points
         else:
             timestamp = point[0]
-            if isinstance(point[1], Iterable):
+            if _is_array(point[1]):
+                value = _as_float_array(point[1])
+            elif isinstance(point[1], Iterable):
                 value = [float(p) for p in point[1]]
             else:
                 value = float(point[1])
@@ -1,8 +1,9 @@
 # Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
-from typing import Any
+from typing import Any, Iterator
 
+from datadog.api.pagination import iter_items, iter_pages, next_offset
 from datadog.api.resources import ActionAPIResource, SearchableAPIResource, ListableAPIResource
 
 
@@ -86,6 +87,29 @@ class Hosts(ActionAPIResource, SearchableAPIResource, ListableAPIResource):
         """
         return super(Hosts, cls)._search(**params)
 
+    @classmethod
+    def iter_search(cls, count=100, prefetch=False, **params):
+        # type: (int, bool, **Any) -> Iterator[Any]
+        """
+        Iterate over all the hosts matching a search, fetching them lazily `count`
+        hosts at a time.
+
+        :param count: number of hosts per page, up to 1000
+        :type count: integer
+
+        :param prefetch: fetch the next page in the background while iterating
+        :type prefetch: bool
+
+        Other parameters are the same as `search`.
+
+        :returns: Iterator over the hosts, as dictionaries
+        """
+        params.update(start=params.get("start", 0), count=count)
+        host_list = lambda page: page.get("host_list", [])  # noqa: E731
+        return iter_items(
+            iter_pages(cls.search, params, next_offset("start", count, host_list), prefetch=prefetch), host_list
+        )
+
     @classmethod
     def totals(cls, **params):
         # type: (**Any) -> Any
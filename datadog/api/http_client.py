@@ -9,7 +9,6 @@ Priority:
 2. `urlfetch` 3p module - Google App Engine only
 """
 # stdlib
-import copy
 import logging
 import platform
 import sys
@@ -22,35 +21,61 @@ except ImportError:
 
 # datadog
 from datadog.api.exceptions import ProxyError, ClientError, HTTPError, HttpTimeout
+from datadog.util.compat import text
 
 if sys.version_info[:2] >= (3, 5):
     from typing import TYPE_CHECKING
     if TYPE_CHECKING:
         import types  # noqa: F401
-        from typing import Any, Dict, Optional, Type  # noqa: F401
+        from typing import Any, Dict, Iterator, Optional, Type  # noqa: F401
 
 
-# 3p
+# 3p, probed by _import_http_libraries() on first use only, as importing them is slow.
 requests = None  # type: Any
-try:
-    requests = __import__("requests")
-    __import__("requests.adapters")
-except ImportError:
-    pass
-
 urlfetch = None  # type: Optional[types.ModuleType]
 urlfetch_errors = None  # type: Optional[types.ModuleType]
-try:
-    urlfetch = __import__("google.appengine.api.urlfetch")
-    urlfetch_errors = __import__("google.appengine.api.urlfetch_errors")
-except ImportError:
-    pass
-
 urllib3 = None  # type: Any
-try:
-    urllib3 = __import__("urllib3")
-except ImportError:
-    pass
+_http_libraries_imported = False
+_http_libraries_lock = Lock()
+
+# Computed on first use, as it doesn't change for the process
+_user_agent_header = None  # type: Optional[str]
+
+# Streamed response bodies are read in chunks of that size
+_CONTENT_CHUNK_SIZE = 64 * 1024
+
+
+def _import_http_libraries():
+    # type: () -> None
+    """
+    Import the available 3rd party HTTP libraries, once.
+    """
+    global requests, urlfetch, urlfetch_errors, urllib3, _http_libraries_imported
+    if _http_libraries_imported:
+        return
+
+    with _http_libraries_lock:
+        if _http_libraries_imported:
+            return
+
+        try:
+            requests = __import__("requests")
+            __import__("requests.adapters")
+        except ImportError:
+            pass
+
+        try:
+            urlfetch = __import__("google.appengine.api.urlfetch")
+            urlfetch_errors = __import__("google.appengine.api.urlfetch_errors")
+        except ImportError:
+            pass
+
+        try:
+            urllib3 = __import__("urllib3")
+        except ImportError:
+            pass
+
+        _http_libraries_imported = True
 
 
 log = logging.getLogger("datadog.api")
@@ -58,16 +83,83 @@ log = logging.getLogger("datadog.api")
 
 def _get_user_agent_header():
     # type: () -> str
-    from datadog import version
+    global _user_agent_header
+    if _user_agent_header is None:
+        from datadog import version
+
+        _user_agent_header = "datadogpy/{version} (python {pyver}; os {os}; arch {arch})".format(
+            version=version.__version__,
+            pyver=platform.python_version(),
+            os=platform.system().lower(),
+            arch=platform.machine().lower(),
+        )
+    return _user_agent_header
 
-    return "datadogpy/{version} (python {pyver}; os {os}; arch {arch})".format(
-        version=version.__version__,
-        pyver=platform.python_version(),
-        os=platform.system().lower(),
-        arch=platform.machine().lower(),
+
+def _pool_settings():
+    # type: () -> Dict[str, Any]
+    """
+    Connection pool settings, as set with `initialize`.
+    """
+    from datadog.api import _pool_connections, _pool_maxsize, _pool_block, _keep_alive
+
+    return dict(
+        pool_connections=_pool_connections, pool_maxsize=_pool_maxsize, pool_block=_pool_block, keep_alive=_keep_alive
     )
 
 
+def _pool_manager_stats(pool_manager):
+    # type: (Any) -> Dict[str, Dict[str, int]]
+    """
+    Connections opened, and requests sent, by each pool of a `urllib3.PoolManager`.
+    """
+    stats = {}
+    for key in list(pool_manager.pools.keys()):
+        pool = pool_manager.pools.get(key)
+        if pool is not None:
+            stats["{}://{}:{}".format(pool.scheme, pool.host, pool.port)] = {
+                "connections_opened": pool.num_connections,
+                "connections_reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+    return stats
+
+
+def _iter_content(response):
+    # type: (Any) -> Iterator[bytes]
+    """
+    Iterate over the body of a response as it is read, for `requests` responses,
+    or else at once.
+    """
+    if requests is None or not isinstance(response, requests.Response) or response.raw is None:
+        if response.content:
+            yield response.content
+        return
+
+    try:
+        for chunk in response.iter_content(_CONTENT_CHUNK_SIZE):
+            yield chunk
+    except (requests.exceptions.Timeout, requests.ConnectionError) as e:
+        # Read timeouts come up as connection errors once the body is streamed
+        raise _remove_context(HttpTimeout(response.request.method, response.url, e))
+    except requests.exceptions.RequestException as e:
+        raise _remove_context(ClientError(response.request.method, response.url, e))
+
+
+def _read_content(response):
+    # type: (Any) -> bytes
+    """
+    Read the whole body of a response, errors being raised as by `_iter_content`,
+    and keep it for the next reads, e.g. on each hit of the response cache.
+    """
+    if requests is None or not isinstance(response, requests.Response) or response._content_consumed:
+        return response.content
+    content = b"".join(_iter_content(response))
+    # As `requests.Response.content` does
+    response._content = content
+    response._content_consumed = True
+    return content
+
+
 def _remove_context(exc):
     # type: (Exception) -> Exception
     """Python3: remove context from chained exceptions to prevent leaking API keys in tracebacks."""
@@ -78,8 +170,16 @@ def _remove_context(exc):
 class HTTPClient(object):
     """
     An abstract generic HTTP client. Subclasses must implement the `request` methods.
+
+    Clients with `supports_chunked_body` set also accept an iterator of bytes
+    as `data`, which is sent with a chunked upload. Clients with
+    `supports_streamed_response` set also accept `stream=True`, to return
+    responses whose body is read as it is iterated over, see `_iter_content`.
     """
 
+    supports_chunked_body = False
+    supports_streamed_response = False
+
     @classmethod
     def request(cls, method, url, headers, params, data, timeout, proxies, verify, max_retries):
         # type: (str, str, Dict[str, str], Dict[str, Any], Any, float, Optional[Any], Any, int) -> Any
@@ -97,30 +197,64 @@ class HTTPClient(object):
         """
         raise NotImplementedError(u"Must be implemented by HTTPClient subclasses.")
 
+    @classmethod
+    def pool_stats(cls):
+        # type: () -> Dict[str, Dict[str, int]]
+        """
+        Connections opened and reused, by connection pool, for clients keeping
+        connections alive.
+        """
+        return {}
+
 
 class RequestClient(HTTPClient):
     """
     HTTP client based on 3rd party `requests` module, using a single session.
     This allows us to keep the session alive to spare some execution time.
+
+    Its connection pools are sized with the `pool_connections`, `pool_maxsize`
+    and `pool_block` settings of `initialize` when first used.
     """
 
+    supports_chunked_body = True
+    supports_streamed_response = True
+
     _session = None
+    _http_adapter = None  # type: Any
     _session_lock = Lock()
 
     @classmethod
-    def request(cls, method, url, headers, params, data, timeout, proxies, verify, max_retries):
-        # type: (str, str, Dict[str, str], Dict[str, Any], Any, float, Optional[Any], Any, int) -> Any
+    def request(cls, method, url, headers, params, data, timeout, proxies, verify, max_retries, stream=False):
+        # type: (str, str, Dict[str, str], Dict[str, Any], Any, float, Optional[Any], Any, int, bool) -> Any
+        _import_http_libraries()
         try:
 
             with cls._session_lock:
                 if cls._session is None:
+                    settings = _pool_settings()
                     cls._session = requests.Session()
-                    http_adapter = requests.adapters.HTTPAdapter(max_retries=max_retries)
-                    cls._session.mount("https://", http_adapter)
+                    cls._http_adapter = requests.adapters.HTTPAdapter(
+                        max_retries=max_retries,
+                        pool_connections=settings["pool_connections"],
+                        pool_maxsize=settings["pool_maxsize"],
+                        pool_block=settings["pool_block"],
+                    )
+                    cls._session.mount("https://", cls._http_adapter)
+                    cls._session.mount("http://", cls._http_adapter)
                     cls._session.headers.update({"User-Agent": _get_user_agent_header()})
+                    if not settings["keep_alive"]:
+                        cls._session.headers["Connection"] = "close"
 
             result = cls._session.request(
-                method, url, headers=headers, params=params, data=data, timeout=timeout, proxies=proxies, verify=verify
+                method,
+                url,
+                headers=headers,
+                params=params,
+                data=data,
+                timeout=timeout,
+                proxies=proxies,
+                verify=verify,
+                stream=stream,
             )
 
             result.raise_for_status()
@@ -136,6 +270,7 @@ class RequestClient(HTTPClient):
                 # This gets caught afterwards and raises an ApiError exception
                 pass
             else:
+                result.close()
                 raise _remove_context(HTTPError(e.response.status_code, result.reason))
         except TypeError:
             raise TypeError(
@@ -146,6 +281,13 @@ class RequestClient(HTTPClient):
 
         return result
 
+    @classmethod
+    def pool_stats(cls):
+        # type: () -> Dict[str, Dict[str, int]]
+        if cls._http_adapter is None:
+            return {}
+        return _pool_manager_stats(cls._http_adapter.poolmanager)
+
 
 class URLFetchClient(HTTPClient):
     """
@@ -161,12 +303,14 @@ class URLFetchClient(HTTPClient):
         TO IMPLEMENT:
         * `max_retries`
         """
+        _import_http_libraries()
+
         # No local certificate file can be used on Google App Engine
         validate_certificate = True if verify else False
 
         # Encode parameters in the url
         url_with_params = "{url}?{params}".format(url=url, params=urllib_urlencode(params))
-        newheaders = copy.deepcopy(headers)
+        newheaders = dict(headers)
         newheaders["User-Agent"] = _get_user_agent_header()
 
         try:
@@ -200,7 +344,8 @@ class URLFetchClient(HTTPClient):
         status_code = result.status_code
 
         if (status_code / 100) != 2:
-            if status_code in (400, 401, 403, 404, 409, 429):
+            # 304 answers the revalidation of a cached response
+            if status_code in (304, 400, 401, 403, 404, 409, 429):
                 pass
             else:
                 raise HTTPError(status_code)
@@ -209,9 +354,17 @@ class URLFetchClient(HTTPClient):
 class Urllib3Client(HTTPClient):
     """
     HTTP client based on 3rd party `urllib3` module.
+
+    Its connection pools are sized with the `pool_connections`, `pool_maxsize`
+    and `pool_block` settings of `initialize` when first used.
     """
 
-    _pool = None
+    supports_chunked_body = True
+
+    _pool = None  # type: Any
+    _keep_alive = True
+    # Encodings urllib3 can decode
+    _accept_encoding = "gzip,deflate"
     _pool_lock = Lock()
 
     @classmethod
@@ -221,19 +374,34 @@ class Urllib3Client(HTTPClient):
         Wrapper around `urllib3.PoolManager.request` method. This method will raise
         exceptions for HTTP status codes that are not 2xx.
         """
+        _import_http_libraries()
         try:
             with cls._pool_lock:
                 if cls._pool is None:
+                    settings = _pool_settings()
                     cls._pool = urllib3.PoolManager(
+                        num_pools=settings["pool_connections"],
+                        maxsize=settings["pool_maxsize"],
+                        block=settings["pool_block"],
                         retries=max_retries,
                         timeout=timeout,
                         cert_reqs="CERT_REQUIRED" if verify else "CERT_NONE",
                     )
+                    cls._keep_alive = settings["keep_alive"]
+                    cls._accept_encoding = urllib3.util.make_headers(accept_encoding=True)["accept-encoding"]
 
-            newheaders = copy.deepcopy(headers)
+            newheaders = dict(headers)
             newheaders["User-Agent"] = _get_user_agent_header()
+            newheaders["Accept-Encoding"] = cls._accept_encoding
+            if not cls._keep_alive:
+                newheaders["Connection"] = "close"
             response = cls._pool.request(
-                method, url, body=data, fields=params, headers=newheaders
+                method,
+                url,
+                body=data,
+                fields=params,
+                headers=newheaders,
+                chunked=data is not None and not isinstance(data, (bytes, text)),
             )
             cls.raise_on_status(response)
 
@@ -248,6 +416,13 @@ class Urllib3Client(HTTPClient):
 
         return response
 
+    @classmethod
+    def pool_stats(cls):
+        # type: () -> Dict[str, Dict[str, int]]
+        if cls._pool is None:
+            return {}
+        return _pool_manager_stats(cls._pool)
+
     @classmethod
     def raise_on_status(cls, response):
         # type: (Any) -> None
@@ -256,7 +431,8 @@ class Urllib3Client(HTTPClient):
         """
         status_code = response.status
         if status_code < 200 or status_code >= 300:
-            if status_code not in (400, 401, 403, 404, 409, 429):
+            # 304 answers the revalidation of a cached response
+            if status_code not in (304, 400, 401, 403, 404, 409, 429):
                 raise HTTPError(status_code, response.reason)
 
 
@@ -265,6 +441,8 @@ def resolve_http_client():
     """
     Resolve an appropriate HTTP client based the defined priority and user environment.
     """
+    _import_http_libraries()
+
     if requests:
         log.debug(u"Use `requests` based HTTP client.")
         return RequestClient
@@ -1,12 +1,60 @@
 # Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
-# datadog
-from typing import Any, Dict, Optional
+# stdlib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional
 
+# datadog
+from datadog.api.api_client import APIClient
+from datadog.api.batch_client import batch
 from datadog.api.exceptions import ApiError
 from datadog.api.format import format_points
 from datadog.api.resources import SearchableAPIResource, SendableAPIResource, ListableAPIResource
+from datadog.util.format import force_to_epoch_seconds
+
+
+def _import_numpy():
+    # type: () -> Any
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _series_key(series):
+    # type: (Dict[str, Any]) -> Hashable
+    return series.get("expression") or (series.get("metric"), series.get("scope"))
+
+
+def _merge_series(responses):
+    # type: (Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]
+    """
+    Merge the series of consecutive query responses, their points being stored
+    in `times` and `values` arrays of floats, with NaN for null values.
+    """
+    merged = OrderedDict()  # type: OrderedDict[Hashable, Dict[str, Any]]
+    for response in responses:
+        for series in response.get("series") or []:
+            key = _series_key(series)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {k: v for k, v in series.items() if k != "pointlist"}
+                entry["times"] = array("d")
+                entry["values"] = array("d")
+            times, values = entry["times"], entry["values"]
+            for timestamp, value in series.get("pointlist") or []:
+                # Points at the bounds of consecutive windows are returned twice
+                if times and timestamp <= times[-1]:
+                    continue
+                times.append(timestamp)
+                values.append(float("nan") if value is None else value)
+            entry["length"] = len(times)
+            if "end" in series:
+                entry["end"] = series["end"]
+    return list(merged.values())
 
 
 class Metric(SearchableAPIResource, SendableAPIResource, ListableAPIResource):
@@ -15,6 +63,7 @@ class Metric(SearchableAPIResource, SendableAPIResource, ListableAPIResource):
     """
 
     _resource_name = ""  # type: str
+    _spool_failed_sends = True
 
     _METRIC_QUERY_ENDPOINT = "query"
     _METRIC_SUBMIT_ENDPOINT = "series"
@@ -157,3 +206,88 @@ class Metric(SearchableAPIResource, SendableAPIResource, ListableAPIResource):
             raise ApiError("The parameter '{0}' is required".format(e.args[0]))
 
         return super(Metric, cls)._search(**params)
+
+    @classmethod
+    def query_range(cls, query, start, end, step_window=12 * 3600, **params):
+        # type: (str, Any, Any, int, **Any) -> Dict[str, Any]
+        """
+        Query metrics from Datadog over a long time range, split into windows of
+        `step_window` seconds that are fetched concurrently with `api.batch`.
+
+        :param query: metric query
+        :type query: string query
+
+        :param start: query start timestamp
+        :type start: POSIX timestamp or datetime.datetime
+
+        :param end: query end timestamp
+        :type end: POSIX timestamp or datetime.datetime
+
+        :param step_window: length of the windows, in seconds, up to 24 hours (default: 12 hours). \
+            The shorter the windows, the finer the resolution of the points.
+        :type step_window: integer
+
+        :returns: Dictionary like the API's JSON response, the series of all windows being merged. \
+            Their points are in `times` (milliseconds) and `values` arrays of floats, NumPy arrays if \
+            available or else `array('d')`, null values being NaN.
+
+        Calls are subject to the rate limits of the query API: they wait for them
+        to reset, see `rate_limit_retries` in `initialize`. Errors raise `ApiError`,
+        even if `mute` is enabled. The call blocks until all windows are fetched,
+        including under `api.aio`: run it in an executor from an event loop.
+
+        >>> api.Metric.query_range('avg:system.cpu.idle{*}', start=int(time.time()) - 30 * 86400,
+                                   end=int(time.time()))
+        """
+        if not 0 < step_window <= 24 * 3600:
+            raise ValueError("step_window must be between 0 and 24 hours, got {0}".format(step_window))
+        start = force_to_epoch_seconds(start)
+        end = force_to_epoch_seconds(end)
+        if end <= start:
+            raise ValueError("end must be after start, got {0} to {1}".format(start, end))
+        windows = []
+        window_start = start
+        while True:
+            window_end = min(window_start + step_window, end)
+            windows.append((window_start, window_end))
+            if window_end >= end:
+                break
+            window_start = window_end
+
+        # Submit the windows to the query endpoint directly: `query` points the shared
+        # `_resource_name` to it, which concurrent calls of `send` or `list` would change
+        api_version = getattr(cls, "_api_version", None)
+        futures = batch(
+            (
+                APIClient.submit,
+                ("GET", cls._METRIC_QUERY_ENDPOINT, api_version),
+                dict(params, query=query, **{"from": window_start, "to": window_end}),
+            )
+            for window_start, window_end in windows
+        )
+        responses = []
+        for future in futures:
+            response = future.result()
+            if isinstance(response, tuple):
+                # Raw responses are returned too
+                response = response[0]
+            if response.get("errors"):
+                raise ApiError(response)
+            if response.get("status") == "error":
+                raise ApiError({"errors": [response.get("error")]})
+            responses.append(response)
+
+        series = _merge_series(responses)
+        numpy = _import_numpy()
+        if numpy is not None:
+            for entry in series:
+                entry["times"] = numpy.array(entry["times"], dtype=numpy.float64)
+                entry["values"] = numpy.array(entry["values"], dtype=numpy.float64)
+
+        return {
+            "status": "ok",
+            "query": query,
+            "from_date": start * 1000,
+            "to_date": end * 1000,
+            "series": series,
+        }
@@ -1,8 +1,9 @@
 # Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
-from typing import Any
+from typing import Any, Iterator
 
+from datadog.api.pagination import iter_items, iter_pages, next_page_number
 from datadog.api.resources import (
     GetableAPIResource,
     CreateableAPIResource,
@@ -75,6 +76,30 @@ class Monitor(
 
         return super(Monitor, cls).get_all(**params)
 
+    @classmethod
+    def iter_all(cls, page_size=100, prefetch=False, **params):
+        # type: (int, bool, **Any) -> Iterator[Any]
+        """
+        Iterate over all monitors, fetching them lazily one page at a time.
+
+        :param page_size: number of monitors per page, up to 1000
+        :type page_size: integer
+
+        :param prefetch: fetch the next page in the background while iterating
+        :type prefetch: bool
+
+        Other parameters are the same as `get_all`.
+
+        :returns: Iterator over the monitors, as dictionaries
+
+        >>> for monitor in api.Monitor.iter_all(monitor_tags=["service:web"]):
+        ...     print(monitor["name"])
+        """
+        params.update(page=params.get("page", 0), page_size=page_size)
+        return iter_items(
+            iter_pages(cls.get_all, params, next_page_number("page", page_size, list), prefetch=prefetch), list
+        )
+
     @classmethod
     def mute(cls, id, **body):
         # type: (Any, **Any) -> Any
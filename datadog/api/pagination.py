@@ -0,0 +1,104 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Lazy iteration over paginated API endpoints.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from datadog.api.batch_client import _get_executor
+from datadog.api.exceptions import ApiError
+
+
+def iter_pages(
+    fetch,  # type: Callable[..., Any]
+    params,  # type: Optional[Dict[str, Any]]
+    next_params,  # type: Callable[[Dict[str, Any], Any], Optional[Dict[str, Any]]]
+    prefetch=False,  # type: bool
+):
+    # type: (...) -> Iterator[Any]
+    """
+    Yield the pages of an endpoint, fetched with `fetch(**params)`. The parameters of
+    each next page are `next_params(params, page)`, until it returns None.
+
+    With `prefetch`, each next page is fetched on the `api.batch` thread pool
+    while the current one is consumed.
+
+    Raise `ApiError` on pages with errors, including those returned when `mute`
+    is enabled.
+
+    Pages are fetched with blocking calls as they are iterated over, including for
+    the `iter_*` methods of `api.aio` resources, which return this iterator as is:
+    iterate over it in an executor from an event loop.
+    """
+    pending = None
+    while params is not None:
+        page = pending.result() if pending is not None else fetch(**params)
+        pending = None
+        if isinstance(page, tuple):
+            # Raw responses are returned too
+            page = page[0]
+        if isinstance(page, dict) and page.get("errors"):
+            raise ApiError(page)
+
+        params = next_params(params, page)
+        if prefetch and params is not None:
+            pending = _get_executor().submit(fetch, **params)
+        yield page
+
+
+def iter_items(pages, items):
+    # type: (Iterator[Any], Callable[[Any], List[Any]]) -> Iterator[Any]
+    """
+    Yield the items of each page, as returned by `items(page)`.
+    """
+    for page in pages:
+        for item in items(page):
+            yield item
+
+
+def next_page_number(page_param, page_size, items):
+    # type: (str, int, Callable[[Any], List[Any]]) -> Callable[[Dict[str, Any], Any], Optional[Dict[str, Any]]]
+    """
+    `next_params` for endpoints paginated by page number, until a page isn't full.
+    """
+
+    def next_params(params, page):
+        # type: (Dict[str, Any], Any) -> Optional[Dict[str, Any]]
+        if len(items(page)) < page_size:
+            return None
+        return dict(params, **{page_param: params[page_param] + 1})
+
+    return next_params
+
+
+def next_offset(offset_param, page_size, items):
+    # type: (str, int, Callable[[Any], List[Any]]) -> Callable[[Dict[str, Any], Any], Optional[Dict[str, Any]]]
+    """
+    `next_params` for endpoints paginated by offset, until a page isn't full.
+    """
+
+    def next_params(params, page):
+        # type: (Dict[str, Any], Any) -> Optional[Dict[str, Any]]
+        count = len(items(page))
+        if count < page_size:
+            return None
+        return dict(params, **{offset_param: params[offset_param] + count})
+
+    return next_params
+
+
+def next_cursor(cursor_param, cursor):
+    # type: (str, Callable[[Any], Optional[str]]) -> Callable[[Dict[str, Any], Any], Optional[Dict[str, Any]]]
+    """
+    `next_params` for endpoints paginated by cursor, until a page has no next cursor.
+    """
+
+    def next_params(params, page):
+        # type: (Dict[str, Any], Any) -> Optional[Dict[str, Any]]
+        next_cursor = cursor(page)
+        if not next_cursor:
+            return None
+        return dict(params, **{cursor_param: next_cursor})
+
+    return next_params
@@ -0,0 +1,151 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Tracking of the API rate limits, from the `X-RateLimit-*` response headers.
+"""
+# stdlib
+from threading import Lock
+import time
+from typing import Any, Dict, Mapping, Optional  # noqa: F401
+
+
+class RateLimit(object):
+    """
+    Rate limit of an endpoint family, and the calls made to it.
+    """
+
+    __slots__ = ("name", "limit", "remaining", "reset_at", "requests", "rate_limited", "retries", "waited")
+
+    def __init__(self):
+        # type: () -> None
+        self.name = None  # type: Optional[str]
+        self.limit = None  # type: Optional[int]
+        # Calls left until `reset_at`, minus the ones in flight
+        self.remaining = None  # type: Optional[int]
+        self.reset_at = None  # type: Optional[float]
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.waited = 0.0
+
+
+def _header_number(headers, name):
+    # type: (Mapping[str, Any], str) -> Optional[float]
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class RateLimiter(object):
+    """
+    Rate limits by endpoint family, i.e. API resource.
+
+    Calls reserve one of the remaining calls of their family before being sent,
+    so that once they are exhausted, calls wait for the limit to reset instead
+    of being answered with HTTP 429.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._limits = {}  # type: Dict[str, RateLimit]
+        self._lock = Lock()
+
+    def _get(self, family):
+        # type: (str) -> RateLimit
+        rate_limit = self._limits.get(family)
+        if rate_limit is None:
+            rate_limit = self._limits[family] = RateLimit()
+        return rate_limit
+
+    def reserve(self, family):
+        # type: (str) -> float
+        """
+        Reserve a call to an endpoint family. Return the number of seconds to wait
+        before making it, 0 unless the remaining calls are exhausted.
+        """
+        with self._lock:
+            rate_limit = self._get(family)
+            rate_limit.requests += 1
+            now = time.time()
+            if rate_limit.reset_at is None or now >= rate_limit.reset_at:
+                # Unknown, or reset since the last response
+                rate_limit.remaining = None
+                return 0
+            if rate_limit.remaining is not None and rate_limit.remaining <= 0:
+                return rate_limit.reset_at - now
+            if rate_limit.remaining is not None:
+                rate_limit.remaining -= 1
+            return 0
+
+    def waited(self, family, delay):
+        # type: (str, float) -> None
+        with self._lock:
+            self._get(family).waited += delay
+
+    def update(self, family, status_code, headers):
+        # type: (str, int, Mapping[str, Any]) -> Optional[float]
+        """
+        Update the rate limit of an endpoint family from the headers of a response.
+        For HTTP 429 responses, return the number of seconds until the limit resets,
+        if advertised.
+        """
+        # Seconds until the limit resets
+        reset = _header_number(headers, "X-RateLimit-Reset")
+        if reset is None:
+            if status_code != 429:
+                # Not rate limited
+                return None
+            reset = _header_number(headers, "Retry-After")
+        limit = _header_number(headers, "X-RateLimit-Limit")
+        remaining = _header_number(headers, "X-RateLimit-Remaining")
+
+        with self._lock:
+            rate_limit = self._get(family)
+            rate_limit.name = headers.get("X-RateLimit-Name") or rate_limit.name
+            if limit is not None:
+                rate_limit.limit = int(limit)
+            if reset is not None:
+                rate_limit.reset_at = time.time() + reset
+                if remaining is not None:
+                    rate_limit.remaining = int(remaining)
+            if status_code != 429:
+                return None
+            rate_limit.rate_limited += 1
+            rate_limit.remaining = 0
+            return reset
+
+    def retried(self, family):
+        # type: (str) -> None
+        with self._lock:
+            self._get(family).retries += 1
+
+    def stats(self):
+        # type: () -> Dict[str, Dict[str, Any]]
+        """
+        Rate limit and calls by endpoint family.
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                family: {
+                    "name": rate_limit.name,
+                    "limit": rate_limit.limit,
+                    "remaining": rate_limit.remaining,
+                    "reset": max(rate_limit.reset_at - now, 0) if rate_limit.reset_at is not None else None,
+                    "requests": rate_limit.requests,
+                    "rate_limited": rate_limit.rate_limited,
+                    "retries": rate_limit.retries,
+                    "waited": round(rate_limit.waited, 3),
+                }
+                for family, rate_limit in self._limits.items()
+            }
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            self._limits.clear()
@@ -62,6 +62,8 @@ class SendableAPIResource(object):
 
     _resource_name = ""  # type: str
     _api_version = None  # type: Optional[str]
+    # Whether payloads that couldn't be sent are spooled, see `spool_path` in `initialize`
+    _spool_failed_sends = False
 
     @classmethod
     def send(cls, attach_host_name=False, id=None, compress_payload=False, **body):
@@ -93,11 +95,18 @@ class SendableAPIResource(object):
                 body,
                 attach_host_name=attach_host_name,
                 compress_payload=compress_payload,
+                spool=cls._spool_failed_sends,
             )
 
         path = "{resource_name}/{resource_id}".format(resource_name=cls._resource_name, resource_id=id)
         return APIClient.submit(
-            "POST", path, api_version, body, attach_host_name=attach_host_name, compress_payload=compress_payload
+            "POST",
+            path,
+            api_version,
+            body,
+            attach_host_name=attach_host_name,
+            compress_payload=compress_payload,
+            spool=cls._spool_failed_sends,
         )
 
 
@@ -0,0 +1,112 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+In-process cache of API responses to GET requests.
+"""
+# stdlib
+from collections import OrderedDict
+from threading import Lock
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple  # noqa: F401
+
+# datadog
+from datadog.api.http_client import _read_content
+
+
+class CachedResponse(object):
+    """
+    A cached HTTP response, with its ETag if any.
+    """
+
+    __slots__ = ("result", "etag", "expires_at")
+
+    def __init__(self, result, etag, expires_at):
+        # type: (Any, Optional[str], float) -> None
+        self.result = result
+        self.etag = etag
+        self.expires_at = expires_at
+
+    def is_fresh(self):
+        # type: () -> bool
+        return time.time() < self.expires_at
+
+
+class ResponseCache(object):
+    """
+    LRU cache of at most `max_entries` responses, fresh for `ttl` seconds.
+
+    Responses are keyed by resource, URL, query parameters and API keys. Writes
+    to a resource invalidate all the responses cached for it. Stale responses
+    with an ETag are kept, to revalidate them with `If-None-Match`.
+    """
+
+    def __init__(self, ttl, max_entries):
+        # type: (float, int) -> None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # type: OrderedDict[Tuple[Hashable, ...], CachedResponse]
+        self._lock = Lock()
+
+    @staticmethod
+    def key(resource, request):
+        # type: (str, Dict[str, Any]) -> Tuple[Hashable, ...]
+        params = tuple(sorted((k, repr(v)) for k, v in (request["params"] or {}).items()))
+        headers = request["headers"]
+        return (resource, request["url"], params, headers.get("DD-API-KEY"), headers.get("DD-APPLICATION-KEY"))
+
+    def get(self, key):
+        # type: (Tuple[Hashable, ...]) -> Optional[CachedResponse]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not entry.is_fresh() and entry.etag is None:
+                del self._entries[key]
+                return None
+            self._move_to_end(key)
+            return entry
+
+    def set(self, key, result):
+        # type: (Tuple[Hashable, ...], Any) -> None
+        # Streamed bodies are read now, to be decoded again on each hit
+        _read_content(result)
+        entry = CachedResponse(result, result.headers.get("ETag"), time.time() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key):
+        # type: (Tuple[Hashable, ...]) -> None
+        """
+        Mark a response as fresh again, after revalidation.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = time.time() + self.ttl
+
+    def invalidate(self, resource):
+        # type: (str) -> None
+        """
+        Drop the responses cached for a resource.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == resource]:
+                del self._entries[key]
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            self._entries.clear()
+
+    def _move_to_end(self, key):
+        # type: (Tuple[Hashable, ...]) -> None
+        # OrderedDict.move_to_end is not available on Python 2
+        self._entries[key] = self._entries.pop(key)
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._entries)
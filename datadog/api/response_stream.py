@@ -0,0 +1,203 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Incremental decoding of API responses: decompression, text decoding and JSON parsing.
+"""
+# stdlib
+import codecs
+from itertools import chain
+import json
+from numbers import Number
+import re
+import zlib
+from typing import Any, Iterable, Iterator, List, Optional  # noqa: F401
+
+# Body encodings decompressed here, if the HTTP client didn't
+COMPRESSED_ENCODINGS = frozenset({"gzip", "deflate"})
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+def iter_decompressed(chunks, encoding):
+    # type: (Iterable[bytes], Optional[str]) -> Iterator[bytes]
+    """
+    Decompress the chunks of a body sent with a gzip or deflate `Content-Encoding`.
+    Bodies that turn out not to be compressed, as HTTP clients usually decompress
+    them already, are passed through.
+    """
+    if encoding not in COMPRESSED_ENCODINGS:
+        for chunk in chunks:
+            yield chunk
+        return
+
+    # Detects gzip and zlib headers
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    chunks = iter(chunks)
+    # Read until decompressed data comes out, to tell whether it's compressed
+    read = []  # type: List[bytes]
+    for chunk in chunks:
+        read.append(chunk)
+        try:
+            data = decompressor.decompress(chunk)
+        except zlib.error:
+            # Not compressed
+            for chunk in chain(read, chunks):
+                yield chunk
+            return
+        if data:
+            yield data
+            break
+
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+def iter_text(chunks):
+    # type: (Iterable[bytes]) -> Iterator[str]
+    """
+    Decode the chunks of a UTF-8 body, possibly split within characters.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+class _Reader(object):
+    """
+    Buffer over text chunks, read as JSON values are parsed.
+    """
+
+    def __init__(self, chunks):
+        # type: (Iterable[str]) -> None
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self):
+        # type: () -> bool
+        """
+        Read chunks until the text left to parse doubles, so that a value spanning
+        many chunks is parsed again a logarithmic number of times. Return False at
+        the end of the body.
+        """
+        left = len(self.buffer) - self.pos
+        # Drop the parsed text
+        chunks = [self.buffer[self.pos :]]
+        size = left
+        for chunk in self._chunks:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= 2 * left:
+                break
+        else:
+            self.eof = True
+        if len(chunks) == 1:
+            return False
+        self.buffer = "".join(chunks)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # type: () -> str
+        """
+        Next non-whitespace character, or "" at the end of the body.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()  # type: ignore[union-attr]
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, char):
+        # type: (str) -> None
+        if self.peek() != char:
+            raise ValueError("Invalid JSON response: expected {0!r} at {1!r}".format(char, self.buffer[self.pos :]))
+        self.pos += 1
+
+    def value(self):
+        # type: () -> Any
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self.read_more():
+                    raise ValueError("Invalid JSON response: {0}".format(self.buffer[self.pos :]))
+                continue
+            # Numbers may go on in the next chunk
+            if (
+                isinstance(value, Number)
+                and not self.eof
+                and _NUMBER_TAIL.match(self.buffer, end).end() == len(self.buffer)  # type: ignore[union-attr]
+                and self.read_more()
+            ):
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        # type: () -> Iterator[Any]
+        """
+        Parse the items of the array opening at the current position, one at a time.
+        """
+        self.expect("[")
+        first = True
+        while self.peek() != "]":
+            if not first:
+                self.expect(",")
+            first = False
+            yield self.value()
+        self.pos += 1
+
+
+def iter_json(chunks):
+    # type: (Iterable[str]) -> Iterator[Any]
+    """
+    Parse a JSON body incrementally from its text chunks: yield the items of an
+    array, the `(key, value)` members of an object, or else the value itself, as
+    soon as they are read.
+
+    Arrays in the members of an object, e.g. the series of a query, are yielded as
+    iterators parsing their items as they are read, to consume before the next
+    member: the rest of their items is skipped otherwise.
+    """
+    reader = _Reader(chunks)
+    opening = reader.peek()
+    if opening not in ("[", "{"):
+        if opening:
+            yield reader.value()
+        return
+
+    if opening == "[":
+        for item in reader.items():
+            yield item
+    else:
+        reader.pos += 1
+        first = True
+        while reader.peek() != "}":
+            if not first:
+                reader.expect(",")
+            first = False
+            key = reader.value()
+            reader.expect(":")
+            if reader.peek() != "[":
+                yield key, reader.value()
+                continue
+            items = reader.items()
+            yield key, items
+            for _ in items:
+                pass
+        reader.pos += 1
+    if reader.peek():
+        raise ValueError("Invalid JSON response: extra data {0!r}".format(reader.buffer[reader.pos :]))
@@ -1,8 +1,9 @@
 # Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
-from typing import Any, Dict
+from typing import Any, Dict, Iterator
 
+from datadog.api.pagination import iter_items, iter_pages, next_page_number
 from datadog.api.resources import (
     ActionAPIResource,
     CreateableAPIResource,
@@ -30,6 +31,28 @@ class Roles(
     _resource_name = "roles"
     _api_version = "v2"
 
+    @classmethod
+    def iter_all(cls, page_size=100, prefetch=False, **params):
+        # type: (int, bool, **Any) -> Iterator[Any]
+        """
+        Iterate over all roles, fetching them lazily one page at a time.
+
+        :param page_size: number of roles per page
+        :type page_size: int
+
+        :param prefetch: fetch the next page in the background while iterating
+        :type prefetch: bool
+
+        Other parameters are the same as `get_all`.
+
+        :returns: Iterator over the roles, as dictionaries
+        """
+        params.update({"page[number]": params.get("page[number]", 0), "page[size]": page_size})
+        data = lambda page: page.get("data") or []  # noqa: E731
+        return iter_items(
+            iter_pages(cls.get_all, params, next_page_number("page[number]", page_size, data), prefetch=prefetch), data
+        )
+
     @classmethod
     def update(cls, id, **body):  # type: ignore[override]
         # type: (str, **Any) -> Any
@@ -4,8 +4,9 @@
 """
 Security Monitoring Rule API.
 """
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional
 
+from datadog.api.pagination import iter_items, iter_pages, next_page_number
 from datadog.api.resources import (
     GetableAPIResource,
     CreateableAPIResource,
@@ -44,6 +45,28 @@ class SecurityMonitoringRule(
         """
         return super(SecurityMonitoringRule, cls).get_all(**params)
 
+    @classmethod
+    def iter_all(cls, page_size=100, prefetch=False, **params):
+        # type: (int, bool, **Any) -> Iterator[Any]
+        """
+        Iterate over all security monitoring rules, fetching them lazily one page at a time.
+
+        :param page_size: number of security monitoring rules per page
+        :type page_size: int
+
+        :param prefetch: fetch the next page in the background while iterating
+        :type prefetch: bool
+
+        Other parameters are the same as `get_all`.
+
+        :returns: Iterator over the security monitoring rules, as dictionaries
+        """
+        params.update({"page[number]": params.get("page[number]", 0), "page[size]": page_size})
+        data = lambda page: page.get("data") or []  # noqa: E731
+        return iter_items(
+            iter_pages(cls.get_all, params, next_page_number("page[number]", page_size, data), prefetch=prefetch), data
+        )
+
     @classmethod
     def get(cls, rule_id, **params):  # type: ignore[override]
         # type: (str, **Any) -> Any
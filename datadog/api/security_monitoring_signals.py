@@ -4,8 +4,9 @@
 """
 Security Monitoring Signals API.
 """
-from typing import Any
+from typing import Any, Iterator
 
+from datadog.api.pagination import iter_items, iter_pages, next_cursor
 from datadog.api.resources import (
     GetableAPIResource,
     ListableAPIResource,
@@ -60,6 +61,30 @@ class SecurityMonitoringSignal(
         """
         return super(SecurityMonitoringSignal, cls).get_all(**params)
 
+    @classmethod
+    def iter_all(cls, page_size=100, prefetch=False, **params):
+        # type: (int, bool, **Any) -> Iterator[Any]
+        """
+        Iterate over all security signals, fetching them lazily one page at a time,
+        following the `page[cursor]` of each next page.
+
+        :param page_size: number of signals per page
+        :type page_size: int
+
+        :param prefetch: fetch the next page in the background while iterating
+        :type prefetch: bool
+
+        Other parameters are the same as `get_all`.
+
+        :returns: Iterator over the security signals, as dictionaries
+        """
+        params["page[size]"] = page_size
+        data = lambda page: page.get("data") or []  # noqa: E731
+        after = lambda page: ((page.get("meta") or {}).get("page") or {}).get("after")  # noqa: E731
+        return iter_items(
+            iter_pages(cls.get_all, params, next_cursor("page[cursor]", after), prefetch=prefetch), data
+        )
+
     @classmethod
     def change_triage_state(cls, signal_id, state, **params):
         # type: (str, str, **Any) -> Any
@@ -1,9 +1,10 @@
 # Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from datadog.util.format import force_to_epoch_seconds
+from datadog.api.pagination import iter_items, iter_pages, next_offset
 from datadog.api.resources import (
     GetableAPIResource,
     CreateableAPIResource,
@@ -93,6 +94,26 @@ class ServiceLevelObjective(
 
         return super(ServiceLevelObjective, cls).get_all(**search_terms)
 
+    @classmethod
+    def iter_all(cls, limit=100, prefetch=False, **params):
+        # type: (int, bool, **Any) -> Iterator[Any]
+        """
+        Iterate over all SLOs, fetching them lazily `limit` SLOs at a time.
+
+        :param limit: number of SLOs per page (default: 100)
+        :type limit: int
+
+        :param prefetch: fetch the next page in the background while iterating
+        :type prefetch: bool
+
+        Other parameters are the same as `get_all`.
+
+        :returns: Iterator over the SLOs, as dictionaries
+        """
+        params.update(offset=params.get("offset", 0), limit=limit)
+        data = lambda page: page.get("data") or []  # noqa: E731
+        return iter_items(iter_pages(cls.get_all, params, next_offset("offset", limit, data), prefetch=prefetch), data)
+
     @classmethod
     def update(cls, id, params=None, **body):
         # type: (str, Optional[Any], **Any) -> Any
@@ -0,0 +1,300 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Disk spool of the metric payloads that couldn't be sent, replayed once the API is reachable.
+"""
+# stdlib
+from collections import OrderedDict
+import errno
+import logging
+import os
+import struct
+from threading import Event, Lock, Thread
+import zlib
+from typing import IO, Callable, List, Optional, Tuple  # noqa: F401
+
+log = logging.getLogger("datadog.api")
+
+# Records are prefixed with the length and CRC32 of their content
+_RECORD_HEADER = struct.Struct(">II")
+_SEGMENT_SUFFIX = ".spool"
+# Segments are rotated once they reach that fraction of the spool size
+_SEGMENTS_PER_SPOOL = 8
+
+# `os.replace` requires Python 3.3+
+_replace = getattr(os, "replace", os.rename)
+
+
+def _parse_segment_name(name):
+    # type: (str) -> Optional[Tuple[Optional[int], int]]
+    """
+    `(pid, sequence)` of a segment named `{pid}-{sequence}.spool`, with no pid for
+    `{sequence}.spool` segments of older versions, or None for other files.
+    """
+    if not name.endswith(_SEGMENT_SUFFIX):
+        return None
+    parts = name[: -len(_SEGMENT_SUFFIX)].split("-")
+    if not all(part.isdigit() for part in parts):
+        return None
+    if len(parts) == 1:
+        return None, int(parts[0])
+    if len(parts) == 2:
+        return int(parts[0]), int(parts[1])
+    return None
+
+
+def _is_running(pid):
+    # type: (int) -> bool
+    """
+    Whether a process is running, as far as we can tell: other processes are
+    considered gone where it can't be checked, i.e. on Windows.
+    """
+    if os.name != "posix":
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def _encode_record(path, api_version, data):
+    # type: (str, Optional[str], bytes) -> bytes
+    content = "{0} {1}\n".format(api_version or "", path).encode("utf-8") + data
+    return _RECORD_HEADER.pack(len(content), zlib.crc32(content) & 0xFFFFFFFF) + content
+
+
+def _decode_records(buf):
+    # type: (bytes) -> List[Tuple[str, Optional[str], bytes, int]]
+    """
+    Decode the records of a segment, as `(path, api_version, data, end offset)`. A record
+    torn or corrupted, e.g. by a crash while it was written, ends the segment.
+    """
+    records = []
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(buf):
+        length, crc = _RECORD_HEADER.unpack_from(buf, offset)
+        start = offset + _RECORD_HEADER.size
+        content = buf[start : start + length]
+        if len(content) < length or zlib.crc32(content) & 0xFFFFFFFF != crc:
+            log.warning("Ignoring %s corrupted bytes at the end of a spool segment", len(buf) - offset)
+            break
+        header, data = content.split(b"\n", 1)
+        api_version, path = header.decode("utf-8").split(" ", 1)
+        offset = start + length
+        records.append((path, api_version or None, data, offset))
+    return records
+
+
+class Spool(object):
+    """
+    Append-only segment files, in the `path` directory, of API payloads encoded as
+    JSON and compressed with zlib, taking at most `max_size` bytes.
+
+    Once the spool is full, its oldest segments are dropped to make room. Payloads
+    are replayed oldest first, segments being removed once fully sent.
+
+    Each process, e.g. a forked child, writes and replays its own segments, named
+    after its pid. Those of processes no longer running are taken over on replay.
+    Processes can only be told apart on POSIX systems: elsewhere, `path` must not
+    be shared by processes running at the same time.
+    """
+
+    def __init__(self, path, max_size):
+        # type: (str, int) -> None
+        self.path = path
+        self.max_size = max_size
+        self._segment_size = max(max_size // _SEGMENTS_PER_SPOOL, 1)
+        self._lock = Lock()
+        # Serializes replays, which don't hold `_lock` while sending
+        self._replay_lock = Lock()
+        # Size of the segments by name, oldest first, the last one being written to
+        self._segments = OrderedDict()  # type: OrderedDict[str, int]
+        self._active = None  # type: Optional[IO[bytes]]
+        self._pid = os.getpid()
+        self._next_sequence = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with self._lock:
+            # Left over by an earlier process with the same pid
+            for pid, sequence, name in self._list_segments():
+                if pid == self._pid:
+                    self._segments[name] = os.path.getsize(os.path.join(path, name))
+                    self._next_sequence = sequence + 1
+            self._adopt_segments()
+
+    def _list_segments(self):
+        # type: () -> List[Tuple[Optional[int], int, str]]
+        """
+        `(pid, sequence, name)` of the segments in the spool directory, oldest first.
+        Other files are left alone.
+        """
+        segments = []
+        for name in os.listdir(self.path):
+            parsed = _parse_segment_name(name)
+            if parsed is not None:
+                segments.append((parsed[0], parsed[1], name))
+        return sorted(segments, key=lambda segment: (segment[1], segment[0] or 0))
+
+    def _new_segment_name(self):
+        # type: () -> str
+        name = "{0}-{1:020d}{2}".format(self._pid, self._next_sequence, _SEGMENT_SUFFIX)
+        self._next_sequence += 1
+        return name
+
+    def _adopt_segments(self):
+        # type: () -> None
+        """
+        Take over the segments of processes no longer running, and those of older
+        versions, as the oldest ones of this spool.
+        """
+        adopted = OrderedDict()  # type: OrderedDict[str, int]
+        for pid, _, name in self._list_segments():
+            if pid == self._pid or (pid is not None and _is_running(pid)):
+                continue
+            new_name = self._new_segment_name()
+            try:
+                # Fails for the other processes taking it over at the same time
+                os.rename(os.path.join(self.path, name), os.path.join(self.path, new_name))
+                adopted[new_name] = os.path.getsize(os.path.join(self.path, new_name))
+            except OSError:
+                continue
+        if adopted:
+            adopted.update(self._segments)
+            self._segments = adopted
+            self._drop_oldest()
+
+    def size(self):
+        # type: () -> int
+        with self._lock:
+            return sum(self._segments.values())
+
+    def append(self, path, api_version, data):
+        # type: (str, Optional[str], bytes) -> None
+        """
+        Spool the compressed JSON body of a call to the `path` endpoint.
+        """
+        record = _encode_record(path, api_version, data)
+        if len(record) > self.max_size:
+            log.warning("Dropping a %s payload of %s bytes, larger than the spool", path, len(data))
+            return
+
+        with self._lock:
+            if self._active is None:
+                name = self._new_segment_name()
+                self._active = open(os.path.join(self.path, name), "ab")
+                self._segments[name] = 0
+            self._active.write(record)
+            self._active.flush()
+            name = next(reversed(self._segments))
+            self._segments[name] += len(record)
+            if self._segments[name] >= self._segment_size:
+                self._close_active()
+            self._drop_oldest()
+
+    def _close_active(self):
+        # type: () -> None
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+
+    def _drop_oldest(self):
+        # type: () -> None
+        """
+        Remove the oldest segments until the spool fits in `max_size`.
+        """
+        total = sum(self._segments.values())
+        while total > self.max_size and len(self._segments) > 1:
+            name, size = self._segments.popitem(last=False)
+            self._remove(name)
+            total -= size
+            log.warning("Spool is full, dropped %s bytes of the oldest payloads", size)
+
+    def _remove(self, name):
+        # type: (str) -> None
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError as e:
+            log.warning("Could not remove spool segment %s: %s", name, e)
+
+    def replay(self, send):
+        # type: (Callable[[str, Optional[str], bytes], bool]) -> int
+        """
+        Replay the spooled payloads with `send(path, api_version, data)`, oldest first,
+        until it returns False, i.e. the API is unreachable. Return the number of
+        payloads replayed.
+        """
+        replayed = 0
+        with self._replay_lock:
+            with self._lock:
+                # Payloads spooled from now on go to a new segment
+                self._close_active()
+                self._adopt_segments()
+                names = list(self._segments)
+
+            for name in names:
+                try:
+                    with open(os.path.join(self.path, name), "rb") as segment:
+                        buf = segment.read()
+                except (IOError, OSError):
+                    # Dropped since, as the spool is full
+                    continue
+
+                offset = 0
+                for path, api_version, data, end in _decode_records(buf):
+                    if not send(path, api_version, data):
+                        self._truncate(name, buf[offset:])
+                        return replayed
+                    offset = end
+                    replayed += 1
+
+                with self._lock:
+                    if self._segments.pop(name, None) is not None:
+                        self._remove(name)
+        return replayed
+
+    def _truncate(self, name, rest):
+        # type: (str, bytes) -> None
+        """
+        Keep the records of a segment that remain to be replayed.
+        """
+        with self._lock:
+            if name not in self._segments:
+                return
+            segment_path = os.path.join(self.path, name)
+            with open(segment_path + ".tmp", "wb") as segment:
+                segment.write(rest)
+            _replace(segment_path + ".tmp", segment_path)
+            self._segments[name] = len(rest)
+
+
+class SpoolReplayer(Thread):
+    """
+    Background thread replaying a spool every `interval` seconds.
+    """
+
+    def __init__(self, spool, send, interval):
+        # type: (Spool, Callable[[str, Optional[str], bytes], bool], float) -> None
+        super(SpoolReplayer, self).__init__(name="datadog-api-spool")
+        self.daemon = True
+        self.spool = spool
+        self.interval = interval
+        self._send = send
+        self._stopped = Event()
+
+    def run(self):
+        # type: () -> None
+        while not self._stopped.wait(self.interval):
+            try:
+                replayed = self.spool.replay(self._send)
+            except Exception:
+                log.exception("Failed to replay the spooled payloads")
+                continue
+            if replayed:
+                log.info("Replayed %s spooled payloads", replayed)
+
+    def stop(self):
+        # type: () -> None
+        self._stopped.set()
@@ -2,7 +2,7 @@ import threading
 import sys
 
 if sys.version_info[:2] >= (3, 5):
-    from typing import Any, Dict, List, Optional  # noqa: F401
+    from typing import Any, Dict, List, Optional, Tuple  # noqa: F401
 
 from datadog.dogstatsd.metrics import (
     CountMetric,
@@ -39,6 +39,8 @@ class Aggregator(object):
             MetricType.GAUGE: threading.RLock(),
             MetricType.SET: threading.RLock(),
         }
+        self.service_checks = {}  # type: Dict[Tuple[str, Optional[str], Tuple[str, ...]], str]
+        self._service_checks_lock = threading.Lock()
         self.cardinality = cardinality
 
     def flush_aggregated_metrics(self):
@@ -53,6 +55,13 @@ class Aggregator(object):
 
         return metrics
 
+    def flush_service_checks(self):
+        # type: () -> List[str]
+        with self._service_checks_lock:
+            service_checks = self.service_checks
+            self.service_checks = {}
+        return list(service_checks.values())
+
     def set_max_samples_per_context(self, max_samples_per_context=0):
         # type: (int) -> None
         self.max_samples_per_context = max_samples_per_context
@@ -135,3 +144,11 @@ class Aggregator(object):
             cardinality = self.cardinality
             validate_cardinality(cardinality)
         return metric_context.sample(name, value, tags, rate, context_key, self.max_samples_per_context, cardinality)
+
+    def service_check(self, check_name, hostname, tags, payload):
+        # type: (str, Optional[str], Optional[List[str]], str) -> None
+        """Store a serialized service check run, replacing any previous run of the same check."""
+        # Runs with the same tags in a different order are runs of the same check
+        key = (check_name, hostname, tuple(sorted(tags)) if tags else ())
+        with self._service_checks_lock:
+            self.service_checks[key] = payload
@@ -8,7 +8,6 @@
 DogStatsd is a Python client for DogStatsd, a Statsd fork for Datadog.
 """
 # Standard libraries
-from random import random
 import logging
 import os
 import socket
@@ -48,7 +47,8 @@ from datadog.dogstatsd.context import (
     DistributedContextManagerDecorator,
 )
 from datadog.dogstatsd.route import get_default_route
-from datadog.dogstatsd.container import Cgroup
+from datadog.dogstatsd.sampling import random, reseed as reseed_sampling
+from datadog.dogstatsd.container import get_container_id, reset_container_id
 from datadog.util.compat import text, urlparse
 from datadog.util.format import normalize_tags, validate_cardinality
 from datadog.version import __version__
@@ -244,6 +244,13 @@ def post_fork_parent():
 
 def post_fork_child():
     # type: () -> None
+    """Reset all client instances in a forked child process.
+
+    If SUPPORTS_FORKING is true, this will be called automatically after os.fork().
+    """
+    # Make sure the child doesn't replay the parent's sampling decisions.
+    reseed_sampling()
+    reset_container_id()
     for c in _instances:
         c.post_fork_child()
 
@@ -298,6 +305,8 @@ class DogStatsd(object):
         sender_queue_timeout=0,                 # type: Optional[float]
         track_instance=True,                    # type: bool
         socket_connect_timeout=DEFAULT_SOCKET_CONNECT_TIMEOUT,  # type: Optional[float]
+        flush_on_fork=True,                     # type: bool
+        coalesce_service_checks=False,          # type: bool
     ):  # type: (...) -> None
         """
         Initialize a DogStatsd object.
@@ -496,6 +505,20 @@ class DogStatsd(object):
         if supported.
         Default: True.
         :type track_instance: boolean
+
+        :param flush_on_fork: Flush pending metrics and stop the background threads before os.fork() is
+        called, then restart them in both processes afterwards. Optional.
+        If set to False, the parent keeps its aggregator and background threads running through the fork,
+        and the child starts with an empty aggregator, an empty buffer and a fresh socket. This makes forking
+        cheaper for servers that spawn workers on demand.
+        Default: True.
+        :type flush_on_fork: boolean
+
+        :param coalesce_service_checks: When aggregation is enabled, only send the latest run of each
+        service check (per check name, hostname and tags) at every flush. Optional.
+        Useful for health checks reported more often than the flush interval.
+        Default: False.
+        :type coalesce_service_checks: boolean
         """
 
         self._socket_lock = Lock()
@@ -526,6 +549,9 @@ class DogStatsd(object):
             self._enabled = False
 
         # Connection
+        self._host = None  # type: Optional[Text]
+        self._use_default_route = False
+        self._default_route_pending = False
         self._max_buffer_len = max_buffer_len
         self.socket_timeout = socket_timeout
         self.socket_connect_timeout = socket_connect_timeout
@@ -535,8 +561,11 @@ class DogStatsd(object):
             self.port = None
         else:
             self.socket_path = None
-            self.host = self.resolve_host(host, use_default_route)
+            self.host = host
             self.port = int(port)
+            # The default route is only resolved when the host is first used.
+            self._use_default_route = use_default_route
+            self._default_route_pending = use_default_route
 
         self.telemetry_socket_path = telemetry_socket_path  # type: Optional[Text]
         self.telemetry_host = None  # type: Optional[Text]
@@ -568,6 +597,7 @@ class DogStatsd(object):
             constant_tags = []
 
         self._constant_tags_str = ""
+        self._joined_constant_tags_str = ""
         self._constant_tags = TagList()
         self.constant_tags = TagList(constant_tags + env_tags)
 
@@ -579,7 +609,9 @@ class DogStatsd(object):
         self.cardinality = cardinality
 
         # Origin detection
-        self._container_id = None  # type: Optional[Text]
+        self._resolved_container_id = None  # type: Optional[Text]
+        self._origin_detection = False
+        self._origin_detection_pending = False
         origin_detection_enabled = self._is_origin_detection_enabled(
             container_id, origin_detection_enabled
         )
@@ -611,6 +643,8 @@ class DogStatsd(object):
         self.aggregator = Aggregator(max_metric_samples_per_context, self.cardinality)
         # Indicates if the process is about to fork, so we shouldn't start any new threads yet.
         self._forking = False
+        self._flush_on_fork = flush_on_fork
+        self._coalesce_service_checks = coalesce_service_checks
 
         if not self._disable_buffering:
             self._send = self._send_to_buffer
@@ -643,6 +677,36 @@ class DogStatsd(object):
         with self._socket_lock:
             self._socket_path = path
 
+    @property
+    def host(self):
+        # type: () -> Optional[Text]
+        if self._default_route_pending:
+            self._host = self.resolve_host(self._host, True)
+            self._default_route_pending = False
+        return self._host
+
+    @host.setter
+    def host(self, host):
+        # type: (Optional[Text]) -> None
+        self._host = host
+        self._use_default_route = False
+        self._default_route_pending = False
+
+    @property
+    def _container_id(self):
+        # type: () -> Optional[Text]
+        if self._origin_detection_pending:
+            self._resolved_container_id = get_container_id()
+            self._origin_detection_pending = False
+        return self._resolved_container_id
+
+    @_container_id.setter
+    def _container_id(self, container_id):
+        # type: (Optional[Text]) -> None
+        self._resolved_container_id = container_id
+        self._origin_detection = False
+        self._origin_detection_pending = False
+
     @property
     def socket(self):
         # type: () -> Optional[_Socket]
@@ -1186,6 +1250,12 @@ class DogStatsd(object):
                 cardinality=m.cardinality,
             )
 
+        service_checks = self.aggregator.flush_service_checks()
+        for payload in service_checks:
+            if self._telemetry:
+                self.service_checks_count += 1
+            self._send(payload)
+
     def gauge(
         self,
         metric,  # type: Text
@@ -1492,9 +1562,10 @@ class DogStatsd(object):
             else:
                 parts.append(constant_tags_str)
 
-        if self._container_id:
+        container_id = self._container_id
+        if container_id:
             parts.append("|c:")
-            parts.append(self._container_id)
+            parts.append(container_id)
 
         if self._external_data:
             parts.append("|e:")
@@ -1768,39 +1839,15 @@ class DogStatsd(object):
             if not isinstance(message, unicode):                                     # noqa: F821
                 message = unicode(DogStatsd._escape_event_content(message), 'utf8')  # noqa: F821
 
-        # Append all client level tags to every event
-        tags = self._add_constant_tags(tags)
-
-        string = u"_e{{{},{}}}:{}|{}".format(
-            len(title.encode('utf8', 'replace')),
-            len(message.encode('utf8', 'replace')),
-            title,
-            message,
-        )
-
         if cardinality is None:
             cardinality = self.cardinality
 
         validate_cardinality(cardinality)
 
-        if date_happened:
-            string = "%s|d:%d" % (string, date_happened)
-        if hostname:
-            string = "%s|h:%s" % (string, hostname)
-        if aggregation_key:
-            string = "%s|k:%s" % (string, aggregation_key)
-        if priority:
-            string = "%s|p:%s" % (string, priority)
-        if source_type_name:
-            string = "%s|s:%s" % (string, source_type_name)
-        if alert_type:
-            string = "%s|t:%s" % (string, alert_type)
-        if tags:
-            string = "%s|#%s" % (string, ",".join(tags))
-        if self._container_id:
-            string = "%s|c:%s" % (string, self._container_id)
-        if cardinality:
-            string = "%s|card:%s" % (string, cardinality)
+        string = self._serialize_event(
+            title, message, alert_type, aggregation_key, source_type_name,
+            date_happened, priority, tags, hostname, cardinality,
+        )
 
         if len(string) > 8 * 1024:
             raise ValueError(
@@ -1814,6 +1861,62 @@ class DogStatsd(object):
 
         self._send(string)
 
+    def _serialize_event(
+        self,
+        title,  # type: Text
+        message,  # type: Text
+        alert_type,  # type: Optional[str]
+        aggregation_key,  # type: Optional[Text]
+        source_type_name,  # type: Optional[Text]
+        date_happened,  # type: Optional[int]
+        priority,  # type: Optional[str]
+        tags,  # type: Optional[List[str]]
+        hostname,  # type: Optional[Text]
+        cardinality,  # type: Optional[str]
+    ):
+        # type: (...) -> Text
+        parts = [
+            u"_e{",
+            text(len(title.encode('utf8', 'replace'))),
+            u",",
+            text(len(message.encode('utf8', 'replace'))),
+            u"}:",
+            title,
+            u"|",
+            message,
+        ]
+
+        if date_happened:
+            parts.append("|d:%d" % date_happened)
+        if hostname:
+            parts.append("|h:")
+            parts.append(text(hostname))
+        if aggregation_key:
+            parts.append("|k:")
+            parts.append(text(aggregation_key))
+        if priority:
+            parts.append("|p:")
+            parts.append(text(priority))
+        if source_type_name:
+            parts.append("|s:")
+            parts.append(text(source_type_name))
+        if alert_type:
+            parts.append("|t:")
+            parts.append(text(alert_type))
+
+        # Append all client level tags to every event
+        self._append_tags_with_constant_tags(parts, tags)
+
+        container_id = self._container_id
+        if container_id:
+            parts.append("|c:")
+            parts.append(container_id)
+        if cardinality:
+            parts.append("|card:")
+            parts.append(cardinality)
+
+        return u"".join(parts)
+
     def service_check(
         self,
         check_name,
@@ -1828,37 +1931,70 @@ class DogStatsd(object):
         """
         Send a service check run.
 
+        If the client aggregates metrics and was created with coalesce_service_checks=True,
+        only the latest run of each check (per check name, host and tags) is sent at every flush.
+
         >>> statsd.service_check("my_service.check_name", DogStatsd.WARNING)
         """
         message = DogStatsd._escape_service_check_message(message) if message is not None else ""
 
-        string = u"_sc|{0}|{1}".format(check_name, status)
-
-        # Append all client level tags to every status check
-        tags = self._add_constant_tags(tags)
-
         if cardinality is None:
             cardinality = self.cardinality
 
         validate_cardinality(cardinality)
 
+        string = self._serialize_service_check(check_name, status, tags, timestamp, hostname, message, cardinality)
+
+        if self._coalesce_service_checks and not self._disable_aggregation:
+            self.aggregator.service_check(check_name, hostname, tags, string)
+            return
+
+        if self._telemetry:
+            self.service_checks_count += 1
+
+        self._send(string)
+
+    def _serialize_service_check(self, check_name, status, tags, timestamp, hostname, message, cardinality):
+        # type: (str, int, Optional[List[str]], Optional[int], Optional[str], str, Optional[str]) -> Text
+        parts = [u"_sc|", text(check_name), u"|", text(status)]
+
         if timestamp:
-            string = u"{0}|d:{1}".format(string, timestamp)
+            parts.append(u"|d:")
+            parts.append(text(timestamp))
         if hostname:
-            string = u"{0}|h:{1}".format(string, hostname)
-        if tags:
-            string = u"{0}|#{1}".format(string, ",".join(tags))
+            parts.append(u"|h:")
+            parts.append(text(hostname))
+
+        # Append all client level tags to every status check
+        self._append_tags_with_constant_tags(parts, tags)
+
         if message:
-            string = u"{0}|m:{1}".format(string, message)
-        if self._container_id:
-            string = u"{0}|c:{1}".format(string, self._container_id)
+            parts.append(u"|m:")
+            parts.append(message)
+
+        container_id = self._container_id
+        if container_id:
+            parts.append(u"|c:")
+            parts.append(container_id)
         if cardinality:
-            string = u"{0}|card:{1}".format(string, cardinality)
+            parts.append(u"|card:")
+            parts.append(cardinality)
 
-        if self._telemetry:
-            self.service_checks_count += 1
+        return u"".join(parts)
 
-        self._send(string)
+    def _append_tags_with_constant_tags(self, parts, tags):
+        # type: (List[Text], Optional[List[str]]) -> None
+        """Append the tags field, including the client constant tags, to the parts of a packet."""
+        constant_tags_str = self._joined_constant_tags_str
+        if tags:
+            parts.append(u"|#")
+            parts.append(u",".join(tags))
+            if constant_tags_str:
+                parts.append(u",")
+                parts.append(constant_tags_str)
+        elif constant_tags_str:
+            parts.append(u"|#")
+            parts.append(constant_tags_str)
 
     @staticmethod
     def _normalize_and_join_tags(tags):
@@ -1873,6 +2009,8 @@ class DogStatsd(object):
         # type: () -> None
         with self._config_lock:
             self._constant_tags_str = self._normalize_and_join_tags(self._constant_tags)
+            # Events and service checks don't normalize tags.
+            self._joined_constant_tags_str = ",".join(self._constant_tags)
 
     @property
     def constant_tags(self):
@@ -1886,16 +2024,6 @@ class DogStatsd(object):
             self._constant_tags = TagList(value or [], on_change=self._rebuild_constant_tags_str)
             self._rebuild_constant_tags_str()
 
-    def _add_constant_tags(self, tags):
-        # type: (Optional[List[str]]) -> Optional[List[str]]
-        with self._config_lock:
-            if self._constant_tags:
-                if tags:
-                    return tags + self._constant_tags
-
-                return list(self._constant_tags)
-        return tags
-
     def _is_origin_detection_enabled(self, container_id, origin_detection_enabled):
         # type: (Optional[Text], bool) -> bool
         """
@@ -1915,18 +2043,14 @@ class DogStatsd(object):
         # type: (Optional[Text], bool) -> None
         """
         Initializes the container ID.
-        It can either be provided by the user or read from cgroups.
+        It can either be provided by the user or read from cgroups. Reading
+        from cgroups is deferred until the container ID is first needed.
         """
         if container_id:
             self._container_id = container_id
             return
-        if origin_detection_enabled:
-            try:
-                reader = Cgroup()
-                self._container_id = reader.container_id
-            except Exception as e:
-                log.debug("Couldn't get container ID: %s", str(e))
-                self._container_id = None
+        self._origin_detection = origin_detection_enabled
+        self._origin_detection_pending = origin_detection_enabled
 
     def _start_sender_thread(self):
         # type: () -> None
@@ -1994,7 +2118,8 @@ class DogStatsd(object):
         # type: () -> None
         """Prepare client for a process fork.
 
-        Flush any pending payloads and stop all background threads.
+        Flush any pending payloads and stop all background threads, unless
+        the client was created with flush_on_fork=False.
 
         The client should not be used from this point until
         state is restored by calling post_fork_parent() or
@@ -2008,14 +2133,17 @@ class DogStatsd(object):
         # will clean up in post_fork_child.
 
         self._config_lock.acquire()
+        if not self._flush_on_fork:
+            return
         self._stop_flush_thread()
         self._stop_sender_thread()
 
     def post_fork_parent(self):
         # type: () -> None
         """Restore the client state after a fork in the parent process."""
-        self._start_flush_thread()
-        self._start_sender_thread()
+        if self._flush_on_fork:
+            self._start_flush_thread()
+            self._start_sender_thread()
         self._config_lock.release()
 
     def post_fork_child(self):
@@ -2029,6 +2157,19 @@ class DogStatsd(object):
         self._socket_lock = Lock()
         self._buffer_lock = RLock()
 
+        if not self._flush_on_fork:
+            # The parent kept its background threads running through the
+            # fork: they don't exist in the child, and their queue, events
+            # and aggregator locks may have been held at the time of the
+            # fork. The aggregated values belong to the parent, so start
+            # from an empty aggregator instead of reporting them twice.
+            self._flush_thread = None
+            self._flush_thread_stop = threading.Event()
+            self._queue = None
+            self._sender_thread = None
+            self.aggregator = Aggregator(self.aggregator.max_samples_per_context, self.cardinality)
+            self._reset_telemetry()
+
         # Reset the buffer so we don't send metrics from the parent
         # process. Also makes sure buffer properties are consistent.
         self._reset_buffer()
@@ -2037,6 +2178,10 @@ class DogStatsd(object):
         self.socket_path = self.socket_path
         self.close_socket()
 
+        # Resolve the container ID and default route again in this process.
+        self._origin_detection_pending = self._origin_detection
+        self._default_route_pending = self._use_default_route
+
         with self._config_lock:
             self._start_flush_thread()
             self._start_sender_thread()
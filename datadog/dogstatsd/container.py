@@ -4,13 +4,17 @@
 # Copyright 2015-Present Datadog, Inc
 
 import errno
+import logging
 import os
 import re
 import sys
+import threading
 
 if sys.version_info[:2] >= (3, 5):
     from typing import Optional  # noqa: F401
 
+log = logging.getLogger("datadog.dogstatsd")
+
 
 class UnresolvableContainerID(Exception):
     """
@@ -117,3 +121,40 @@ class Cgroup(object):
                     return "in-{0}".format(inode)
 
         return None
+
+
+# The container ID is resolved at most once per process and shared by all
+# clients. It is reset in forked children by reset_container_id().
+_container_id = None  # type: Optional[str]
+_container_id_resolved = False
+_container_id_lock = threading.Lock()
+
+
+def get_container_id():
+    # type: () -> Optional[str]
+    """
+    Return the container ID of the current process, reading cgroups on the first call only.
+
+    Returns None when the container ID cannot be resolved.
+    """
+    global _container_id, _container_id_resolved
+    if not _container_id_resolved:
+        with _container_id_lock:
+            if not _container_id_resolved:
+                try:
+                    _container_id = Cgroup().container_id
+                except Exception as e:
+                    log.debug("Couldn't get container ID: %s", str(e))
+                    _container_id = None
+                _container_id_resolved = True
+    return _container_id
+
+
+def reset_container_id():
+    # type: () -> None
+    """Forget the cached container ID, so that it is resolved again on next use."""
+    global _container_id, _container_id_resolved, _container_id_lock
+    # The lock may have been held by another thread at the time of a fork.
+    _container_id_lock = threading.Lock()
+    _container_id = None
+    _container_id_resolved = False
@@ -1,4 +1,3 @@
-import random
 import sys
 
 if sys.version_info[:2] >= (3, 5):
@@ -8,6 +7,7 @@ else:
 
     from datadog.util.compat import cast
 
+from datadog.dogstatsd import sampling
 from datadog.dogstatsd.metric_types import MetricType
 from datadog.dogstatsd.metrics import MetricAggregator
 from threading import Lock
@@ -44,7 +44,7 @@ class MaxSampleMetric(object):
                 self.data[self.stored_metric_samples] = value
                 self.stored_metric_samples += 1
             else:
-                i = random.randint(0, self.total_metric_samples - 1)
+                i = sampling.randbelow(self.total_metric_samples)
                 if i < self.max_metric_samples:
                     self.data[i] = value
         else:
@@ -1,7 +1,8 @@
 from threading import Lock
-import random
 import sys
 
+from datadog.dogstatsd import sampling
+
 if sys.version_info[:2] >= (3, 5):
     from typing import Any, Dict, List, Optional, TYPE_CHECKING  # noqa: F401
 
@@ -49,4 +50,4 @@ class MaxSampleMetricContexts:
         """Determine if a sample should be kept based on the specified rate."""
         if rate >= 1:
             return True
-        return random.random() < rate
+        return sampling.random() < rate
@@ -0,0 +1,56 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Per-thread pseudo-random number generation for client-side sampling.
+
+The module-level functions of `random` share a single generator between all
+threads. Each thread gets its own `random.Random` instance here instead, so
+sampling decisions never contend on a shared generator. Generators are
+re-seeded lazily after `reseed()` is called, which the fork hooks do in the
+child process so that forked workers don't make identical sampling decisions.
+"""
+import random as _random
+import threading
+
+# Bumped on every reseed(); thread-local generators created for an older
+# generation are discarded and re-seeded from the OS entropy source.
+_generation = 0
+
+
+class _LocalGenerator(threading.local):
+    def __init__(self):
+        # type: () -> None
+        self.generation = -1
+        self.rng = _random.Random()
+
+
+_local = _LocalGenerator()
+
+
+def _generator():
+    # type: () -> _random.Random
+    local = _local
+    if local.generation != _generation:
+        local.rng = _random.Random()
+        local.generation = _generation
+    return local.rng
+
+
+def random():
+    # type: () -> float
+    """Return the next random float in [0.0, 1.0) from the calling thread's generator."""
+    return _generator().random()
+
+
+def randbelow(n):
+    # type: (int) -> int
+    """Return a random int in [0, n) from the calling thread's generator."""
+    return int(_generator().random() * n)
+
+
+def reseed():
+    # type: () -> None
+    """Invalidate all per-thread generators so they are re-seeded on their next use."""
+    global _generation
+    _generation += 1
@@ -25,8 +25,18 @@ except ImportError:
 from datadog.api.exceptions import ApiNotInitialized
 from datadog.threadstats.constants import MetricType
 from datadog.threadstats.events import EventsAggregator
-from datadog.threadstats.metrics import MetricsAggregator, Counter, Gauge, Histogram, Timing, Distribution, Set
-from datadog.threadstats.reporters import HttpReporter
+from datadog.threadstats.metrics import (
+    DEFAULT_NUM_BUCKETS,
+    MetricsAggregator,
+    Counter,
+    Gauge,
+    Histogram,
+    Timing,
+    Distribution,
+    Set,
+    percentile_name,
+)
+from datadog.threadstats.reporters import BackgroundHttpReporter, HttpReporter
 
 # Loggers
 log = logging.getLogger("datadog.threadstats")
@@ -39,7 +49,9 @@ DD_ENV_TAGS_MAPPING = {
 
 
 class ThreadStats(object):
-    def __init__(self, namespace="", constant_tags=None, compress_payload=False):
+    def __init__(
+        self, namespace="", constant_tags=None, compress_payload=False, percentiles=None, relative_accuracy=None
+    ):
         """
         Initialize a threadstats object.
 
@@ -52,6 +64,17 @@ class ThreadStats(object):
         :param compress_payload: compress the payload using zlib
         :type compress_payload: bool
 
+        :param percentiles: Percentiles reported by histograms and timings, as floats
+            between 0 and 1 (default: [0.75, 0.85, 0.95, 0.99]), e.g. as `.99percentile`
+            for 0.99 or `.99_9percentile` for 0.999
+        :type percentiles: list of floats
+
+        :param relative_accuracy: If set, estimate histogram and timing percentiles with
+            a mergeable quantile sketch accurate to this relative error (e.g. 0.01 for 1%),
+            instead of a fixed-size random sample of the values. Each context then uses
+            constant memory and percentiles stay accurate for high-volume contexts.
+        :type relative_accuracy: float
+
         :envvar DATADOG_TAGS: Tags to attach to every metric reported by ThreadStats client
         :type DATADOG_TAGS: comma-delimited string
 
@@ -78,6 +101,18 @@ class ThreadStats(object):
             constant_tags = []
         self.constant_tags = constant_tags + env_tags
 
+        if relative_accuracy is not None and not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1, got {}".format(relative_accuracy))
+        if percentiles is not None:
+            for percentile in percentiles:
+                if not 0 < percentile <= 1:
+                    raise ValueError("percentiles must be between 0 and 1, got {}".format(percentile))
+            names = [percentile_name(percentile) for percentile in percentiles]
+            if len(set(names)) != len(names):
+                raise ValueError("percentiles must be reported as distinct series, got {}".format(names))
+        self.percentiles = percentiles
+        self.relative_accuracy = relative_accuracy
+
         # State
         self._disabled = True
         self.compress_payload = compress_payload
@@ -90,6 +125,8 @@ class ThreadStats(object):
         flush_in_thread=True,
         flush_in_greenlet=False,
         disabled=False,
+        flush_in_background=False,
+        reporter=None,
     ):
         """
         Start the ThreadStats instance with the specified metric flushing method and preferences.
@@ -134,6 +171,13 @@ class ThreadStats(object):
         :type flush_in_greenlet: bool
         :param disabled: Disable metrics collection
         :type disabled: bool
+        :param flush_in_background: Set to true to post flushed metrics and events to the API
+            from a worker thread, with a bounded queue and retries, so that a slow API doesn't
+            hold flushes back. See ``BackgroundHttpReporter``.
+        :type flush_in_background: bool
+        :param reporter: The reporter metrics and events are flushed to, instead of the API.
+            For instance, a ``DogStatsdReporter`` forwards them to a local Datadog Agent.
+        :type reporter: Reporter
         """
         self.flush_interval = flush_interval
         self.roll_up_interval = roll_up_interval
@@ -142,13 +186,25 @@ class ThreadStats(object):
         self._is_auto_flushing = False
 
         # Create an aggregator
-        self._metric_aggregator = MetricsAggregator(self.roll_up_interval)
+        # Size the ring so that all the intervals pending between two flushes get their own bucket
+        num_buckets = max(DEFAULT_NUM_BUCKETS, int(self.flush_interval // self.roll_up_interval) + 2)
+        self._metric_aggregator = MetricsAggregator(
+            self.roll_up_interval,
+            percentiles=self.percentiles,
+            relative_accuracy=self.relative_accuracy,
+            num_buckets=num_buckets,
+        )
         self._event_aggregator = EventsAggregator()
 
         # The reporter is responsible for sending metrics off to their final destination.
         # It's abstracted to support easy unit testing and in the near future, forwarding
         # to the datadog agent.
-        self.reporter = HttpReporter(compress_payload=self.compress_payload)
+        if reporter is not None:
+            self.reporter = reporter
+        elif flush_in_background:
+            self.reporter = BackgroundHttpReporter(compress_payload=self.compress_payload)
+        else:
+            self.reporter = HttpReporter(compress_payload=self.compress_payload)
 
         self._is_flush_in_progress = False
         self.flush_count = 0
@@ -274,8 +330,9 @@ class ThreadStats(object):
         """
         Sample a histogram value. Histograms will produce metrics that
         describe the distribution of the recorded values, namely the maximum, minimum,
-        average, count and the 75/85/95/99 percentiles. Optionally, specify
-        a list of ``tags`` to associate with the metric.
+        average, count and the 75/85/95/99 percentiles (or the ``percentiles`` the
+        client was created with). Optionally, specify a list of ``tags`` to
+        associate with the metric.
 
         >>> stats.histogram("uploaded_file.size", uploaded_file.size())
         """
@@ -384,22 +441,10 @@ class ThreadStats(object):
             self._is_flush_in_progress = True
 
             # Process metrics
-            metrics, dists = self._get_aggregate_metrics_and_dists(timestamp or time())
-            count_metrics = len(metrics)
-            if count_metrics:
-                self.flush_count += 1
-                log.debug("Flush #%s sending %s metrics" % (self.flush_count, count_metrics))
-                self.reporter.flush_metrics(metrics)
+            if getattr(self.reporter, "supports_encoded_series", False):
+                self._flush_encoded_series(timestamp or time())
             else:
-                log.debug("No metrics to flush. Continuing.")
-
-            count_dists = len(dists)
-            if count_dists:
-                self.flush_count += 1
-                log.debug("Flush #%s sending %s distributions" % (self.flush_count, count_dists))
-                self.reporter.flush_distributions(dists)
-            else:
-                log.debug("No distributions to flush. Continuing.")
+                self._flush_series(timestamp or time())
 
             # Process events
             events = self._get_aggregate_events()
@@ -420,6 +465,49 @@ class ThreadStats(object):
         finally:
             self._is_flush_in_progress = False
 
+    def _flush_series(self, flush_time):
+        """
+        Format the rolled up metrics as dictionaries, and flush them.
+        """
+        metrics, dists = self._get_aggregate_metrics_and_dists(flush_time)
+        count_metrics = len(metrics)
+        if count_metrics:
+            self.flush_count += 1
+            log.debug("Flush #%s sending %s metrics" % (self.flush_count, count_metrics))
+            self.reporter.flush_metrics(metrics)
+        else:
+            log.debug("No metrics to flush. Continuing.")
+
+        count_dists = len(dists)
+        if count_dists:
+            self.flush_count += 1
+            log.debug("Flush #%s sending %s distributions" % (self.flush_count, count_dists))
+            self.reporter.flush_distributions(dists)
+        else:
+            log.debug("No distributions to flush. Continuing.")
+
+    def _flush_encoded_series(self, flush_time):
+        """
+        Encode the rolled up metrics straight into payloads, and flush them.
+        """
+        options = dict(namespace=self.namespace, constant_tags=self.constant_tags, device=self.device)
+        metrics = self.reporter.series_encoder(**options)
+        dists = self.reporter.series_encoder(**options)
+        for timestamp, value, name, tags, host, metric_type, interval in self._metric_aggregator.flush(flush_time):
+            encoder = dists if metric_type == MetricType.Distribution else metrics
+            encoder.add(timestamp, value, name, tags, host, metric_type, interval)
+
+        for encoder, flush, kind in (
+            (metrics, self.reporter.flush_encoded_metrics, "metrics"),
+            (dists, self.reporter.flush_encoded_distributions, "distributions"),
+        ):
+            if encoder.series_count:
+                self.flush_count += 1
+                log.debug("Flush #%s sending %s %s" % (self.flush_count, encoder.series_count, kind))
+                flush(encoder.finish())
+            else:
+                log.debug("No %s to flush. Continuing." % kind)
+
     def _get_aggregate_metrics_and_dists(self, flush_time=None):
         """
         Get, format and return the rolled up metrics from the aggregator.
@@ -0,0 +1,176 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Streaming JSON encoder for series payloads.
+
+Rolled-up metrics are written straight to JSON, in the same form `api.Metric.send`
+would post them, without building a dict per series or encoding the whole
+payload at once. The JSON is compressed as it is written when compression is
+enabled.
+"""
+from json.encoder import encode_basestring_ascii
+import math
+import zlib
+
+from datadog.api.api_client import EncodedBody
+
+# Encoded JSON is handed over to the compressor in blocks of about that size
+_WRITE_BLOCK_SIZE = 64 * 1024
+
+_PAYLOAD_START = '{"series": ['
+_PAYLOAD_END = "]}"
+
+
+def _encode_number(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+        return repr(value)
+    return str(value)
+
+
+def _encode_string(value):
+    return "null" if value is None else encode_basestring_ascii(value)
+
+
+class SeriesEncoder(object):
+    """
+    Encode rolled-up metrics into one or more series payloads, each holding
+    at most `max_series` series and `max_payload_size` bytes of JSON.
+
+    Names are prefixed with `namespace`, and `constant_tags` are appended to
+    the tags of every series. Series with an empty host get `host_name`, as
+    with `attach_host_name`.
+    """
+
+    def __init__(
+        self,
+        namespace=None,
+        constant_tags=None,
+        device=None,
+        host_name=None,
+        compress=False,
+        max_series=10000,
+        max_payload_size=3200000,
+    ):
+        self._prefix = namespace + "." if namespace else ""
+        # Constant parts of the series are only encoded once
+        self._constant_tags = ", ".join(encode_basestring_ascii(tag) for tag in constant_tags or [])
+        self._device = _encode_string(device)
+        self._host_name = _encode_string(host_name or "")
+        self._encoded_types = {}
+        self.compress = compress
+        self.max_series = max_series
+        self.max_payload_size = max_payload_size
+
+        self.payloads = []
+        self.series_count = 0
+        self._compressor = None
+        self._payload_series = 0
+        self._payload_size = 0
+        self._chunks = []
+        self._block = []
+        self._block_size = 0
+
+    def _encode_tags(self, tags):
+        if tags:
+            encoded = ", ".join(encode_basestring_ascii(tag) for tag in tags)
+            if self._constant_tags:
+                encoded += ", " + self._constant_tags
+            return "[" + encoded + "]"
+        if self._constant_tags:
+            return "[" + self._constant_tags + "]"
+        return "null" if tags is None else "[]"
+
+    def _encode_host(self, host):
+        if host is None:
+            return "null"
+        return encode_basestring_ascii(host) if host else self._host_name
+
+    def _encode_type(self, metric_type):
+        encoded = self._encoded_types.get(metric_type)
+        if encoded is None:
+            encoded = self._encoded_types[metric_type] = encode_basestring_ascii(metric_type)
+        return encoded
+
+    def _encode_value(self, value):
+        # Distributions have a list of values per point
+        if isinstance(value, list):
+            return "[" + ", ".join(_encode_number(float(v)) for v in value) + "]"
+        return _encode_number(float(value))
+
+    def add(self, timestamp, value, name, tags, host, metric_type, interval):
+        """ Encode a rolled-up metric, as returned by `MetricsAggregator.flush`. """
+        series = "".join(
+            (
+                '{"metric": ',
+                encode_basestring_ascii(self._prefix + name),
+                ', "points": [[',
+                _encode_number(timestamp),
+                ", ",
+                self._encode_value(value),
+                ']], "type": ',
+                self._encode_type(metric_type),
+                ', "host": ',
+                self._encode_host(host),
+                ', "device": ',
+                self._device,
+                ', "tags": ',
+                self._encode_tags(tags),
+                ', "interval": ',
+                _encode_number(interval),
+                "}",
+            )
+        )
+
+        if self._payload_series and (
+            self._payload_series >= self.max_series
+            or self._payload_size + 2 + len(series) + len(_PAYLOAD_END) > self.max_payload_size
+        ):
+            self._finish_payload()
+        if self._payload_series:
+            self._write(", ")
+        else:
+            self._start_payload()
+        self._write(series)
+        self._payload_series += 1
+        self.series_count += 1
+
+    def finish(self):
+        """ Complete the last payload and return all of them, as `EncodedBody` objects. """
+        if self._payload_series:
+            self._finish_payload()
+        return self.payloads
+
+    def _start_payload(self):
+        if self.compress:
+            self._compressor = zlib.compressobj()
+        self._payload_size = 0
+        self._write(_PAYLOAD_START)
+
+    def _finish_payload(self):
+        self._write(_PAYLOAD_END)
+        self._flush_block()
+        if self._compressor is not None:
+            self._chunks.append(self._compressor.flush())
+        self.payloads.append(EncodedBody(b"".join(self._chunks), compressed=self.compress))
+        self._chunks = []
+        self._payload_series = 0
+
+    def _write(self, data):
+        self._block.append(data)
+        self._block_size += len(data)
+        self._payload_size += len(data)
+        if self._block_size >= _WRITE_BLOCK_SIZE:
+            self._flush_block()
+
+    def _flush_block(self):
+        data = "".join(self._block).encode("ascii")
+        self._block = []
+        self._block_size = 0
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._chunks.append(data)
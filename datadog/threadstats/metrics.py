@@ -4,13 +4,28 @@
 """
 Metric roll-up classes.
 """
-from collections import defaultdict
-import random
+from collections import deque
 import itertools
+import random
 import threading
+import weakref
 
-from datadog.util.compat import iternext
 from datadog.threadstats.constants import MetricType
+from datadog.threadstats.sketch import DDSketch
+
+DEFAULT_PERCENTILES = [0.75, 0.85, 0.95, 0.99]
+DEFAULT_NUM_BUCKETS = 8
+
+# Orders gauge updates made from different threads, so that merging keeps the latest one
+_gauge_updates = itertools.count()
+
+
+def percentile_name(percentile):
+    """
+    Suffix of the series of a percentile, e.g. `99percentile` for 0.99, or
+    `99_9percentile` for 0.999.
+    """
+    return "%spercentile" % ("%g" % (percentile * 100)).replace(".", "_")
 
 
 class Metric(object):
@@ -27,6 +42,10 @@ class Metric(object):
         """ Flush all metrics up to the given timestamp. """
         raise NotImplementedError
 
+    def merge(self, other):
+        """ Merge the points of another metric of the same context into this one. """
+        raise NotImplementedError
+
 
 class Set(Metric):
     """ A set metric. """
@@ -42,6 +61,9 @@ class Set(Metric):
     def add_point(self, value):
         self.set.add(value)
 
+    def merge(self, other):
+        self.set.update(other.set)
+
     def flush(self, timestamp, interval):
         return [(timestamp, len(self.set), self.name, self.tags, self.host, MetricType.Gauge, interval)]
 
@@ -56,9 +78,16 @@ class Gauge(Metric):
         self.tags = tags
         self.host = host
         self.value = None
+        self.update = -1
 
     def add_point(self, value):
         self.value = value
+        self.update = next(_gauge_updates)
+
+    def merge(self, other):
+        if other.update > self.update:
+            self.value = other.value
+            self.update = other.update
 
     def flush(self, timestamp, interval):
         return [(timestamp, self.value, self.name, self.tags, self.host, MetricType.Gauge, interval)]
@@ -73,14 +102,16 @@ class Counter(Metric):
         self.name = name
         self.tags = tags
         self.host = host
-        self.count = []
+        self.count = 0
 
     def add_point(self, value):
-        self.count.append(value)
+        self.count += value
+
+    def merge(self, other):
+        self.count += other.count
 
     def flush(self, timestamp, interval):
-        count = sum(self.count, 0)
-        return [(timestamp, count / float(interval), self.name, self.tags, self.host, MetricType.Rate, interval)]
+        return [(timestamp, self.count / float(interval), self.name, self.tags, self.host, MetricType.Rate, interval)]
 
 
 class Distribution(Metric):
@@ -97,37 +128,82 @@ class Distribution(Metric):
     def add_point(self, value):
         self.value.append(value)
 
+    def merge(self, other):
+        self.value.extend(other.value)
+
     def flush(self, timestamp, interval):
         return [(timestamp, self.value, self.name, self.tags, self.host, MetricType.Distribution, interval)]
 
 
 class Histogram(Metric):
-    """ A histogram metric. """
+    """
+    A histogram metric.
+
+    Count, sum, min, max, mean and variance are running aggregates, so they
+    use constant memory whatever the number of points. Mean and variance are
+    updated with Welford's online algorithm, which stays numerically stable
+    for large counts.
+
+    Percentiles come from a bounded reservoir sample by default. When a
+    `relative_accuracy` is given, they are estimated with a `DDSketch`
+    instead, which is accurate to that relative error whatever the number
+    of points and needs no sort at flush.
+    """
 
     stats_tag = "h"
 
-    def __init__(self, name, tags, host):
+    def __init__(self, name, tags, host, percentiles=None, relative_accuracy=None):
         self.name = name
         self.tags = tags
         self.host = host
         self.max = float("-inf")
         self.min = float("inf")
-        self.sum = []
-        self.iter_counter = itertools.count()
-        self.count = iternext(self.iter_counter)
+        self.sum = 0
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared differences from the current mean
+        self._m2 = 0.0
         self.sample_size = 1000
         self.samples = []
-        self.percentiles = [0.75, 0.85, 0.95, 0.99]
+        self.percentiles = DEFAULT_PERCENTILES if percentiles is None else percentiles
+        self.sketch = None if relative_accuracy is None else DDSketch(relative_accuracy)
 
     def add_point(self, value):
         self.max = self.max if self.max > value else value
         self.min = self.min if self.min < value else value
-        self.sum.append(value)
-        if self.count < self.sample_size:
+        self.sum += value
+        if self.sketch is not None:
+            self.sketch.add(value)
+        elif self.count < self.sample_size:
             self.samples.append(value)
         else:
             self.samples[random.randrange(0, self.sample_size)] = value
-        self.count = iternext(self.iter_counter)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / float(self.count)
+        self._m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.max = self.max if self.max > other.max else other.max
+        self.min = self.min if self.min < other.min else other.min
+        self.sum += other.sum
+        if self.sketch is not None:
+            self.sketch.merge(other.sketch)
+        elif len(self.samples) + len(other.samples) <= self.sample_size:
+            self.samples.extend(other.samples)
+        else:
+            # Keep a share of each reservoir proportional to the number of points it stands for
+            own = int(round(self.sample_size * self.count / float(self.count + other.count)))
+            own = min(max(own, self.sample_size - len(other.samples)), len(self.samples))
+            self.samples = random.sample(self.samples, own) + random.sample(other.samples, self.sample_size - own)
+        # Parallel variant of Welford's algorithm (Chan et al.)
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / float(count)
+        self._m2 += other._m2 + delta * delta * self.count * other.count / float(count)
+        self.count = count
 
     def flush(self, timestamp, interval):
         if not self.count:
@@ -146,17 +222,28 @@ class Histogram(Metric):
             ),
             (timestamp, self.average(), "%s.avg" % self.name, self.tags, self.host, MetricType.Gauge, interval),
         ]
-        length = len(self.samples)
-        self.samples.sort()
-        for p in self.percentiles:
-            val = self.samples[int(round(p * length - 1))]
-            name = "%s.%spercentile" % (self.name, int(p * 100))
+        for p, val in zip(self.percentiles, self.percentile_values()):
+            name = "%s.%s" % (self.name, percentile_name(p))
             metrics.append((timestamp, val, name, self.tags, self.host, MetricType.Gauge, interval))
         return metrics
 
+    def percentile_values(self):
+        """ Values at each of the configured percentiles. """
+        if self.sketch is not None:
+            # Estimates are clamped to the exact extremes
+            return [min(max(self.sketch.quantile(p), self.min), self.max) for p in self.percentiles]
+        length = len(self.samples)
+        self.samples.sort()
+        return [self.samples[max(int(round(p * length - 1)), 0)] for p in self.percentiles]
+
     def average(self):
-        sum_metrics = sum(self.sum, 0)
-        return float(sum_metrics) / self.count
+        return self.mean
+
+    def variance(self):
+        """ Population variance of the points added so far. """
+        if not self.count:
+            return 0.0
+        return self._m2 / self.count
 
 
 class Timing(Histogram):
@@ -168,24 +255,152 @@ class Timing(Histogram):
     stats_tag = "ms"
 
 
+class _IntervalBuckets(object):
+    """
+    Metrics rolled up into a fixed ring of interval buckets, indexed by
+    interval number modulo the ring size, so that flushing only visits the
+    buckets rather than every interval ever seen. A point whose slot is
+    still held by another pending interval (e.g. an old timestamp) goes to
+    an overflow dict instead, so it is never dropped.
+    """
+
+    def __init__(self, roll_up_interval, num_buckets):
+        self._roll_up_interval = roll_up_interval
+        # Each slot is None or an (interval, {context key: metric}) pair
+        self._buckets = [None] * num_buckets
+        self._overflow = {}
+        # Bucket of the latest interval points were added to, which most points go to
+        self._latest = None
+
+    def __bool__(self):
+        return bool(self._overflow) or any(bucket is not None for bucket in self._buckets)
+
+    __nonzero__ = __bool__
+
+    def get(self, interval):
+        """ Metrics of the given interval, by context key. """
+        latest = self._latest
+        if latest is not None and latest[0] == interval:
+            return latest[1]
+        if self._overflow and interval in self._overflow:
+            return self._overflow[interval]
+        slot = int(interval // self._roll_up_interval) % len(self._buckets)
+        bucket = self._buckets[slot]
+        if bucket is None:
+            bucket = self._buckets[slot] = (interval, {})
+        elif bucket[0] != interval:
+            return self._overflow.setdefault(interval, {})
+        self._latest = bucket
+        return bucket[1]
+
+    def pop_expired(self, interval):
+        """ Remove and return the (interval, metrics) pairs of all intervals before the given one. """
+        expired = []
+        self._latest = None
+        for slot, bucket in enumerate(self._buckets):
+            if bucket is not None and bucket[0] < interval:
+                expired.append(bucket)
+                self._buckets[slot] = None
+        if self._overflow:
+            for i in [i for i in self._overflow if i < interval]:
+                expired.append((i, self._overflow.pop(i)))
+        return expired
+
+
+class _Accumulator(object):
+    """
+    Metrics added by the thread it is assigned to, guarded by a lock that the
+    thread only contends for with the flush.
+    """
+
+    def __init__(self, roll_up_interval, num_buckets):
+        self.lock = threading.Lock()
+        self.buckets = _IntervalBuckets(roll_up_interval, num_buckets)
+        # Weak reference to the token of its thread, which releases it on exit
+        self.owner = None
+
+
+class _ThreadToken(object):
+    """ Held by a thread in a thread-local, so that its exit can be told. """
+
+    __slots__ = ("__weakref__",)
+
+
 class MetricsAggregator(object):
     """
     A small class to handle the roll-ups of multiple metrics at once.
+
+    Points are added to an accumulator of the current thread, so that
+    application threads never contend with each other. Accumulators are merged
+    at flush. Once a thread exits, its accumulator is reused by the next new
+    thread, its points being flushed as usual, so that thread churn doesn't
+    grow memory: the accumulators follow the number of running threads, the
+    spare ones being dropped at flush once empty.
     """
 
-    def __init__(self, roll_up_interval=10):
+    # Context keys are cached until there are that many, then the cache is reset
+    MAX_CONTEXT_KEYS = 10000
+
+    def __init__(self, roll_up_interval=10, percentiles=None, relative_accuracy=None, num_buckets=DEFAULT_NUM_BUCKETS):
+        # Serializes flushes
         self._lock = threading.RLock()
-        self._metrics = defaultdict(dict)
+        # Accumulator and token of each thread
+        self._local = threading.local()
+        # All accumulators, guarded by `_accumulators_lock`
+        self._accumulators = []
+        self._accumulators_lock = threading.Lock()
+        # Accumulators of the threads that exited, appended from weakref callbacks without a lock
+        self._spare_accumulators = deque()
+        self._num_buckets = num_buckets
         self._roll_up_interval = roll_up_interval
+        self._percentiles = percentiles
+        self._relative_accuracy = relative_accuracy
+        # Maps (metric, host, tags as given) to the context key, with the tags sorted
+        self._context_keys = {}
+
+    def _create_metric(self, metric_class, metric, tags, host):
+        if issubclass(metric_class, Histogram):
+            return metric_class(metric, tags, host, self._percentiles, self._relative_accuracy)
+        return metric_class(metric, tags, host)
+
+    def _context_key(self, metric, tags, host):
+        cache_key = (metric, host, tuple(tags))
+        key = self._context_keys.get(cache_key)
+        if key is None:
+            if len(self._context_keys) >= self.MAX_CONTEXT_KEYS:
+                self._context_keys = {}
+            key = (metric, host, tuple(sorted(tags)))
+            self._context_keys[cache_key] = key
+        return key
+
+    def _assign_accumulator(self):
+        """ Assign a spare accumulator, or else a new one, to the current thread. """
+        try:
+            accumulator = self._spare_accumulators.pop()
+        except IndexError:
+            accumulator = _Accumulator(self._roll_up_interval, self._num_buckets)
+            with self._accumulators_lock:
+                self._accumulators.append(accumulator)
+        token = self._local.token = _ThreadToken()
+        spare_accumulators = self._spare_accumulators
+        accumulator.owner = weakref.ref(token, lambda _: spare_accumulators.append(accumulator))
+        self._local.accumulator = accumulator
+        return accumulator
 
     def add_point(self, metric, tags, timestamp, value, metric_class, sample_rate=1, host=None):
         # The sample rate is currently ignored for in process stuff
         interval = timestamp - timestamp % self._roll_up_interval
-        key = (metric, host, tuple(sorted(tags)) if tags else None)
-        with self._lock:
-            if key not in self._metrics[interval]:
-                self._metrics[interval][key] = metric_class(metric, tags, host)
-            self._metrics[interval][key].add_point(value)
+        key = self._context_key(metric, tags, host) if tags else (metric, host, None)
+        try:
+            accumulator = self._local.accumulator
+        except AttributeError:
+            accumulator = self._assign_accumulator()
+        with accumulator.lock:
+            metrics = accumulator.buckets.get(interval)
+            m = metrics.get(key)
+            if m is None:
+                m = metrics[key] = self._create_metric(metric_class, metric, tags, host)
+            m.add_point(value)
 
     def flush(self, timestamp):
         """ Flush all metrics up to the given timestamp. """
@@ -195,9 +410,41 @@ class MetricsAggregator(object):
             interval = timestamp - timestamp % self._roll_up_interval
 
         with self._lock:
-            past_intervals = [i for i in self._metrics.keys() if i < interval]
-            metrics = []
-            for i in past_intervals:
-                for m in list(self._metrics.pop(i).values()):
-                    metrics += m.flush(i, self._roll_up_interval)
+            with self._accumulators_lock:
+                accumulators = list(self._accumulators)
+            merged = {}
+            for accumulator in accumulators:
+                with accumulator.lock:
+                    expired = accumulator.buckets.pop_expired(interval)
+                for i, bucket_metrics in expired:
+                    merged_metrics = merged.setdefault(i, {})
+                    for key, m in bucket_metrics.items():
+                        if key in merged_metrics:
+                            merged_metrics[key].merge(m)
+                        else:
+                            merged_metrics[key] = m
+            self._drop_spare_accumulators()
+
+        metrics = []
+        for i in sorted(merged):
+            for m in merged[i].values():
+                metrics += m.flush(i, self._roll_up_interval)
         return metrics
+
+    def _drop_spare_accumulators(self):
+        """ Drop the accumulators of the threads that exited, once their points are flushed. """
+        spare = []
+        while True:
+            try:
+                spare.append(self._spare_accumulators.popleft())
+            except IndexError:
+                break
+        empty = set()
+        for accumulator in spare:
+            if accumulator.buckets:
+                self._spare_accumulators.append(accumulator)
+            else:
+                empty.add(accumulator)
+        if empty:
+            with self._accumulators_lock:
+                self._accumulators = [a for a in self._accumulators if a not in empty]
@@ -4,9 +4,24 @@
 """
 Reporter classes.
 """
+import atexit
+from collections import deque
+import json
+import logging
+import os
+import threading
+from time import time
+import weakref
+import zlib
 
+from datadog import api, dogstatsd
+from datadog.api.api_client import APIClient, EncodedBody
+from datadog.api.exceptions import ApiNotInitialized, ClientError, HttpBackoff, HTTPError, HttpTimeout, ProxyError
+from datadog.threadstats.constants import MetricType
+from datadog.threadstats.encoder import SeriesEncoder
+from datadog.util.compat import text
 
-from datadog import api
+log = logging.getLogger("datadog.threadstats")
 
 
 class Reporter(object):
@@ -14,20 +29,581 @@ class Reporter(object):
         raise NotImplementedError
 
 
+# Size of the `{"series": []}` envelope
+_PAYLOAD_ENVELOPE_SIZE = 14
+
+
+def _function(method):
+    # Unbound methods wrap their function on Python 2
+    return getattr(method, "__func__", method)
+
+
+def _encode_payload(pieces, compress):
+    data = ("{\"series\": [" + ", ".join(pieces) + "]}").encode("utf-8")
+    if compress:
+        data = zlib.compress(data)
+    return EncodedBody(data, compressed=compress)
+
+
+def _encode_series(series, max_series, max_size, host_name=None, compress=False):
+    """
+    Encode a list of series into JSON payloads of at most `max_series` series
+    and `max_size` bytes, as `EncodedBody` objects, compressed with zlib if
+    `compress` is set. Each series is encoded once. Series with an empty host
+    get `host_name`, as with `attach_host_name`. A series larger than
+    `max_size` on its own gets a payload of its own.
+    """
+    payloads = []
+    pieces = []
+    size = _PAYLOAD_ENVELOPE_SIZE
+    for s in series:
+        if s.get("host", "") == "":
+            s = dict(s, host=host_name)
+        piece = json.dumps(s)
+        if pieces and (len(pieces) >= max_series or size + 2 + len(piece) > max_size):
+            payloads.append(_encode_payload(pieces, compress))
+            pieces = []
+            size = _PAYLOAD_ENVELOPE_SIZE
+        if pieces:
+            size += 2  # The ", " separator
+        pieces.append(piece)
+        size += len(piece)
+    if pieces:
+        payloads.append(_encode_payload(pieces, compress))
+    return payloads
+
+
 class HttpReporter(Reporter):
-    def __init__(self, compress_payload=False):
+    """
+    Post metrics, distributions and events to the API.
+
+    Series are split into payloads of at most `max_series_per_payload` series
+    and `max_payload_size` bytes of JSON (before compression), which are
+    posted concurrently, with up to `max_concurrent_requests` requests at a
+    time over the API client's connection pool. Each series is encoded to
+    JSON once.
+
+    ThreadStats encodes series straight into payloads with `series_encoder`
+    for reporters with `supports_encoded_series` set, and flushes them with
+    `flush_encoded_metrics` and `flush_encoded_distributions`.
+    """
+
+    @property
+    def supports_encoded_series(self):
+        """
+        Whether series can be flushed as encoded payloads: unless a subclass overrides
+        `flush_metrics` or `flush_distributions`, which the encoded path would skip.
+        Subclasses can set it explicitly.
+        """
+        return all(
+            _function(getattr(type(self), name)) is _function(getattr(HttpReporter, name))
+            for name in ("flush_metrics", "flush_distributions")
+        )
+
+    def __init__(
+        self,
+        compress_payload=False,
+        max_series_per_payload=10000,
+        max_payload_size=3200000,
+        max_concurrent_requests=4,
+    ):
         self.compress_payload = compress_payload
+        self.max_series_per_payload = max_series_per_payload
+        self.max_payload_size = max_payload_size
+        self.max_concurrent_requests = max_concurrent_requests
+        # Posts payloads along with the flushing thread, created on first use
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
 
     def flush_distributions(self, distributions):
-        api.Distribution.send(distributions, compress_payload=self.compress_payload)
+        return self._send_series(api.Distribution._resource_name, distributions)
 
     def flush_metrics(self, metrics):
-        api.Metric.send(metrics, compress_payload=self.compress_payload)
+        return self._send_series(api.Metric._METRIC_SUBMIT_ENDPOINT, metrics)
 
     def flush_events(self, events):
         for event in events:
             api.Event.create(**event)
 
+    def series_encoder(self, namespace=None, constant_tags=None, device=None):
+        """ Return a `SeriesEncoder` producing payloads within this reporter's limits. """
+        return SeriesEncoder(
+            namespace=namespace,
+            constant_tags=constant_tags,
+            device=device,
+            host_name=api._host_name,
+            compress=self.compress_payload,
+            max_series=self.max_series_per_payload,
+            max_payload_size=self.max_payload_size,
+        )
+
+    def flush_encoded_distributions(self, payloads):
+        return self._post_encoded(api.Distribution._resource_name, payloads)
+
+    def flush_encoded_metrics(self, payloads):
+        return self._post_encoded(api.Metric._METRIC_SUBMIT_ENDPOINT, payloads)
+
+    def _encode_series(self, series):
+        return _encode_series(
+            series, self.max_series_per_payload, self.max_payload_size, api._host_name, self.compress_payload
+        )
+
+    def _send_series(self, path, series):
+        """ Post the series in chunks. """
+        return self._post_encoded(path, self._encode_series(series))
+
+    def _post_encoded(self, path, payloads):
+        return self._post_concurrently(
+            lambda payload: APIClient.submit("POST", path, body=payload, spool=True), payloads
+        )
+
+    def _get_executor(self):
+        with self._executor_lock:
+            # The threads of the executor don't run in a forked child
+            if self._executor is None or self._executor_pid != os.getpid():
+                # Not imported with the module, as few users need it
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(max_workers=max(self.max_concurrent_requests - 1, 1))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _post_concurrently(self, post, payloads):
+        """
+        Post each payload with `post`. Return the first response with errors, if any, or
+        else the first response. The first exception raised, if any, is re-raised
+        once all payloads are posted.
+        """
+        if not payloads:
+            return None
+        if len(payloads) == 1:
+            return post(payloads[0])
+
+        pending = deque(enumerate(payloads))
+        responses = [None] * len(payloads)
+        exceptions = []
+
+        def post_pending():
+            while True:
+                try:
+                    idx, payload = pending.popleft()
+                except IndexError:
+                    return
+                try:
+                    responses[idx] = post(payload)
+                except Exception as e:
+                    exceptions.append(e)
+
+        # The calling thread posts too
+        helpers = min(self.max_concurrent_requests, len(payloads)) - 1
+        futures = [self._get_executor().submit(post_pending) for _ in range(helpers)] if helpers > 0 else []
+        post_pending()
+        for future in futures:
+            future.result()
+
+        if exceptions:
+            raise exceptions[0]
+        for response in responses:
+            if isinstance(response, dict) and "errors" in response:
+                return response
+        return responses[0]
+
+
+# Background reporters, stopped at exit
+_background_reporters = weakref.WeakSet()  # type: weakref.WeakSet[BackgroundHttpReporter]
+
+
+@atexit.register
+def _stop_background_reporters():
+    for reporter in list(_background_reporters):
+        reporter.stop()
+
+
+class BackgroundHttpReporter(HttpReporter):
+    """
+    An HTTP reporter posting from a worker thread, so that a slow or
+    unavailable API never blocks the flush.
+
+    Metrics and distributions are encoded into payloads, each one being a
+    batch, and events into a batch each. Batches are queued in memory, within
+    `max_queue_size` batches and `max_queue_bytes` bytes. Failed posts are
+    retried with exponential backoff, then dropped. When the queue is full,
+    batches are appended to the `spill_path` file if set, up to
+    `max_spill_bytes`, and replayed once the queue drains; otherwise they
+    are dropped.
+
+    The number of batches dropped, spilled and retried is reported as
+    `datadog.threadstats.reporter.*` count series along with the metrics.
+
+    The worker exits after `WORKER_IDLE_TIMEOUT` seconds without batches to
+    send, and is started again with the next ones, so that reporters no
+    longer in use are released. Reporters are stopped at exit.
+
+    Other keyword arguments are passed to `HttpReporter`.
+    """
+
+    TELEMETRY_PREFIX = "datadog.threadstats.reporter."
+    WORKER_IDLE_TIMEOUT = 60
+
+    # Returned by `_next_batch` when spilled batches are to be loaded
+    _LOAD_SPILL = object()
+
+    def __init__(
+        self,
+        compress_payload=False,
+        max_queue_size=1000,
+        max_queue_bytes=16 * 1024 * 1024,
+        max_retries=5,
+        retry_backoff=1.0,
+        max_retry_backoff=30.0,
+        spill_path=None,
+        max_spill_bytes=64 * 1024 * 1024,
+        shutdown_timeout=5.0,
+        disable_telemetry=False,
+        **kwargs
+    ):
+        super(BackgroundHttpReporter, self).__init__(compress_payload=compress_payload, **kwargs)
+        self.max_queue_size = max_queue_size
+        self.max_queue_bytes = max_queue_bytes
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+        self.shutdown_timeout = shutdown_timeout
+        self.disable_telemetry = disable_telemetry
+
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        # (kind, JSON payload as bytes) pairs
+        self._queue = deque()
+        self._queue_bytes = 0
+        # Serializes the I/O on the spill file, done without holding `_condition`
+        self._spill_lock = threading.Lock()
+        # Bytes written to the spill file, batches left over by a previous process
+        # being replayed too, and bytes being written
+        self._spill_bytes = os.path.getsize(spill_path) if spill_path and os.path.exists(spill_path) else 0
+        self._spill_reserved = 0
+        self._worker = None
+        self._sending = False
+
+        # Telemetry
+        self.batches_sent = 0
+        self.batches_dropped = 0
+        self.batches_spilled = 0
+        self.batches_retried = 0
+        self._reported_telemetry = (0, 0, 0)
+
+        _background_reporters.add(self)
+
+    def _encode_batches(self, series):
+        # Compressed when sent, as batches may be spilled as text
+        return _encode_series(series, self.max_series_per_payload, self.max_payload_size, api._host_name)
+
+    def flush_distributions(self, distributions):
+        for payload in self._encode_batches(distributions):
+            self._enqueue("distributions", payload.data)
+
+    def flush_metrics(self, metrics):
+        if not self.disable_telemetry:
+            metrics = metrics + self._get_telemetry()
+        for payload in self._encode_batches(metrics):
+            self._enqueue("metrics", payload.data)
+
+    def flush_events(self, events):
+        # One batch per event: a failure never re-posts events that were already created
+        for event in events:
+            self._enqueue("event", json.dumps(event).encode("utf-8"))
+
+    def stop(self):
+        """
+        Stop the worker once the queued batches are sent, or `shutdown_timeout`
+        seconds have passed. Batches flushed afterwards are dropped.
+        """
+        with self._condition:
+            self._stop_event.set()
+            self._condition.notify_all()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(self.shutdown_timeout)
+
+    def wait_for_pending(self, timeout=None):
+        """ Block until all batches, spilled ones included, are sent or dropped. Return whether they were. """
+        deadline = None if timeout is None else time() + timeout
+        with self._condition:
+            if self._pending():
+                self._ensure_worker()
+            while self._pending():
+                remaining = None if deadline is None else deadline - time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def _pending(self):
+        return bool(self._queue) or self._sending or self._spill_bytes > 0 or self._spill_reserved > 0
+
+    def _get_telemetry(self):
+        with self._condition:
+            current = (self.batches_dropped, self.batches_spilled, self.batches_retried)
+            previous, self._reported_telemetry = self._reported_telemetry, current
+
+        now = time()
+        series = []
+        for name, value, last in zip(("batches_dropped", "batches_spilled", "batches_retried"), current, previous):
+            if value != last:
+                series.append(
+                    {
+                        "metric": self.TELEMETRY_PREFIX + name,
+                        "points": [[now, value - last]],
+                        "type": "count",
+                        "host": None,
+                        "tags": None,
+                    }
+                )
+        return series
+
+    def _enqueue(self, kind, data):
+        with self._condition:
+            if self._stop_event.is_set():
+                log.warning("Reporter stopped, dropping %s batch", kind)
+                self.batches_dropped += 1
+                return
+            if len(data) > self.max_queue_bytes:
+                # Would never fit in the queue
+                log.warning("Dropping %s batch of %s bytes, larger than the queue", kind, len(data))
+                self.batches_dropped += 1
+                return
+            if len(self._queue) < self.max_queue_size and self._queue_bytes + len(data) <= self.max_queue_bytes:
+                self._queue.append((kind, data))
+                self._queue_bytes += len(data)
+                self._ensure_worker()
+                self._condition.notify_all()
+                return
+            # JSON payloads hold no newlines
+            line = kind.encode("ascii") + b" " + data + b"\n"
+            if not self.spill_path or self._spill_bytes + self._spill_reserved + len(line) > self.max_spill_bytes:
+                log.warning("Reporter queue is full, dropping %s batch", kind)
+                self.batches_dropped += 1
+                return
+            self._spill_reserved += len(line)
+        self._spill([line], kind)
+
+    def _spill(self, lines, kind, respill=False):
+        """ Append lines, whose size is reserved in `_spill_reserved`, to the spill file. """
+        size = sum(len(line) for line in lines)
+        with self._spill_lock:
+            try:
+                with open(self.spill_path, "ab") as spill_file:
+                    spill_file.writelines(lines)
+            except (IOError, OSError):
+                log.exception("Failed to spill %s batch to %s", kind, self.spill_path)
+                spilled = False
+            else:
+                spilled = True
+            with self._condition:
+                self._spill_reserved -= size
+                if spilled:
+                    self._spill_bytes += size
+                    if not respill:
+                        self.batches_spilled += len(lines)
+                else:
+                    self.batches_dropped += len(lines)
+                self._ensure_worker()
+                self._condition.notify_all()
+
+    def _load_spill(self):
+        """
+        Move spilled batches into the queue, as far as it allows; the others are spilled
+        again, unless the queue is empty. Batches larger than the queue are dropped.
+        """
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            try:
+                os.rename(self.spill_path, replay_path)
+                with open(replay_path, "rb") as replay_file:
+                    lines = replay_file.readlines()
+                os.remove(replay_path)
+            except (IOError, OSError):
+                log.exception("Failed to read spilled batches from %s", self.spill_path)
+                lines = []
+            with self._condition:
+                # Nothing is written to the spill file since it was moved
+                self._spill_bytes = 0
+
+        rest = []
+        with self._condition:
+            for line in lines:
+                kind, _, data = line.rstrip(b"\n").partition(b" ")
+                kind = kind.decode("ascii")
+                if len(data) > self.max_queue_bytes:
+                    log.warning("Dropping spilled %s batch of %s bytes, larger than the queue", kind, len(data))
+                    self.batches_dropped += 1
+                elif not self._queue or (
+                    len(self._queue) < self.max_queue_size and self._queue_bytes + len(data) <= self.max_queue_bytes
+                ):
+                    self._queue.append((kind, data))
+                    self._queue_bytes += len(data)
+                else:
+                    rest.append(line)
+            if rest:
+                self._spill_reserved += sum(len(line) for line in rest)
+            self._condition.notify_all()
+        if rest:
+            self._spill(rest, "spilled", respill=True)
+
+    def _ensure_worker(self):
+        # Also restarts the worker in a forked child, where it isn't running
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(name="{}_worker".format(self.__class__.__name__), target=self._run)
+            self._worker.daemon = True
+            self._worker.start()
+
+    def _next_batch(self):
+        with self._condition:
+            self._sending = False
+            while not self._queue:
+                # Spilled batches are left for the next process on shutdown
+                if self._spill_bytes > 0 and not self._stop_event.is_set():
+                    # Loaded by `_run`, without holding the condition
+                    self._sending = True
+                    return self._LOAD_SPILL
+                self._condition.notify_all()
+                if self._stop_event.is_set():
+                    return None
+                idle_since = time()
+                self._condition.wait(self.WORKER_IDLE_TIMEOUT)
+                if (
+                    not self._queue
+                    and not self._spill_bytes
+                    and not self._spill_reserved
+                    and time() - idle_since >= self.WORKER_IDLE_TIMEOUT
+                ):
+                    # Started again by the next batch
+                    self._worker = None
+                    return None
+            kind, data = self._queue.popleft()
+            self._queue_bytes -= len(data)
+            self._sending = True
+            return kind, data
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if batch is self._LOAD_SPILL:
+                self._load_spill()
+                continue
+            try:
+                self._send(*batch)
+            except Exception:
+                log.exception("Unexpected error while sending %s batch", batch[0])
+                with self._condition:
+                    self.batches_dropped += 1
+
+    def _poster(self, kind, data):
+        """
+        Function posting a batch, as it was encoded, and spooling the series that
+        can't be sent if told to.
+        """
+        if kind == "event":
+            event = json.loads(data.decode("utf-8"))
+            return lambda spool: api.Event.create(**event)
+        path = api.Metric._METRIC_SUBMIT_ENDPOINT if kind == "metrics" else api.Distribution._resource_name
+        body = EncodedBody(zlib.compress(data) if self.compress_payload else data, compressed=self.compress_payload)
+        return lambda spool: APIClient.submit("POST", path, body=body, spool=spool)
+
+    def _send(self, kind, data):
+        post = self._poster(kind, data)
+        backoff = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries or self._stop_event.is_set()
+            try:
+                # Spooled once, if it can't be sent in the end
+                response = post(spool=last_attempt)
+            except ApiNotInitialized:
+                log.error("API key is not set, dropping %s batch", kind)
+                break
+            except (ClientError, HTTPError, HttpTimeout, HttpBackoff, ProxyError) as e:
+                error = e
+            else:
+                # With `mute` set, client errors (e.g. connection failures) are returned
+                # as a message instead of raised, unlike API errors which come as a list
+                errors = response.get("errors") if isinstance(response, dict) else None
+                if not isinstance(errors, (str, text)):
+                    with self._condition:
+                        self.batches_sent += 1
+                    return
+                error = errors
+
+            if last_attempt:
+                log.warning("Failed to send %s batch, dropping it: %s", kind, error)
+                break
+            log.info("Failed to send %s batch, retrying in %ss: %s", kind, backoff, error)
+            with self._condition:
+                self.batches_retried += 1
+            # Don't hold the shutdown back with retries
+            if self._stop_event.wait(backoff):
+                log.warning("Reporter stopped, dropping %s batch", kind)
+                break
+            backoff = min(backoff * 2, self.max_retry_backoff)
+
+        with self._condition:
+            self.batches_dropped += 1
+
+
+class DogStatsdReporter(Reporter):
+    """
+    Forward metrics and events to a Datadog Agent through a DogStatsd client,
+    the global `statsd` one by default, rather than posting them to the API.
+    No API key is needed.
+
+    Gauges are sent as timestamped gauges, and rates (counters, histogram
+    counts) as timestamped counts of the points in their roll-up interval,
+    which requires Datadog Agent 7.40.0+. DogStatsd has no timestamped
+    distributions: distribution values are sent as is and timestamped by the
+    Agent on receipt. Hosts and devices are sent as `host:` and `device:`
+    tags.
+    """
+
+    def __init__(self, statsd=None):
+        self.statsd = dogstatsd.statsd if statsd is None else statsd
+
+    @staticmethod
+    def _get_tags(metric):
+        tags = metric.get("tags")
+        extra_tags = ["{}:{}".format(name, metric[name]) for name in ("host", "device") if metric.get(name)]
+        if extra_tags:
+            tags = (tags or []) + extra_tags
+        return tags
+
+    def flush_distributions(self, distributions):
+        for distribution in distributions:
+            tags = self._get_tags(distribution)
+            for _, values in distribution["points"]:
+                for value in values:
+                    self.statsd.distribution(distribution["metric"], value, tags=tags)
+        self.statsd.flush()
+
+    def flush_metrics(self, metrics):
+        for metric in metrics:
+            tags = self._get_tags(metric)
+            for timestamp, value in metric["points"]:
+                if metric["type"] == MetricType.Rate:
+                    count = value * metric.get("interval", 1)
+                    self.statsd.count_with_timestamp(metric["metric"], count, int(timestamp), tags=tags)
+                else:
+                    self.statsd.gauge_with_timestamp(metric["metric"], value, int(timestamp), tags=tags)
+        self.statsd.flush()
+
+    def flush_events(self, events):
+        for event in events:
+            event = dict(event)
+            self.statsd.event(event.pop("title"), event.pop("text", ""), hostname=event.pop("host", None), **event)
+        self.statsd.flush()
+
 
 class GraphiteReporter(Reporter):
     def flush(self, metrics):
@@ -0,0 +1,132 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+"""
+Mergeable quantile sketch with relative-error guarantees, after DDSketch
+(http://www.vldb.org/pvldb/vol12/p2195-masson.pdf).
+
+Values are mapped to logarithmically sized buckets, so that any quantile is
+estimated within `relative_accuracy` of an actual value of the input. The
+number of buckets is capped, which keeps memory constant per sketch: once
+the cap is reached, the buckets closest to zero are collapsed together,
+preserving accuracy on the higher quantiles.
+"""
+import math
+import sys
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+
+
+class _DenseStore(object):
+    """
+    Bucket counts for contiguous keys, stored in a list starting at `offset`.
+    """
+
+    def __init__(self, max_bins):
+        self.max_bins = max_bins
+        self.bins = []
+        self.offset = 0
+        self.count = 0
+
+    def add(self, key, count=1):
+        bins = self.bins
+        if not bins:
+            bins.append(0)
+            self.offset = key
+        elif key < self.offset:
+            # Keys falling below the capped range go to the lowest bucket
+            key = max(key, self.offset + len(bins) - self.max_bins)
+            if key < self.offset:
+                bins[:0] = [0] * (self.offset - key)
+                self.offset = key
+        elif key >= self.offset + len(bins):
+            self._extend(key)
+            bins = self.bins
+        bins[key - self.offset] += count
+        self.count += count
+
+    def _extend(self, key):
+        lowest = key - self.max_bins + 1
+        if lowest > self.offset:
+            # Collapse the lowest buckets so that the store spans at most `max_bins` keys
+            shift = lowest - self.offset
+            collapsed = sum(self.bins[:shift])
+            self.bins = self.bins[shift:] or [0]
+            self.bins[0] += collapsed
+            self.offset = lowest
+        self.bins.extend([0] * (key - self.offset - len(self.bins) + 1))
+
+    def merge(self, other):
+        for idx, count in enumerate(other.bins):
+            if count:
+                self.add(other.offset + idx, count)
+
+
+class DDSketch(object):
+    """
+    A quantile sketch accepting positive, negative and zero values.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1, got {}".format(relative_accuracy))
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        # Values closer to zero than this can't be indexed and are counted as zeros
+        self._min_indexable = sys.float_info.min * self.gamma
+        self.positives = _DenseStore(max_bins)
+        self.negatives = _DenseStore(max_bins)
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value):
+        return int(math.ceil(math.log(value) * self._multiplier))
+
+    def _value(self, key):
+        # Representative of (gamma^(key-1), gamma^key], within `relative_accuracy` of both ends
+        return 2 * math.exp(key / self._multiplier) / (1 + self.gamma)
+
+    def add(self, value):
+        if value > self._min_indexable:
+            self.positives.add(self._key(value))
+        elif value < -self._min_indexable:
+            self.negatives.add(self._key(-value))
+        else:
+            self.zero_count += 1
+        self.count += 1
+
+    def merge(self, other):
+        """ Merge another sketch, built with the same accuracy, into this one. """
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracies")
+        self.positives.merge(other.positives)
+        self.negatives.merge(other.negatives)
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        """ Estimate the value at the given quantile, between 0 and 1. None if the sketch is empty. """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+
+        # Walk the buckets in increasing value order: negatives by decreasing magnitude, zeros, positives
+        cumulative = 0
+        negatives = self.negatives
+        for idx in range(len(negatives.bins) - 1, -1, -1):
+            cumulative += negatives.bins[idx]
+            if cumulative > rank:
+                return -self._value(negatives.offset + idx)
+
+        cumulative += self.zero_count
+        if cumulative > rank:
+            return 0
+
+        positives = self.positives
+        for idx, count in enumerate(positives.bins):
+            cumulative += count
+            if cumulative > rank:
+                return self._value(positives.offset + idx)
+        return self._value(positives.offset + len(positives.bins) - 1)
@@ -23,11 +23,12 @@ with open("datadog/version.py") as fp:
 # Python 3.5+ has no effect.
 #
 # `configparser` package is only required for Python versions older than 3 (it is included here for
-# the same reason as the `typing` package).
+# the same reason as the `typing` package), as is the `futures` backport of `concurrent.futures`.
 install_reqs = [
     "requests>=2.6.0",
     'typing;python_version<"3.5"',
     'configparser<5;python_version<"3.0"',
+    'futures;python_version<"3.0"',
 ]
 
 setup(
@@ -88,3 +88,34 @@ def test_fork_with_thread(disable_background_sender, disable_buffering, sender):
         if sender:
             sender_running[0] = False
             sender.join()
+
+
+def test_fork_reseeds_sampling():
+    if not SUPPORTS_FORKING:
+        pytest.skip("os.register_at_fork is required for this test")
+
+    from datadog.dogstatsd import sampling
+
+    # Make sure the forking thread already owns a generator that the child inherits.
+    sampling.random()
+
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        os.write(wfd, repr([sampling.random() for _ in range(8)]).encode("ascii"))
+        os._exit(0)
+
+    os.close(wfd)
+    parent_values = repr([sampling.random() for _ in range(8)]).encode("ascii")
+    child_values = b""
+    while True:
+        chunk = os.read(rfd, 4096)
+        if not chunk:
+            break
+        child_values += chunk
+    os.close(rfd)
+    os.waitpid(pid, 0)
+
+    assert child_values
+    assert child_values != parent_values
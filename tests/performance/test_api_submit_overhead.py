@@ -0,0 +1,95 @@
+# coding: utf8
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the BSD-3-Clause License. This product includes software developed at
+# Datadog (https://www.datadoghq.com/).
+
+# Copyright 2015-Present Datadog, Inc
+
+# stdlib
+from io import BytesIO
+import os
+import sys
+import timeit
+import unittest
+
+# 3p
+import mock
+import requests
+
+# datadog
+from datadog import api, initialize
+from datadog.api.api_client import APIClient
+from datadog.api.http_client import RequestClient, Urllib3Client
+
+
+class FakeSession(object):
+    """
+    `requests` session answering every request with an empty JSON object.
+    """
+
+    headers = {}
+
+    def request(self, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = 202
+        response.raw = BytesIO(b"{}")
+        return response
+
+
+class FakeResponse(object):
+    status = 202
+
+
+class FakePool(object):
+    """
+    `urllib3` pool manager answering every request with HTTP 202.
+    """
+
+    def request(self, *args, **kwargs):
+        return FakeResponse()
+
+
+class TestAPISubmitOverhead(unittest.TestCase):
+    """
+    Measure the time spent by the API client and its HTTP clients around each
+    request, without any network I/O.
+    """
+
+    DEFAULT_NUM_RUNS = 20000
+
+    RUN_MESSAGE = "{} run(s) on Python{}.{}: {} avg {:.2f}us"
+
+    def setUp(self):
+        self.num_runs = int(os.getenv("BENCHMARK_NUM_RUNS", str(self.DEFAULT_NUM_RUNS)))
+        initialize(api_key="apikey", app_key="appkey", api_host="https://example.com", host_name="myhost")
+
+        # Add a newline so that we don't get clobbered by the test output
+        print("")
+
+    def tearDown(self):
+        api._api_key = api._application_key = api._api_host = api._host_name = None
+
+    def report(self, name, statement):
+        duration = timeit.timeit(statement, number=self.num_runs)
+        print(
+            self.RUN_MESSAGE.format(
+                self.num_runs, sys.version_info[0], sys.version_info[1], name, duration / self.num_runs * 1e6
+            )
+        )
+
+    @mock.patch.object(RequestClient, "_session", FakeSession())
+    @mock.patch.object(APIClient, "_http_client", RequestClient)
+    def test_submit_overhead(self):
+        body = {"series": [{"metric": "metric", "points": [[1, 1.0]], "tags": ["tag:value"]}]}
+        self.report(
+            "APIClient.submit",
+            lambda: APIClient.submit("POST", "series", body=body, attach_host_name=True),
+        )
+
+    @mock.patch.object(Urllib3Client, "_pool", FakePool())
+    def test_urllib3_request_overhead(self):
+        headers = {"DD-API-KEY": "apikey", "DD-APPLICATION-KEY": "appkey", "Content-Type": "application/json"}
+        self.report(
+            "Urllib3Client.request",
+            lambda: Urllib3Client.request("POST", "https://example.com", headers, {}, b"{}", 10, None, True, 3),
+        )
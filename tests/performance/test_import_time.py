@@ -0,0 +1,59 @@
+# coding: utf8
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the BSD-3-Clause License. This product includes software developed at
+# Datadog (https://www.datadoghq.com/).
+
+# Copyright 2015-Present Datadog, Inc
+
+# stdlib
+import os
+import subprocess
+import sys
+import unittest
+
+
+MEASURE_SCRIPT = """
+import time
+start = time.time()
+import datadog
+imported = time.time()
+datadog.DogStatsd()
+print("%f %f" % (imported - start, time.time() - imported))
+"""
+
+
+class TestImportTime(unittest.TestCase):
+    """
+    Measure the time spent importing `datadog`, which also creates the global
+    `statsd` client, and creating a new DogStatsd client afterwards.
+    """
+
+    DEFAULT_NUM_RUNS = 20
+
+    RUN_MESSAGE = "{} run(s) on Python{}.{}: import datadog avg {:.2f}ms, DogStatsd() avg {:.3f}ms"
+
+    def setUp(self):
+        self.num_runs = int(os.getenv("BENCHMARK_NUM_RUNS", str(self.DEFAULT_NUM_RUNS)))
+
+        # Add a newline so that we don't get clobbered by the test output
+        print("")
+
+    def test_import_time(self):
+        import_durations = []
+        init_durations = []
+        for _ in range(self.num_runs):
+            # Each run needs a fresh interpreter so that nothing is cached in sys.modules.
+            output = subprocess.check_output([sys.executable, "-c", MEASURE_SCRIPT])
+            import_duration, init_duration = output.decode("ascii").split()
+            import_durations.append(float(import_duration))
+            init_durations.append(float(init_duration))
+
+        print(
+            self.RUN_MESSAGE.format(
+                self.num_runs,
+                sys.version_info[0],
+                sys.version_info[1],
+                sum(import_durations) / len(import_durations) * 1000,
+                sum(init_durations) / len(init_durations) * 1000,
+            )
+        )
@@ -0,0 +1,91 @@
+# coding: utf8
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the BSD-3-Clause License. This product includes software developed at
+# Datadog (https://www.datadoghq.com/).
+
+# Copyright 2015-Present Datadog, Inc
+
+# stdlib
+import os
+import sys
+import time
+import unittest
+
+# datadog
+from datadog.dogstatsd.base import DogStatsd, SUPPORTS_FORKING
+
+# test utils
+from tests.util.fake_statsd_server import FakeServer
+
+
+class TestDogStatsdForkLatency(unittest.TestCase):
+    """
+    Measure the time spent in the parent process by os.fork() for both
+    fork handling modes of the client.
+    """
+
+    DEFAULT_NUM_FORKS = 50
+    DEFAULT_NUM_CONTEXTS = 1000
+
+    RUN_MESSAGE = "flush_on_fork={}: {} fork(s), {} context(s): avg {:.2f}ms, max {:.2f}ms per fork"
+
+    def setUp(self):
+        if not SUPPORTS_FORKING:
+            self.skipTest("os.register_at_fork is required for this benchmark")
+
+        self.num_forks = int(os.getenv("BENCHMARK_NUM_FORKS", str(self.DEFAULT_NUM_FORKS)))
+        self.num_contexts = int(os.getenv("BENCHMARK_NUM_CONTEXTS", str(self.DEFAULT_NUM_CONTEXTS)))
+
+        # Add a newline so that we don't get clobbered by the test output
+        print("")
+
+    def test_fork_latency(self):
+        print(
+            "Starting: {} fork(s), {} context(s) on Python{}.{} ...".format(
+                self.num_forks,
+                self.num_contexts,
+                sys.version_info[0],
+                sys.version_info[1],
+            )
+        )
+        for flush_on_fork in (True, False):
+            with FakeServer(transport="UDP") as server:
+                latencies = self._execute_test_run(server, flush_on_fork)
+            print(
+                self.RUN_MESSAGE.format(
+                    flush_on_fork,
+                    self.num_forks,
+                    self.num_contexts,
+                    sum(latencies) / len(latencies) * 1000,
+                    max(latencies) * 1000,
+                )
+            )
+
+    def _execute_test_run(self, server, flush_on_fork):
+        statsd = DogStatsd(
+            host="localhost",
+            port=server.port,
+            disable_aggregation=False,
+            disable_buffering=False,
+            disable_background_sender=False,
+            disable_telemetry=True,
+            flush_on_fork=flush_on_fork,
+        )
+
+        latencies = []
+        try:
+            for _ in range(self.num_forks):
+                # Refill the aggregator so that every fork has pending data to deal with.
+                for idx in range(self.num_contexts):
+                    statsd.increment("fork.bench.{}".format(idx))
+
+                start = time.time()
+                pid = os.fork()
+                if pid == 0:
+                    os._exit(0)
+                latencies.append(time.time() - start)
+                os.waitpid(pid, 0)
+        finally:
+            statsd.stop()
+
+        return latencies
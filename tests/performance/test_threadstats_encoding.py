@@ -0,0 +1,61 @@
+# coding: utf8
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the BSD-3-Clause License. This product includes software developed at
+# Datadog (https://www.datadoghq.com/).
+
+# Copyright 2015-Present Datadog, Inc
+
+# stdlib
+import os
+import sys
+import timeit
+import unittest
+
+# 3p
+import mock
+
+# datadog
+from datadog import ThreadStats, api
+from datadog.threadstats.reporters import HttpReporter
+
+
+class TestThreadStatsEncoding(unittest.TestCase):
+    """
+    Measure the time spent flushing ThreadStats series through `HttpReporter`, with
+    series encoded straight into payloads or formatted as dictionaries first, without
+    any network I/O.
+    """
+
+    DEFAULT_NUM_SERIES = 100000
+
+    RUN_MESSAGE = "{} series on Python{}.{}: {} {:.3f}s"
+
+    def setUp(self):
+        self.num_series = int(os.getenv("BENCHMARK_NUM_SERIES", str(self.DEFAULT_NUM_SERIES)))
+        patcher = mock.patch.object(api, "_host_name", "myhost")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("datadog.threadstats.reporters.APIClient.submit", return_value={"status": "ok"})
+        self.submit = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Add a newline so that we don't get clobbered by the test output
+        print("")
+
+    def report(self, name, flush):
+        stats = ThreadStats(constant_tags=["env:test"])
+        stats.start(flush_in_thread=False, reporter=HttpReporter(compress_payload=True))
+        for i in range(self.num_series):
+            stats.gauge("gauge.{}".format(i % 1000), i, timestamp=100, tags=["index:{}".format(i // 1000)])
+
+        duration = timeit.timeit(lambda: flush(stats), number=1)
+        print(
+            self.RUN_MESSAGE.format(self.num_series, sys.version_info[0], sys.version_info[1], name, duration)
+        )
+        assert self.submit.called
+
+    def test_encoded_series(self):
+        self.report("encoded series", lambda stats: stats._flush_encoded_series(200))
+
+    def test_series_dictionaries(self):
+        self.report("series dictionaries", lambda stats: stats._flush_series(200))
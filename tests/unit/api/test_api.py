@@ -2,23 +2,40 @@
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2015-Present Datadog, Inc
 # stdlib
+from array import array
 from copy import deepcopy
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
 import json
+import math
 import os
+import shutil
+import subprocess
+import sys
 import tempfile
-from time import time
+import threading
+from time import sleep, time
+import unittest
 import zlib
 
 # 3p
 import mock, pytest
+import requests
 
 # datadog
 from datadog import initialize, api, util
 from datadog.api import (
     Distribution,
     Event,
+    Hosts,
     Logs,
     Metric,
+    Monitor,
+    Roles,
+    SecurityMonitoringSignal,
     ServiceCheck,
     User
 )
@@ -32,6 +49,12 @@ from datadog.api.exceptions import (
     ApiError,
     ApiNotInitialized,
 )
+from datadog.api.api_client import APIClient, EncodedBody
+from datadog.api.format import ColumnarPoints, PayloadEncoder, json_default
+from datadog.api.http_client import RequestClient, Urllib3Client
+from datadog.api.response_stream import _Reader, iter_json
+from datadog.api.resources import SearchableAPIResource
+from datadog.api.spool import Spool, _encode_record
 from datadog.util.compat import is_p3k
 from datadog.util.format import normalize_tags
 from tests.unit.api.helper import (
@@ -48,6 +71,7 @@ from tests.unit.api.helper import (
     MyUpdatableSubResource,
     MyDeletableSubResource,
     MyActionable,
+    MockResponse,
     API_KEY,
     APP_KEY,
     API_HOST,
@@ -714,6 +738,67 @@ class TestMetricResource(DatadogAPIWithInitialization):
                  dict(metric='metric.2', points=[[time(), [19]]])]
         self.submit_and_assess_dist_payload(serie, attach_host_name=False)
 
+    def test_columnar_points_submission(self):
+        """
+        Arrays of values and `(timestamps, values)` columns are sent as `(timestamp, value)` pairs.
+        """
+        # Columns of timestamps and values
+        Metric.send(metric='metric.1', points=(array('d', [10, 20, 30]), array('l', [1, 2, 3])))
+        self.assertEqual(self.get_request_data()['series'][0]['points'],
+                         [[10.0, 1.0], [20.0, 2.0], [30.0, 3.0]])
+
+        Metric.send(metric='metric.1', points=([10, 20], [1.5, 2.5]))
+        self.assertEqual(self.get_request_data()['series'][0]['points'], [[10.0, 1.5], [20.0, 2.5]])
+
+        # Array of values, submitted now
+        now = time()
+        Metric.send(metric='metric.1', points=array('d', [1, 2]))
+        points = self.get_request_data()['series'][0]['points']
+        self.assertEqual([value for _, value in points], [1.0, 2.0])
+        self.assertEqual(points[0][0], points[1][0])
+        assert now - 1 < points[0][0] < now + 1
+
+        # Columns of different lengths
+        with self.assertRaises(ValueError):
+            Metric.send(metric='metric.1', points=(array('d', [10, 20]), array('d', [1])))
+
+    def test_columnar_points_encoding(self):
+        """
+        Values sharing a timestamp are encoded in bulk, as their pairs would be.
+        """
+        for values in (array('d', [1, 2.5, float('inf')]), array('d', [7]), array('d')):
+            points = ColumnarPoints(array('d', [123.5]) * len(values), values, 123.5)
+            self.assertEqual(points.to_json(), json.dumps(points.tolist()))
+
+        points = ColumnarPoints(array('d', [123]) * 2, array('d', [1, 2]), 123.0)
+        body = {"series": [{"metric": "metric.1", "points": points}, {"metric": "metric.2", "points": points}]}
+        self.assertEqual(PayloadEncoder().encode(body), json.dumps(body, default=json_default))
+        self.assertEqual(json.loads(PayloadEncoder(sort_keys=True).encode(body))["series"][1]["points"],
+                         [[123.0, 1.0], [123.0, 2.0]])
+
+        # The placeholder of bulk-encoded points in a string of the payload
+        body["series"][0]["metric"] = "\x00datadog-bulk-points\x00"
+        self.assertEqual(PayloadEncoder().encode(body), json.dumps(body, default=json_default))
+
+    def test_columnar_dist_points_submission(self):
+        """
+        Arrays of distribution values are sent as lists of floats.
+        """
+        Distribution.send(metric='metric.1', points=[(123, array('l', [13, 19]))])
+        self.assertEqual(self.get_request_data()['series'][0]['points'], [[123, [13.0, 19.0]]])
+
+    def test_numpy_points_submission(self):
+        """
+        NumPy arrays of values are sent as `(timestamp, value)` pairs.
+        """
+        numpy = pytest.importorskip("numpy")
+
+        Metric.send(metric='metric.1', points=(numpy.array([10, 20]), numpy.array([1, 2], dtype="int32")))
+        self.assertEqual(self.get_request_data()['series'][0]['points'], [[10.0, 1.0], [20.0, 2.0]])
+
+        Distribution.send(metric='metric.1', points=[(123, numpy.array([13, 19]))])
+        self.assertEqual(self.get_request_data()['series'][0]['points'], [[123, [13.0, 19.0]]])
+
     def test_data_type_support(self):
         """
         `Metric` API supports `real` numerical data types.
@@ -791,6 +876,104 @@ class TestMetricResource(DatadogAPIWithInitialization):
         assert headers["Content-Encoding"] == "deflate"
         assert req_data == compressed_series
 
+    def test_encoded_body(self):
+        """
+        Encoded bodies are sent as is
+        """
+        data = b'{"series": []}'
+        APIClient.submit("POST", "series", body=EncodedBody(data), attach_host_name=True, compress_payload=True)
+        (method, url), kwargs = self.request_mock.call_args()
+        assert (method, url) == ("POST", API_HOST + "/api/v1/series")
+        assert kwargs["data"] == data
+        assert kwargs["headers"]["Content-Type"] == "application/json"
+        assert "Content-Encoding" not in kwargs["headers"]
+
+        compressed = zlib.compress(data)
+        APIClient.submit("POST", "series", body=EncodedBody(compressed, compressed=True))
+        _, kwargs = self.request_mock.call_args()
+        assert kwargs["data"] == compressed
+        assert kwargs["headers"]["Content-Encoding"] == "deflate"
+
+    @mock.patch("datadog.api._stream_compressed_payload", True)
+    @mock.patch("datadog.api.api_client._STREAM_BLOCK_SIZE", 1024)
+    def test_streamed_compression(self):
+        """
+        Compressed payloads can be streamed, with a chunked upload
+        """
+        series = [dict(metric="metric.{}".format(i), points=[(time(), 13.)], tags=["a:b"]) for i in range(500)]
+        Metric.send(series, compress_payload=True, attach_host_name=False)
+        _, kwargs = self.request_mock.call_args()
+        assert kwargs["headers"]["Content-Encoding"] == "deflate"
+        chunks = list(kwargs["data"])
+        assert len(chunks) > 1
+        assert zlib.decompress(b"".join(chunks)) == json.dumps({"series": series}).encode("utf-8")
+
+        # Uncompressed payloads are not streamed
+        Metric.send(series, attach_host_name=False)
+        _, kwargs = self.request_mock.call_args()
+        assert kwargs["data"] == json.dumps({"series": series})
+
+    def test_query_range(self):
+        def respond(method, url, params, **kwargs):
+            start, end = params["from"], params["to"]
+            series = [
+                {"expression": "avg:load{*}", "start": start * 1000, "end": end * 1000,
+                 "pointlist": [[t * 1000.0, None if t == 150 else t / 10.0] for t in range(start, end + 1, 50)]},
+            ]
+            if start >= 100:
+                series.append({"expression": "avg:load{host:a}", "pointlist": [[start * 1000.0, 1.0]]})
+            response = MockResponse()
+            response.status_code = 200
+            response.raw = BytesIO(json.dumps({"status": "ok", "series": series}).encode("utf-8"))
+            return response
+
+        search = SearchableAPIResource._search
+
+        def search_after_send(cls, **params):
+            # A concurrent call of `Metric.send` points the shared endpoint elsewhere
+            cls._resource_name = Metric._METRIC_SUBMIT_ENDPOINT
+            return search.__func__(cls, **params)
+
+        self.request_mock.request = mock.Mock(side_effect=respond)
+        with mock.patch("datadog.api.metrics._import_numpy", return_value=None), \
+                mock.patch.object(SearchableAPIResource, "_search", classmethod(search_after_send)):
+            result = Metric.query_range("avg:load{*}", start=0, end=250, step_window=100)
+
+        calls = self.request_mock.request.call_args_list
+        assert all(c[0][1].endswith("/v1/query") for c in calls)
+        windows = sorted((c[1]["params"]["from"], c[1]["params"]["to"]) for c in calls)
+        assert windows == [(0, 100), (100, 200), (200, 250)]
+        assert (result["from_date"], result["to_date"]) == (0, 250000)
+
+        load, host_load = result["series"]
+        assert load["expression"] == "avg:load{*}"
+        assert (load["start"], load["end"], load["length"]) == (0, 250000, 6)
+        assert load["times"] == array("d", [0, 50000, 100000, 150000, 200000, 250000])
+        assert list(load["values"][:3]) == [0.0, 5.0, 10.0] and math.isnan(load["values"][3])
+        assert list(host_load["times"]) == [100000, 200000]
+
+    @mock.patch("datadog.api._mute", True)
+    def test_query_range_errors(self):
+        def respond(*args, **kwargs):
+            response = MockResponse()
+            response.status_code = 400
+            response.raw = BytesIO(b'{"errors": ["Invalid query"]}')
+            return response
+
+        self.request_mock.request = mock.Mock(side_effect=respond)
+        with pytest.raises(ApiError):
+            Metric.query_range("avg:load{", start=0, end=250, step_window=100)
+
+        # Windows must be within the 24 hours a query can span
+        for step_window in (0, -60, 24 * 3600 + 1):
+            with pytest.raises(ValueError):
+                Metric.query_range("avg:load{*}", start=0, end=250, step_window=step_window)
+
+        # Reversed or empty ranges are rejected rather than queried
+        for start, end in ((250, 0), (250, 250)):
+            with pytest.raises(ValueError):
+                Metric.query_range("avg:load{*}", start=start, end=end)
+
 
 class TestServiceCheckResource(DatadogAPIWithInitialization):
 
@@ -836,3 +1019,727 @@ class TestUserResource(DatadogAPIWithInitialization):
     def test_get_all_users(self):
         User.get_all()
         self.request_called_with("GET", "https://example.com/api/v1/user")
+
+
+class TestBatch(DatadogAPIWithInitialization):
+
+    def setUp(self):
+        super(TestBatch, self).setUp()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.urls = []
+
+    def tearDown(self):
+        super(TestBatch, self).tearDown()
+        APIClient._timeout_counter = 0
+        APIClient._backoff_timestamp = None
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.urls.append(url)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        if url.endswith("/13/mute"):
+            raise requests.exceptions.Timeout()
+        return MockResponse()
+
+    def test_batch(self):
+        self.request_mock.request = self.request
+        futures = api.batch(
+            [(Monitor.mute, (i,)) for i in range(20)] + [(Monitor.get, (1,), {"group_states": "all"})]
+        )
+        assert len(futures) == 21
+
+        for i, future in enumerate(futures[:20]):
+            if i == 13:
+                with pytest.raises(HttpTimeout):
+                    future.result(5)
+            else:
+                assert future.result(5) is None
+        futures[20].result(5)
+        assert sorted(self.urls)[0] == API_HOST + "/api/v1/monitor/0/mute"
+        assert API_HOST + "/api/v1/monitor/1" in self.urls
+        assert 1 < self.max_running <= api._batch_max_workers
+
+    def test_batch_backoff(self):
+        self.request_mock.request = self.request
+        APIClient._timeout_counter = APIClient._max_timeouts
+        futures = api.batch([lambda: Monitor.mute(1), lambda: Monitor.mute(2)])
+        for future in futures:
+            with pytest.raises(HttpBackoff):
+                future.result(5)
+        assert self.urls == []
+
+
+@pytest.mark.skipif(sys.version_info < (3, 5), reason="Asynchronous API calls require Python 3.5 or higher")
+class TestAsyncResources(DatadogAPIWithInitialization):
+
+    def setUp(self):
+        super(TestAsyncResources, self).setUp()
+        import asyncio
+        from datadog.api.async_client import AsyncAPIClient, ExecutorClient
+
+        self.loop = asyncio.new_event_loop()
+        patcher = mock.patch.object(AsyncAPIClient, "_http_client", ExecutorClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        super(TestAsyncResources, self).tearDown()
+        self.loop.close()
+
+    def test_resource_call(self):
+        self.load_request_response(response_body='[{"id": 1}]')
+        call = api.aio.Monitor.get_all(group_states=["all"])
+        # Nothing is sent until the call is awaited
+        assert self.request_mock.request.call_count == 0
+        assert self.loop.run_until_complete(call) == [{"id": 1}]
+        (method, url), kwargs = self.request_mock.request.call_args
+        assert (method, url, kwargs["params"]) == ("GET", API_HOST + "/api/v1/monitor", {"group_states": "all"})
+
+        # Blocking calls are unaffected
+        self.load_request_response(response_body='[{"id": 1}]')
+        assert Monitor.get_all() == [{"id": 1}]
+
+    @mock.patch("datadog.api._mute", True)
+    def test_errors(self):
+        self.load_request_response(status_code=404, response_body='{"errors": ["Monitor not found"]}')
+        assert self.loop.run_until_complete(api.aio.Monitor.get(1)) == {"errors": ["Monitor not found"]}
+
+        with pytest.raises(ApiError):
+            api.aio.Metric.query(query="avg:system.load.1{*}")
+        with pytest.raises(AttributeError):
+            api.aio.initialize
+
+    def test_close(self):
+        self.loop.run_until_complete(api.aio.close())
+
+
+class TestConnectionPools(unittest.TestCase):
+
+    def setUp(self):
+        connection_headers = self.connection_headers = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                connection_headers.append(self.headers.get("Connection"))
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = "http://127.0.0.1:{}/api/v1/validate".format(self.server.server_port)
+        self.pool = "http://127.0.0.1:{}".format(self.server.server_port)
+
+        for client, attribute, value in (
+            (RequestClient, "_session", None),
+            (RequestClient, "_http_adapter", None),
+            (Urllib3Client, "_pool", None),
+            (Urllib3Client, "_keep_alive", True),
+        ):
+            patcher = mock.patch.object(client, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def send(self, client, count=3):
+        for _ in range(count):
+            client.request("GET", self.url, {}, {}, None, 5, None, True, 0)
+
+    def test_requests_pool(self):
+        with mock.patch("datadog.api._pool_maxsize", 4), mock.patch("datadog.api._pool_block", True):
+            self.send(RequestClient)
+        adapter = RequestClient._http_adapter
+        assert (adapter._pool_maxsize, adapter._pool_block) == (4, True)
+        assert RequestClient.pool_stats() == {self.pool: {"connections_opened": 1, "connections_reused": 2}}
+
+    def test_requests_pool_without_keep_alive(self):
+        with mock.patch("datadog.api._keep_alive", False):
+            self.send(RequestClient)
+        assert self.connection_headers == ["close"] * 3
+
+    def test_urllib3_pool(self):
+        with mock.patch("datadog.api._pool_maxsize", 4):
+            self.send(Urllib3Client)
+        assert Urllib3Client._pool.connection_pool_kw["maxsize"] == 4
+        assert Urllib3Client.pool_stats() == {self.pool: {"connections_opened": 1, "connections_reused": 2}}
+
+        Urllib3Client._pool = None
+        with mock.patch("datadog.api._keep_alive", False):
+            self.send(Urllib3Client, count=1)
+        assert self.connection_headers[-1] == "close"
+
+
+class TestResponseCache(DatadogAPIWithInitialization):
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+        self.now = 1000.0
+        self.responses = []
+        self.request_mock.request = mock.Mock(side_effect=self.respond)
+        for name, value in (("_cache_ttl", 60), ("_cache_max_entries", 2)):
+            patcher = mock.patch("datadog.api." + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("datadog.api.response_cache.time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, APIClient, "_response_cache", None)
+
+    def respond(self, method, url, **kwargs):
+        status_code, body, headers = self.responses.pop(0) if self.responses else (200, '{"id": 1}', {})
+        response = MockResponse()
+        response.status_code = status_code
+        response.raw = BytesIO(body.encode("utf-8"))
+        response.headers.update(headers)
+        return response
+
+    def requests_sent(self):
+        return [(c[0][0], c[0][1]) for c in self.request_mock.request.call_args_list]
+
+    def test_disabled(self):
+        with mock.patch("datadog.api._cache_ttl", 0):
+            Monitor.get(1)
+            Monitor.get(1)
+        assert len(self.requests_sent()) == 2
+
+    def test_cache_and_invalidation(self):
+        self.responses = [(200, '{"id": 1, "name": "a"}', {}), (200, '{"id": 1, "name": "b"}', {})]
+        assert Monitor.get(1) == {"id": 1, "name": "a"}
+        assert Monitor.get(1) == {"id": 1, "name": "a"}
+        # Responses are decoded again for each call
+        Monitor.get(1)["name"] = "c"
+        assert Monitor.get(1) == {"id": 1, "name": "a"}
+        assert len(self.requests_sent()) == 1
+
+        Monitor.get(1, group_states=["all"])
+        assert len(self.requests_sent()) == 2
+
+        Monitor.update(1, name="b")
+        Monitor.get(1)
+        assert self.requests_sent()[-2:] == [
+            ("PUT", API_HOST + "/api/v1/monitor/1"),
+            ("GET", API_HOST + "/api/v1/monitor/1"),
+        ]
+
+    def test_lru_eviction(self):
+        for monitor_id in (1, 2, 1, 3, 1, 2):
+            Monitor.get(monitor_id)
+        assert [url.rsplit("/", 1)[1] for _, url in self.requests_sent()] == ["1", "2", "3", "2"]
+
+    def test_ttl_and_revalidation(self):
+        self.responses = [(200, '{"id": 1}', {"ETag": '"v1"'}), (304, "", {}), (200, '{"id": 2}', {"ETag": '"v2"'})]
+        Monitor.get(1)
+        self.now += 61
+        assert Monitor.get(1) == {"id": 1}
+        assert self.request_mock.request.call_args[1]["headers"]["If-None-Match"] == '"v1"'
+        # Fresh again after revalidation
+        self.now += 30
+        Monitor.get(1)
+        assert len(self.requests_sent()) == 2
+
+        self.now += 31
+        assert Monitor.get(1) == {"id": 2}
+        assert len(self.requests_sent()) == 3
+
+    def test_ttl_without_etag(self):
+        Monitor.get(1)
+        self.now += 61
+        Monitor.get(1)
+        assert "If-None-Match" not in self.request_mock.request.call_args[1]["headers"]
+        assert len(self.requests_sent()) == 2
+
+    @mock.patch.object(APIClient, "_timeout_counter", 0)
+    def test_read_timeout(self):
+        """
+        Read timeouts while a response is cached raise `HttpTimeout`, as without the cache.
+        """
+        response = MockResponse()
+        response.status_code = 200
+        response.raw = mock.Mock(spec=["read"])
+        response.raw.read.side_effect = requests.exceptions.ConnectionError("Read timed out.")
+        response.request = requests.Request("GET", "https://example.com").prepare()
+        self.request_mock.request = mock.Mock(return_value=response)
+        with pytest.raises(HttpTimeout):
+            Monitor.get(1)
+        assert APIClient._timeout_counter == 1
+        assert len(APIClient._response_cache) == 0
+
+
+class TestPagination(DatadogAPIWithInitialization):
+
+    def setUp(self):
+        super(TestPagination, self).setUp()
+        self.responses = []
+        self.request_mock.request = mock.Mock(side_effect=self.respond)
+
+    def respond(self, method, url, **kwargs):
+        status_code, body = self.responses.pop(0)
+        response = MockResponse()
+        response.status_code = status_code
+        response.raw = BytesIO(json.dumps(body).encode("utf-8"))
+        return response
+
+    def params_sent(self):
+        return [c[1]["params"] for c in self.request_mock.request.call_args_list]
+
+    def test_page_number(self):
+        self.responses = [(200, [{"id": 1}, {"id": 2}]), (200, [{"id": 3}])]
+        monitors = Monitor.iter_all(page_size=2, monitor_tags=["service:web"])
+        # Pages are fetched lazily
+        assert next(monitors) == {"id": 1}
+        assert len(self.params_sent()) == 1
+        assert [m["id"] for m in monitors] == [2, 3]
+        assert [(p["page"], p["page_size"], p["monitor_tags"]) for p in self.params_sent()] == [
+            (0, 2, "service:web"),
+            (1, 2, "service:web"),
+        ]
+
+    def test_offset(self):
+        self.responses = [
+            (200, {"host_list": [{"name": "a"}, {"name": "b"}], "total_matching": 3}),
+            (200, {"host_list": [{"name": "c"}], "total_matching": 3}),
+        ]
+        assert [h["name"] for h in Hosts.iter_search(count=2, filter="env:prod")] == ["a", "b", "c"]
+        assert [(p["start"], p["count"]) for p in self.params_sent()] == [(0, 2), (2, 2)]
+
+    def test_full_last_page(self):
+        self.responses = [(200, {"data": [{"id": "a"}, {"id": "b"}]}), (200, {"data": []})]
+        assert [r["id"] for r in Roles.iter_all(page_size=2)] == ["a", "b"]
+        assert [p["page[number]"] for p in self.params_sent()] == [0, 1]
+
+    def test_cursor(self):
+        self.responses = [
+            (200, {"data": [{"id": "a"}], "meta": {"page": {"after": "cursor"}}}),
+            (200, {"data": [{"id": "b"}], "meta": {"page": {}}}),
+        ]
+        assert [s["id"] for s in SecurityMonitoringSignal.iter_all(page_size=1)] == ["a", "b"]
+        assert [p.get("page[cursor]") for p in self.params_sent()] == [None, "cursor"]
+
+    def test_prefetch(self):
+        self.responses = [(200, [{"id": 1}]), (200, [{"id": 2}]), (200, [])]
+        monitors = Monitor.iter_all(page_size=1, prefetch=True)
+        assert next(monitors) == {"id": 1}
+        # The next page is fetched in the background
+        deadline = time() + 5
+        while len(self.params_sent()) < 2 and time() < deadline:
+            sleep(0.01)
+        assert len(self.params_sent()) == 2
+        assert list(monitors) == [{"id": 2}]
+        assert len(self.params_sent()) == 3
+
+    @mock.patch("datadog.api._mute", True)
+    def test_errors(self):
+        self.responses = [(200, {"events": [{"id": 1}] * 1000}), (403, {"errors": ["Forbidden"]})]
+        events = Event.iter_query(start=1, end=2)
+        assert len([next(events) for _ in range(1000)]) == 1000
+        with pytest.raises(ApiError):
+            next(events)
+
+
+class TestRateLimits(DatadogAPIWithInitialization):
+
+    def setUp(self):
+        super(TestRateLimits, self).setUp()
+        self.now = 1000.0
+        self.sleeps = []
+        self.responses = []
+        self.request_mock.request = mock.Mock(side_effect=self.respond)
+        for target, value in (
+            ("datadog.api.rate_limiter.time.time", lambda: self.now),
+            ("datadog.api.api_client.time.sleep", self.sleep),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        APIClient._rate_limiter.clear()
+        self.addCleanup(APIClient._rate_limiter.clear)
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+    def respond(self, method, url, **kwargs):
+        status_code, remaining, reset = self.responses.pop(0) if self.responses else (200, 100, 10)
+        response = MockResponse()
+        response.status_code = status_code
+        response.raw = BytesIO(b'{"errors": ["Too many requests"]}' if status_code == 429 else b"{}")
+        response.headers.update({
+            "X-RateLimit-Name": "monitor_api",
+            "X-RateLimit-Limit": "100",
+            "X-RateLimit-Period": "60",
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(reset),
+        })
+        return response
+
+    def test_pacing(self):
+        self.responses = [(200, 1, 10), (200, 0, 9)]
+        Monitor.get(1)
+        self.now += 1
+        Monitor.get(2)
+        assert self.sleeps == []
+        # Remaining calls are exhausted: wait for the reset
+        Monitor.get(3)
+        assert self.sleeps == [9]
+        Monitor.get_all()
+        assert self.sleeps == [9]
+
+        stats = APIClient.rate_limit_stats()["monitor"]
+        assert stats["name"] == "monitor_api"
+        assert stats["limit"] == 100
+        assert stats["requests"] == 4
+        assert stats["waited"] == 9
+
+    def test_retry_after_reset(self):
+        self.responses = [(429, 0, 5), (429, 0, 5)]
+        assert Monitor.get(1) == {}
+        assert self.sleeps == [5, 5]
+        stats = APIClient.rate_limit_stats()["monitor"]
+        assert (stats["requests"], stats["rate_limited"], stats["retries"]) == (3, 2, 2)
+
+    def test_retry_releases_response(self):
+        """
+        Rate limited responses are released before the retry, which revalidates the same cached response.
+        """
+        def revalidate(method, path, request):
+            request["headers"]["If-None-Match"] = '"v1"'
+
+        self.responses = [(429, 0, 5)]
+        with mock.patch.object(MockResponse, "close", autospec=True) as close, \
+                mock.patch.object(APIClient, "_get_cached_result", side_effect=revalidate):
+            assert Monitor.get(1) == {}
+        assert close.call_count == 1
+        assert close.call_args[0][0].status_code == 429
+        assert self.request_mock.request.call_args[1]["headers"]["If-None-Match"] == '"v1"'
+
+    def test_retry_read_timeout(self):
+        """
+        Read timeouts while a rate limited response is released raise `HttpTimeout`.
+        """
+        def respond(method, url, **kwargs):
+            response = self.respond(method, url, **kwargs)
+            response.raw = mock.Mock(spec=["read"])
+            response.raw.read.side_effect = requests.exceptions.ConnectionError("Read timed out.")
+            response.request = requests.Request(method, url).prepare()
+            return response
+
+        self.request_mock.request = mock.Mock(side_effect=respond)
+        self.responses = [(429, 0, 5)]
+        with pytest.raises(HttpTimeout):
+            Monitor.get(1)
+        assert self.request_mock.request.call_count == 1
+
+    @mock.patch("datadog.api._mute", False)
+    def test_retries_exhausted(self):
+        self.responses = [(429, 0, 5)] * 3
+        with mock.patch("datadog.api._rate_limit_retries", 2):
+            with pytest.raises(ApiError):
+                Monitor.get(1)
+        assert self.sleeps == [5, 5]
+
+    @mock.patch("datadog.api._mute", False)
+    def test_max_wait(self):
+        self.responses = [(429, 0, 3600), (200, 0, 3500)]
+        with pytest.raises(ApiError):
+            Monitor.get(1)
+        # Calls are sent rather than waiting that long
+        Monitor.get(1)
+        assert self.sleeps == []
+        assert APIClient.rate_limit_stats()["monitor"]["requests"] == 2
+
+
+class TestResponseStream(DatadogAPIWithInitialization):
+
+    def load_chunked_response(self, body, chunk_size=7, status_code=200, headers=None):
+        response = MockResponse()
+        response.status_code = status_code
+        response.raw = BytesIO(body)
+        response.headers.update(headers or {})
+        # Read in small chunks
+        response.iter_content = lambda _: iter(lambda: response.raw.read(chunk_size), b"")
+        self.request_mock.request = mock.Mock(return_value=response)
+
+    def test_streamed_request(self):
+        self.load_chunked_response(b'{"id": 1}')
+        assert Monitor.get(1) == {"id": 1}
+        assert self.request_mock.request.call_args[1]["stream"] is True
+
+    def test_decompression(self):
+        body = json.dumps({"series": [{"metric": u"m\u00e9tric", "pointlist": [[i, i * 0.5] for i in range(100)]}]})
+        compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        for encoding, data in (
+            ("gzip", compressor.compress(body.encode("utf-8")) + compressor.flush()),
+            ("deflate", zlib.compress(body.encode("utf-8"))),
+            # Already decompressed by the HTTP client
+            ("gzip", body.encode("utf-8")),
+        ):
+            self.load_chunked_response(data, headers={"Content-Encoding": encoding})
+            assert Metric.query(start=1, end=2, query="metric") == json.loads(body)
+
+    def test_lazy_response(self):
+        monitors = [{"id": i, "name": u"\u00e9 {}".format(i), "value": i * 1.5e10} for i in range(50)]
+        self.load_chunked_response(json.dumps(monitors).encode("utf-8"), chunk_size=3)
+        response = Monitor.get_all(lazy_response=True)
+        assert "lazy_response" not in self.request_mock.request.call_args[1]["params"]
+        assert next(response) == monitors[0]
+        assert list(response) == monitors[1:]
+
+        self.load_chunked_response(b'{"host_list": [{"name": "a"}, {"name": "b"}], "total_matching": 12}', chunk_size=2)
+        response = api.Hosts.search(lazy_response=True)
+        key, hosts = next(response)
+        assert key == "host_list"
+        assert next(hosts) == {"name": "a"}
+        assert next(hosts) == {"name": "b"}
+        assert list(response) == [("total_matching", 12)]
+
+        # Arrays not consumed are skipped
+        self.load_chunked_response(b'{"host_list": [{"name": "a"}, {"name": "b"}], "total_matching": 12}', chunk_size=2)
+        assert [key for key, _ in api.Hosts.search(lazy_response=True)] == ["host_list", "total_matching"]
+
+    def test_lazy_response_scaling(self):
+        """
+        The text buffered, and parsed, while parsing a response lazily grows linearly with its size.
+        """
+        read_more = _Reader.read_more
+
+        def parsed_ratio(size):
+            body = json.dumps({
+                "series": [{"pointlist": [[i, i * 1.5]]} for i in range(size)],
+                "metadata": {"point.{}".format(i): i * 1.5 for i in range(size)},
+            })
+            buffered = []
+
+            def counting_read_more(reader):
+                more = read_more(reader)
+                buffered.append(len(reader.buffer))
+                return more
+
+            with mock.patch.object(_Reader, "read_more", counting_read_more):
+                for _, value in iter_json(body[i:i + 1024] for i in range(0, len(body), 1024)):
+                    if not isinstance(value, dict):
+                        list(value)
+            return sum(buffered) / float(len(body))
+
+        # Growing with the size if quadratic, e.g. 28 times the body for 2000 series
+        assert parsed_ratio(5000) < 3
+        assert parsed_ratio(40000) < 3
+
+    @mock.patch("datadog.api._mute", True)
+    def test_lazy_response_errors(self):
+        self.load_chunked_response(b'{"errors": ["Monitor not found"]}', status_code=404)
+        assert Monitor.get(1, lazy_response=True) == {"errors": ["Monitor not found"]}
+
+        self.load_chunked_response(b'[{"id": 1}, {"id": 2')
+        with pytest.raises(ValueError):
+            list(Monitor.get_all(lazy_response=True))
+
+    @mock.patch.object(APIClient, "_timeout_counter", 0)
+    def test_read_timeout(self):
+        """
+        Timeouts while a body is read raise `HttpTimeout`, counted towards the backoff.
+        """
+        def iter_content(_):
+            yield b'[{"id": 1}, '
+            raise requests.exceptions.ConnectionError("Read timed out.")
+
+        for lazy_response, return_raw_response in ((False, False), (True, False), (False, True)):
+            self.load_chunked_response(b"")
+            response = self.request_mock.request.return_value
+            response.request = requests.Request("GET", "https://example.com").prepare()
+            response.iter_content = iter_content
+            with mock.patch("datadog.api._return_raw_response", return_raw_response):
+                with pytest.raises(HttpTimeout):
+                    list(Monitor.get_all(lazy_response=lazy_response))
+            assert APIClient._timeout_counter == 1
+
+
+class TestSpool(DatadogAPIWithInitialization):
+
+    def setUp(self):
+        super(TestSpool, self).setUp()
+        self.spool_path = tempfile.mkdtemp()
+        for name, value in (("_spool_path", self.spool_path), ("_spool_replay_interval", 3600), ("_mute", True)):
+            patcher = mock.patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        super(TestSpool, self).tearDown()
+        if APIClient._spool_replayer is not None:
+            APIClient._spool_replayer.stop()
+        APIClient._spool = APIClient._spool_replayer = None
+        APIClient._timeout_counter = 0
+        APIClient._backoff_timestamp = None
+        shutil.rmtree(self.spool_path)
+
+    def replay(self):
+        return APIClient._spool.replay(APIClient._send_spooled)
+
+    def test_spool_on_timeout(self):
+        self.request_mock.request = mock.Mock(side_effect=requests.exceptions.Timeout())
+        with pytest.raises(HttpTimeout):
+            Metric.send(metric='metric.1', points=[(123, 1)])
+        self.request_mock.request = mock.Mock(side_effect=requests.exceptions.ConnectionError())
+        assert "errors" in Distribution.send(metric='metric.2', points=[(123, [1, 2])])
+        # Other resources aren't spooled
+        Monitor.mute(1)
+        assert len(os.listdir(self.spool_path)) == 1
+
+        # Still unreachable
+        assert self.replay() == 0
+
+        self.load_request_response(status_code=202)
+        assert self.replay() == 2
+        calls = self.request_mock.request.call_args_list
+        assert [call[0] for call in calls] == [
+            ("POST", API_HOST + "/api/v1/series"),
+            ("POST", API_HOST + "/api/v1/distribution_points"),
+        ]
+        assert calls[0][1]["headers"]["Content-Encoding"] == "deflate"
+        assert json.loads(zlib.decompress(calls[0][1]["data"])) == {
+            "series": [{"metric": "metric.1", "points": [[123, 1.0]], "host": api._host_name}]
+        }
+        assert APIClient._spool.size() == 0
+        assert os.listdir(self.spool_path) == []
+
+    def test_spool_on_backoff(self):
+        APIClient._timeout_counter = APIClient._max_timeouts
+        with pytest.raises(HttpBackoff):
+            Metric.send(metric='metric.1', points=(array('d', [123]), array('d', [1])))
+        assert self.request_mock.call_count() == 0
+
+        # Replayed once the backoff period is over
+        assert self.replay() == 0
+        APIClient._backoff_timestamp -= APIClient._backoff_period + 1
+        self.load_request_response(status_code=202)
+        assert self.replay() == 1
+        kwargs = self.request_mock.request.call_args[1]
+        assert json.loads(zlib.decompress(kwargs["data"])) == {
+            "series": [{"metric": "metric.1", "points": [[123.0, 1.0]], "host": api._host_name}]
+        }
+
+    def test_spool_replay_rejected(self):
+        self.request_mock.request = mock.Mock(side_effect=requests.exceptions.Timeout())
+        for i in range(3):
+            with pytest.raises(HttpTimeout):
+                Metric.send(metric='metric.1', points=[(123, i)])
+        APIClient._timeout_counter = 0
+
+        # Rate limited: kept for later
+        self.load_request_response(status_code=429, response_body='{"errors": ["Too many requests"]}')
+        assert self.replay() == 0
+        # Rejected: dropped
+        self.load_request_response(status_code=400, response_body='{"errors": ["Invalid payload"]}')
+        assert self.replay() == 3
+        assert APIClient._spool.size() == 0
+
+    def test_spool_segments(self):
+        spool = Spool(self.spool_path, 2000)
+        for i in range(100):
+            spool.append("series", None, zlib.compress(json.dumps({"series": i}).encode("utf-8")))
+        # The oldest payloads are dropped
+        assert 0 < spool.size() <= 2000
+        assert len(os.listdir(self.spool_path)) > 1
+
+        sent = []
+
+        def send(path, api_version, data):
+            if len(sent) == 5:
+                return False
+            sent.append(json.loads(zlib.decompress(data))["series"])
+            return True
+
+        assert spool.replay(send) == 5
+        assert sent == list(range(sent[0], sent[0] + 5))
+        assert sent[0] > 0
+
+        # Pending payloads are kept on disk, a torn record being ignored
+        segments = sorted(os.listdir(self.spool_path))
+        with open(os.path.join(self.spool_path, segments[-1]), "ab") as segment:
+            segment.write(b"\x00\x00\x01")
+        spool = Spool(self.spool_path, 2000)
+        replayed = []
+        assert spool.replay(lambda path, api_version, data: replayed.append(json.loads(zlib.decompress(data))["series"])
+                            or True) == 99 - sent[-1]
+        assert replayed == list(range(sent[-1] + 1, 100))
+        assert os.listdir(self.spool_path) == []
+
+    def test_spool_other_files(self):
+        for name in ("notes.spool", "00000000000000000003.spool.tmp"):
+            with open(os.path.join(self.spool_path, name), "wb") as other:
+                other.write(b"other")
+        spool = Spool(self.spool_path, 2000)
+        assert spool.size() == 0
+        spool.append("series", None, zlib.compress(b"{}"))
+        assert spool.replay(lambda path, api_version, data: True) == 1
+        assert sorted(os.listdir(self.spool_path)) == ["00000000000000000003.spool.tmp", "notes.spool"]
+
+    def test_spool_segments_of_other_processes(self):
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        names = {
+            "running": "{0}-{1:020d}.spool".format(os.getppid(), 0),
+            "exited": "{0}-{1:020d}.spool".format(exited.pid, 0),
+            "older version": "{0:020d}.spool".format(1),
+        }
+        for owner, name in names.items():
+            with open(os.path.join(self.spool_path, name), "wb") as segment:
+                segment.write(_encode_record("series", None, zlib.compress(owner.encode("utf-8"))))
+
+        # Segments of processes no longer running are taken over
+        spool = Spool(self.spool_path, 2000)
+        replayed = []
+        assert spool.replay(lambda path, api_version, data: replayed.append(zlib.decompress(data)) or True) == 2
+        assert sorted(replayed) == [b"exited", b"older version"]
+        assert os.listdir(self.spool_path) == [names["running"]]
+
+        spool.append("series", None, zlib.compress(b"own"))
+        own = "{0}-{1:020d}.spool".format(os.getpid(), 2)
+        assert sorted(os.listdir(self.spool_path)) == sorted([names["running"], own])
+
+    def test_spool_after_fork(self):
+        self.request_mock.request = mock.Mock(side_effect=requests.exceptions.Timeout())
+        with pytest.raises(HttpTimeout):
+            Metric.send(metric='metric.1', points=[(123, 1)])
+        spool, replayer = APIClient._spool, APIClient._spool_replayer
+
+        # A stopped replayer is started again
+        replayer.stop()
+        replayer.join(5)
+        assert APIClient._get_spool() is spool
+        assert APIClient._spool_replayer is not replayer and APIClient._spool_replayer.is_alive()
+
+        # As in a forked child
+        APIClient._spool_pid = -1
+        assert APIClient._get_spool() is not spool
+        assert APIClient._spool_replayer.is_alive()
+
+    def test_spool_replayer(self):
+        api._spool_replay_interval = 0.01
+        self.request_mock.request = mock.Mock(side_effect=requests.exceptions.Timeout())
+        with pytest.raises(HttpTimeout):
+            Metric.send(metric='metric.1', points=[(123, 1)])
+        assert APIClient._spool_replayer.is_alive()
+
+        self.load_request_response(status_code=202)
+        deadline = time() + 5
+        while APIClient._spool.size() and time() < deadline:
+            sleep(0.01)
+        assert APIClient._spool.size() == 0
+        assert self.request_mock.request.call_args[0] == ("POST", API_HOST + "/api/v1/series")
@@ -97,6 +97,27 @@ class TestAggregator(unittest.TestCase):
             self.assertEqual(metric.tags, expected["tags"])
             self.assertEqual(metric.rate, expected["rate"])
             self.assertEqual(metric.value, expected["value"])
-            
+
+    def test_service_checks_coalesced(self):
+        self.aggregator.service_check("check", None, ["a:1"], "_sc|check|2|#a:1")
+        self.aggregator.service_check("check", None, ["a:1"], "_sc|check|0|#a:1")
+        self.aggregator.service_check("check", None, ["b:1", "a:1"], "_sc|check|2|#b:1,a:1")
+        self.aggregator.service_check("check", None, ["a:1", "b:1"], "_sc|check|0|#a:1,b:1")
+        self.aggregator.service_check("check", None, ["a:2"], "_sc|check|1|#a:2")
+        self.aggregator.service_check("check", "host", ["a:1"], "_sc|check|1|h:host|#a:1")
+        self.aggregator.service_check("other", None, None, "_sc|other|0")
+
+        self.assertEqual(
+            sorted(self.aggregator.flush_service_checks()),
+            sorted([
+                "_sc|check|0|#a:1",
+                "_sc|check|0|#a:1,b:1",
+                "_sc|check|1|#a:2",
+                "_sc|check|1|h:host|#a:1",
+                "_sc|other|0",
+            ]),
+        )
+        self.assertEqual(self.aggregator.flush_service_checks(), [])
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,7 +10,7 @@ Tests for container.py
 import mock
 import pytest
 
-from datadog.dogstatsd.container import Cgroup
+from datadog.dogstatsd.container import Cgroup, get_container_id, reset_container_id
 
 
 def get_mock_open(read_data=None):
@@ -181,3 +181,33 @@ def test_container_id_inode():
             "/sys/fs/cgroup/"
         ]
         mock_open.assert_called_once_with("/proc/self/cgroup", mode="r")
+
+
+def test_get_container_id_cached():
+    """Test that cgroups are read once per process, until the cache is reset."""
+    reset_container_id()
+    try:
+        with mock.patch("datadog.dogstatsd.container.Cgroup") as cgroup:
+            cgroup.return_value.container_id = "ci-1234"
+            assert get_container_id() == "ci-1234"
+            assert get_container_id() == "ci-1234"
+            assert cgroup.call_count == 1
+
+            reset_container_id()
+            cgroup.return_value.container_id = "ci-5678"
+            assert get_container_id() == "ci-5678"
+            assert cgroup.call_count == 2
+    finally:
+        reset_container_id()
+
+
+def test_get_container_id_error():
+    """Test that a failure to read cgroups is cached as no container ID."""
+    reset_container_id()
+    try:
+        with mock.patch("datadog.dogstatsd.container.Cgroup", side_effect=NotImplementedError) as cgroup:
+            assert get_container_id() is None
+            assert get_container_id() is None
+            assert cgroup.call_count == 1
+    finally:
+        reset_container_id()
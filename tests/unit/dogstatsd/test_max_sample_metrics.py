@@ -166,7 +166,7 @@ class TestMaxSampleMetric(unittest.TestCase):
 
 class TestMaxSampleMetricContexts(unittest.TestCase):
 
-    @patch('datadog.dogstatsd.max_sample_metric_context.random.random', return_value=0.0)
+    @patch('datadog.dogstatsd.max_sample_metric_context.sampling.random', return_value=0.0)
     def test_sample_passes_rate_to_metric_constructor(self, _mock_random):
         """Ensure the rate parameter is forwarded when creating a new metric context."""
         contexts = MaxSampleMetricContexts(HistogramMetric)
@@ -183,7 +183,7 @@ class TestMaxSampleMetricContexts(unittest.TestCase):
         self.assertAlmostEqual(metric.specified_rate, 0.5)
         self.assertEqual(metric.max_metric_samples, 10)
 
-    @patch('datadog.dogstatsd.max_sample_metric_context.random.random', return_value=0.0)
+    @patch('datadog.dogstatsd.max_sample_metric_context.sampling.random', return_value=0.0)
     def test_sample_passes_rate_to_distribution_metric(self, _mock_random):
         """Ensure the rate parameter is forwarded for distribution metrics."""
         contexts = MaxSampleMetricContexts(DistributionMetric)
@@ -0,0 +1,42 @@
+import threading
+import unittest
+
+from datadog.dogstatsd import sampling
+
+
+class TestSampling(unittest.TestCase):
+    def test_random_range(self):
+        for _ in range(1000):
+            value = sampling.random()
+            self.assertTrue(0.0 <= value < 1.0)
+
+    def test_randbelow_range(self):
+        for _ in range(1000):
+            self.assertIn(sampling.randbelow(3), (0, 1, 2))
+
+    def test_generator_per_thread(self):
+        generators = []
+
+        def collect():
+            generators.append(sampling._generator())
+
+        threads = [threading.Thread(target=collect) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        generators.append(sampling._generator())
+        self.assertEqual(len(set(id(g) for g in generators)), len(generators))
+
+    def test_reseed(self):
+        generator = sampling._generator()
+        self.assertIs(sampling._generator(), generator)
+
+        # After a reseed the same thread must draw from a freshly seeded generator,
+        # as a forked child would after post_fork_child().
+        state = generator.getstate()
+        sampling.reseed()
+        reseeded = sampling._generator()
+        self.assertIsNot(reseeded, generator)
+        self.assertNotEqual(reseeded.getstate(), state)
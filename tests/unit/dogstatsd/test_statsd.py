@@ -435,6 +435,66 @@ class TestDogStatsd(unittest.TestCase):
             "172.17.0.1"
         )
 
+    @patch("datadog.dogstatsd.base.get_default_route", return_value="172.17.0.1")
+    def test_default_route_resolved_lazily(self, mock_get_default_route):
+        statsd = DogStatsd(use_default_route=True, track_instance=False)
+        mock_get_default_route.assert_not_called()
+
+        self.assertEqual(statsd.host, "172.17.0.1")
+        self.assertEqual(statsd.host, "172.17.0.1")
+        self.assertEqual(mock_get_default_route.call_count, 1)
+
+        # A forked child resolves the default route again.
+        statsd.pre_fork()
+        statsd.post_fork_child()
+        self.assertEqual(mock_get_default_route.call_count, 1)
+        self.assertEqual(statsd.host, "172.17.0.1")
+        self.assertEqual(mock_get_default_route.call_count, 2)
+
+        # An explicit host overrides the default route.
+        statsd.host = "myhost"
+        statsd.pre_fork()
+        statsd.post_fork_child()
+        self.assertEqual(statsd.host, "myhost")
+        self.assertEqual(mock_get_default_route.call_count, 2)
+
+    @patch("datadog.dogstatsd.base.get_container_id", return_value="ci-fake-container-id")
+    def test_container_id_resolved_lazily(self, mock_get_container_id):
+        with EnvVars(ignore=["DD_ORIGIN_DETECTION_ENABLED"]):
+            statsd = DogStatsd(disable_telemetry=True, track_instance=False)
+        statsd.socket = FakeSocket()
+        mock_get_container_id.assert_not_called()
+
+        statsd.gauge("gauge", 1)
+        statsd.gauge("gauge", 2)
+        self.assertEqual(statsd.socket.recv(no_wait=True), "gauge:1|g|c:ci-fake-container-id\n")
+        self.assertEqual(statsd.socket.recv(no_wait=True), "gauge:2|g|c:ci-fake-container-id\n")
+        self.assertEqual(mock_get_container_id.call_count, 1)
+
+        # A forked child resolves the container ID again.
+        statsd.pre_fork()
+        statsd.post_fork_child()
+        self.assertEqual(mock_get_container_id.call_count, 1)
+        statsd.socket = FakeSocket()
+        statsd.gauge("gauge", 3)
+        self.assertEqual(statsd.socket.recv(no_wait=True), "gauge:3|g|c:ci-fake-container-id\n")
+        self.assertEqual(mock_get_container_id.call_count, 2)
+
+    @patch("datadog.dogstatsd.base.get_container_id")
+    def test_container_id_not_resolved_when_disabled(self, mock_get_container_id):
+        statsd = DogStatsd(origin_detection_enabled=False, disable_telemetry=True, track_instance=False)
+        statsd.socket = FakeSocket()
+        statsd.gauge("gauge", 1)
+        self.assertEqual(statsd.socket.recv(no_wait=True), "gauge:1|g\n")
+
+        statsd = DogStatsd(container_id="fake-container-id", disable_telemetry=True, track_instance=False)
+        statsd.socket = FakeSocket()
+        statsd.gauge("gauge", 1)
+        statsd.pre_fork()
+        statsd.post_fork_child()
+        self.assertEqual(statsd._container_id, "fake-container-id")
+        mock_get_container_id.assert_not_called()
+
     def test_set(self):
         self.statsd.set('set', 123)
         self.assert_equal_telemetry('set:123|s\n', self.recv(2))
@@ -2349,6 +2409,45 @@ async def print_foo():
         )
         self.statsd._container_id = None
 
+    def test_service_check_coalesced(self):
+        statsd = DogStatsd(
+            disable_aggregation=False,
+            disable_telemetry=True,
+            coalesce_service_checks=True,
+            track_instance=False,
+        )
+        fake_socket = FakeSocket()
+        statsd.socket = fake_socket
+        for status in (statsd.CRITICAL, statsd.WARNING, statsd.OK):
+            statsd.service_check("my_check.name", status, tags=["env:prod"])
+        statsd.service_check("my_check.name", statsd.WARNING, tags=["env:dev"])
+        self.assertEqual(0, len(fake_socket.payloads))
+
+        statsd.flush_aggregated_metrics()
+        self.assertEqual(u"_sc|my_check.name|0|#env:prod\n", fake_socket.recv(no_wait=True))
+        self.assertEqual(u"_sc|my_check.name|1|#env:dev\n", fake_socket.recv(no_wait=True))
+        self.assertIsNone(fake_socket.recv(no_wait=True))
+        statsd.stop()
+
+    def test_service_check_not_coalesced_without_aggregation(self):
+        statsd = DogStatsd(disable_telemetry=True, coalesce_service_checks=True, track_instance=False)
+        fake_socket = FakeSocket()
+        statsd.socket = fake_socket
+        statsd.service_check("my_check.name", statsd.CRITICAL)
+        statsd.service_check("my_check.name", statsd.OK)
+        self.assertEqual(u"_sc|my_check.name|2\n", fake_socket.recv(no_wait=True))
+        self.assertEqual(u"_sc|my_check.name|0\n", fake_socket.recv(no_wait=True))
+
+    def test_event_and_service_check_constant_tags_update(self):
+        statsd = DogStatsd(disable_telemetry=True, constant_tags=["foo"], track_instance=False)
+        fake_socket = FakeSocket()
+        statsd.socket = fake_socket
+        statsd.constant_tags.append("bar:baz")
+        statsd.event("Title", "Text", tags=["t1"])
+        statsd.service_check("my_check.name", statsd.OK)
+        self.assertEqual(u"_e{5,4}:Title|Text|#t1,foo,bar:baz\n", fake_socket.recv(no_wait=True))
+        self.assertEqual(u"_sc|my_check.name|0|#foo,bar:baz\n", fake_socket.recv(no_wait=True))
+
     def test_service_check_with_container_field(self):
         self.statsd._container_id = "ci-fake-container-id"
         now = int(time.time())
@@ -2464,6 +2563,80 @@ async def print_foo():
         t.join(timeout=5)
         self.assertFalse(t.is_alive())
 
+    def test_pre_fork_flushes_by_default(self):
+        statsd = DogStatsd(disable_aggregation=False, disable_telemetry=True, track_instance=False)
+        fake_socket = FakeSocket()
+        statsd.socket = fake_socket
+        statsd.gauge("page.views", 123)
+
+        statsd.pre_fork()
+        self.assertIsNone(statsd._flush_thread)
+        self.assertEqual("page.views:123|g\n", fake_socket.recv(no_wait=True))
+        statsd.post_fork_parent()
+
+        self.assertIsNotNone(statsd._flush_thread)
+        statsd.stop()
+
+    def test_fork_without_flush_keeps_parent_running(self):
+        statsd = DogStatsd(
+            disable_aggregation=False,
+            disable_telemetry=True,
+            disable_background_sender=False,
+            track_instance=False,
+            flush_on_fork=False,
+        )
+        fake_socket = FakeSocket()
+        statsd.socket = fake_socket
+        statsd.gauge("page.views", 123)
+        flush_thread = statsd._flush_thread
+        sender_thread = statsd._sender_thread
+
+        statsd.pre_fork()
+        statsd.post_fork_parent()
+
+        # Nothing was flushed, and the same threads are still running.
+        self.assertEqual(0, len(fake_socket.payloads))
+        self.assertIs(flush_thread, statsd._flush_thread)
+        self.assertIs(sender_thread, statsd._sender_thread)
+        self.assertTrue(flush_thread.is_alive())
+        self.assertEqual(1, len(statsd.aggregator.metrics_map["g"]))
+
+        statsd.stop()
+        self.assertEqual("page.views:123|g\n", fake_socket.recv(no_wait=True))
+
+    def test_fork_without_flush_resets_child(self):
+        statsd = DogStatsd(
+            disable_aggregation=False,
+            disable_buffering=False,
+            disable_background_sender=False,
+            track_instance=False,
+            flush_on_fork=False,
+        )
+        fake_socket = FakeSocket()
+        statsd.socket = fake_socket
+        statsd.gauge("page.views", 123)
+        statsd.histogram("latency", 1)
+        old_aggregator = statsd.aggregator
+        old_queue = statsd._queue
+        old_flush_thread = statsd._flush_thread
+
+        # Simulate the child side of a fork: pre_fork() ran in the parent.
+        statsd.pre_fork()
+        statsd.post_fork_child()
+
+        self.assertIsNot(old_aggregator, statsd.aggregator)
+        self.assertEqual(0, len(statsd.aggregator.metrics_map["g"]))
+        self.assertEqual(0, len(statsd.aggregator.max_sample_metric_map["h"].values))
+        self.assertIsNone(statsd.socket)
+        self.assertEqual(0, statsd.metrics_count)
+        self.assertIsNotNone(statsd._queue)
+        self.assertIsNot(old_queue, statsd._queue)
+        self.assertIsNot(old_flush_thread, statsd._flush_thread)
+
+        statsd.stop()
+        old_flush_thread.join(timeout=5)
+        self.assertEqual(0, len(fake_socket.payloads))
+
     def test_fake_sockets(self):
         """
         To support legacy behavior wherein customers were able to set sockets directly as long as they supported a .send interface, 
@@ -0,0 +1,69 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+import subprocess
+import sys
+import unittest
+
+
+class TestImport(unittest.TestCase):
+    """
+    `import datadog` must stay cheap: the API client, its HTTP libraries and
+    ThreadStats are only imported when first used.
+    """
+
+    LAZY_MODULES = [
+        "datadog.api",
+        "datadog.threadstats",
+        "datadog.util.hostname",
+        "requests",
+        "urllib3",
+    ]
+
+    def _imported_modules(self, code):
+        process = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-c", code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        _, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0, stderr)
+
+        # Lines look like: "import time:       285 |      39700 |     datadog.dogstatsd"
+        modules = set()
+        for line in stderr.decode("utf-8").splitlines():
+            if not line.startswith("import time:"):
+                continue
+            module = line.rsplit("|", 1)[-1].strip()
+            modules.add(module)
+        return modules
+
+    @unittest.skipIf(sys.version_info[:2] < (3, 7), "lazy imports require Python 3.7+")
+    def test_import_datadog_is_lazy(self):
+        modules = self._imported_modules("import datadog")
+        self.assertIn("datadog.dogstatsd.base", modules)
+        for module in self.LAZY_MODULES:
+            self.assertNotIn(module, modules)
+
+    @unittest.skipIf(sys.version_info[:2] < (3, 7), "lazy imports require Python 3.7+")
+    def test_import_datadog_api_defers_http_libraries(self):
+        modules = self._imported_modules("import datadog.api")
+        self.assertIn("datadog.api.monitors", modules)
+        self.assertNotIn("requests", modules)
+        self.assertNotIn("urllib3", modules)
+
+    def test_lazy_attributes(self):
+        import datadog
+        from datadog import ThreadStats, datadog_lambda_wrapper, get_hostname, lambda_metric
+        from datadog.api.monitors import Monitor
+        from datadog.threadstats import base, aws_lambda
+        from datadog.util import hostname
+
+        self.assertIs(datadog.api.Monitor, Monitor)
+        self.assertIs(ThreadStats, base.ThreadStats)
+        self.assertIs(datadog_lambda_wrapper, aws_lambda.datadog_lambda_wrapper)
+        self.assertIs(lambda_metric, aws_lambda.lambda_metric)
+        self.assertIs(get_hostname, hostname.get_hostname)
+
+        with self.assertRaises(AttributeError):
+            datadog.not_an_attribute
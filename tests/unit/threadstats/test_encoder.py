@@ -0,0 +1,126 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+import json
+import unittest
+import zlib
+
+from mock import patch
+
+from datadog import ThreadStats
+from datadog.api.api_client import EncodedBody
+from datadog.threadstats.encoder import SeriesEncoder
+from datadog.threadstats.reporters import HttpReporter
+
+
+def rolled_up(name, value=1.5, tags=None, host=None, metric_type="gauge"):
+    return (1000.0, value, name, tags, host, metric_type, 10)
+
+
+def decode(payload):
+    data = zlib.decompress(payload.data) if payload.compressed else payload.data
+    return json.loads(data.decode("ascii"))["series"]
+
+
+class TestSeriesEncoder(unittest.TestCase):
+
+    def test_matches_dict_payloads(self):
+        encoder = SeriesEncoder(namespace="ns", constant_tags=["env:test"], device="sda", host_name="myhost")
+        encoder.add(*rolled_up("a", tags=["a:b", u"caf\xe9"], host="h"))
+        encoder.add(*rolled_up("b", value=3, tags=None, host=""))
+        encoder.add(*rolled_up("c", value=[1, 2.5], tags=[], host=None, metric_type="distribution"))
+        payloads = encoder.finish()
+
+        assert len(payloads) == 1
+        assert not payloads[0].compressed
+        series = [
+            {"metric": "ns.a", "points": [[1000.0, 1.5]], "type": "gauge", "host": "h", "device": "sda",
+             "tags": ["a:b", u"caf\xe9", "env:test"], "interval": 10},
+            {"metric": "ns.b", "points": [[1000.0, 3.0]], "type": "gauge", "host": "myhost", "device": "sda",
+             "tags": ["env:test"], "interval": 10},
+            {"metric": "ns.c", "points": [[1000.0, [1.0, 2.5]]], "type": "distribution", "host": None,
+             "device": "sda", "tags": ["env:test"], "interval": 10},
+        ]
+        assert payloads[0].data == json.dumps({"series": series}).encode("ascii")
+
+    def test_tags_and_host_without_defaults(self):
+        encoder = SeriesEncoder()
+        encoder.add(*rolled_up("a", tags=None, host=""))
+        encoder.add(*rolled_up("b", tags=[], host=None))
+        assert [(s["tags"], s["host"], s["device"]) for s in decode(encoder.finish()[0])] == [
+            (None, "", None),
+            ([], None, None),
+        ]
+
+    def test_special_values(self):
+        encoder = SeriesEncoder()
+        encoder.add(*rolled_up("a", value=float("nan")))
+        encoder.add(*rolled_up("b", value=float("inf")))
+        encoder.add(*rolled_up("c", value=float("-inf")))
+        data = encoder.finish()[0].data.decode("ascii")
+        assert data.count("NaN") == 1
+        assert data.count("-Infinity") == 1
+        assert data.count("Infinity") == 2
+
+    def test_compression(self):
+        encoder = SeriesEncoder(compress=True)
+        for i in range(10000):
+            encoder.add(*rolled_up("metric.{}".format(i)))
+        payloads = encoder.finish()
+
+        assert len(payloads) == 1
+        assert payloads[0].compressed
+        assert [s["metric"] for s in decode(payloads[0])] == ["metric.{}".format(i) for i in range(10000)]
+
+    def test_chunking(self):
+        encoder = SeriesEncoder(max_series=4)
+        for i in range(10):
+            encoder.add(*rolled_up("m{}".format(i)))
+        assert [len(decode(p)) for p in encoder.finish()] == [4, 4, 2]
+        assert encoder.series_count == 10
+
+        encoder = SeriesEncoder()
+        encoder.add(*rolled_up("m0"))
+        size = len(encoder.finish()[0].data)
+        # Room for two series per payload, but not three
+        encoder = SeriesEncoder(max_payload_size=2 * size)
+        for i in range(5):
+            encoder.add(*rolled_up("m{}".format(i)))
+        payloads = encoder.finish()
+        assert [len(decode(p)) for p in payloads] == [2, 2, 1]
+        assert all(len(p.data) <= 2 * size for p in payloads)
+
+        # Oversized series are sent on their own
+        encoder = SeriesEncoder(max_payload_size=10)
+        for i in range(3):
+            encoder.add(*rolled_up("m{}".format(i)))
+        assert [len(decode(p)) for p in encoder.finish()] == [1, 1, 1]
+
+        assert SeriesEncoder().finish() == []
+
+
+class TestEncodedSeriesFlush(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("datadog.threadstats.reporters.APIClient")
+        self.api_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.api_client.submit.return_value = {"status": "ok"}
+
+    def test_threadstats_flush(self):
+        stats = ThreadStats(namespace="ns", constant_tags=["env:test"])
+        stats.start(flush_in_thread=False)
+        stats.reporter = HttpReporter(compress_payload=True, max_series_per_payload=2)
+        for i in range(3):
+            stats.gauge("gauge.{}".format(i), i, timestamp=100)
+        stats.distribution("dist", 1, timestamp=100)
+        stats.flush(200)
+
+        posts = [(c[0][1], c[1]["body"]) for c in self.api_client.submit.call_args_list]
+        assert all(isinstance(body, EncodedBody) and body.compressed for _, body in posts)
+        assert sorted((path, [s["metric"] for s in decode(body)]) for path, body in posts) == [
+            ("distribution_points", ["ns.dist"]),
+            ("series", ["ns.gauge.0", "ns.gauge.1"]),
+            ("series", ["ns.gauge.2"]),
+        ]
+        assert stats.flush_count == 2
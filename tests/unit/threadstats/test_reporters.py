@@ -0,0 +1,403 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import weakref
+import zlib
+
+from mock import Mock, call, patch
+
+from datadog import ThreadStats
+from datadog.api.exceptions import HttpTimeout
+from datadog.dogstatsd.base import DogStatsd
+from datadog.threadstats.reporters import (
+    BackgroundHttpReporter,
+    DogStatsdReporter,
+    HttpReporter,
+    _background_reporters,
+    _encode_series,
+    _stop_background_reporters,
+)
+
+
+def metric(name):
+    return {"metric": name, "points": [[100, 1.0]], "type": "gauge", "host": None, "tags": None}
+
+
+def decode(body):
+    """ Series of an encoded payload. """
+    data = zlib.decompress(body.data) if body.compressed else body.data
+    return json.loads(data.decode("utf-8"))["series"]
+
+
+def patch_api(test_case):
+    patcher = patch("datadog.threadstats.reporters.api")
+    api = patcher.start()
+    test_case.addCleanup(patcher.stop)
+    api._host_name = "myhost"
+    api.Metric._METRIC_SUBMIT_ENDPOINT = "series"
+    api.Distribution._resource_name = "distribution_points"
+    patcher = patch("datadog.threadstats.reporters.APIClient.submit", return_value={"status": "ok"})
+    submit = patcher.start()
+    test_case.addCleanup(patcher.stop)
+    return api, submit
+
+
+class TestHttpReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.api, self.submit = patch_api(self)
+
+    def test_encode_series(self):
+        series = [dict(metric("m{}".format(i)), host="h") for i in range(10)]
+        payloads = _encode_series(series, 4, 10000)
+        assert [len(decode(p)) for p in payloads] == [4, 4, 2]
+        assert sum((decode(p) for p in payloads), []) == series
+        assert len(payloads[0].data) == len(json.dumps({"series": series[:4]}))
+
+        size = len(json.dumps({"series": series[:3]}))
+        assert [len(decode(p)) for p in _encode_series(series, 100, size)] == [3, 3, 3, 1]
+        # Oversized series are sent on their own
+        assert [len(decode(p)) for p in _encode_series(series, 100, 10)] == [1] * 10
+        assert _encode_series([], 100, 10) == []
+
+        # Series with an empty host get the host name, which counts too
+        hostless = [dict(metric("m{}".format(i)), host="") for i in range(10)]
+        size = len(json.dumps({"series": [dict(s, host="x" * 20) for s in hostless[:3]]}))
+        assert [len(decode(p)) for p in _encode_series(hostless, 100, size, "x" * 20)] == [3, 3, 3, 1]
+        assert [len(decode(p)) for p in _encode_series(hostless, 100, size, "x" * 21)] == [2, 2, 2, 2, 2]
+        assert decode(_encode_series(hostless[:1], 100, size, "myhost", compress=True)[0]) == [
+            dict(hostless[0], host="myhost")
+        ]
+
+    def test_single_payload(self):
+        reporter = HttpReporter(compress_payload=True)
+        series = [metric("a"), metric("b")]
+        assert reporter.flush_metrics(series) == {"status": "ok"}
+        (method, path), kwargs = self.submit.call_args
+        assert (method, path) == ("POST", "series")
+        assert kwargs["body"].compressed
+        assert decode(kwargs["body"]) == series
+        # Spooled if the API can't be reached
+        assert kwargs["spool"] is True
+
+    def test_chunked_payloads(self):
+        posting = []
+        concurrency = []
+        lock = threading.Lock()
+
+        def submit(method, path, body, spool):
+            chunk = decode(body)
+            with lock:
+                posting.append(chunk)
+                concurrency.append(len(posting))
+            time.sleep(0.01)
+            with lock:
+                posting.remove(chunk)
+            return {"errors": ["Invalid"]} if chunk[0]["metric"] == "m6" else {"status": "ok"}
+
+        self.submit.side_effect = submit
+        reporter = HttpReporter(max_series_per_payload=2, max_concurrent_requests=3)
+        series = [metric("m{}".format(i)) for i in range(10)]
+        assert reporter.flush_distributions(series) == {"errors": ["Invalid"]}
+
+        assert set(c[0][1] for c in self.submit.call_args_list) == {"distribution_points"}
+        chunks = sorted(decode(c[1]["body"])[0]["metric"] for c in self.submit.call_args_list)
+        assert chunks == ["m0", "m2", "m4", "m6", "m8"]
+        assert max(concurrency) == 3
+
+        # The helper threads are reused from one flush to the next
+        executor = reporter._executor
+        assert reporter.flush_distributions(series) == {"errors": ["Invalid"]}
+        assert reporter._executor is executor
+
+    def test_supports_encoded_series(self):
+        class FilteringReporter(HttpReporter):
+            def flush_metrics(self, metrics):
+                return super(FilteringReporter, self).flush_metrics([m for m in metrics if m["metric"] != "b"])
+
+        class EncodingReporter(FilteringReporter):
+            supports_encoded_series = True
+
+        assert HttpReporter().supports_encoded_series
+        # The encoded path would skip the overridden method
+        assert not FilteringReporter().supports_encoded_series
+        assert EncodingReporter().supports_encoded_series
+        assert not BackgroundHttpReporter().supports_encoded_series
+
+        stats = ThreadStats()
+        stats.start(flush_in_thread=False, reporter=FilteringReporter())
+        stats.gauge("a", 1, timestamp=100)
+        stats.gauge("b", 1, timestamp=100)
+        stats.flush(200)
+        assert [m["metric"] for m in decode(self.submit.call_args[1]["body"])] == ["a"]
+
+    def test_chunked_payloads_exception(self):
+        self.submit.side_effect = [{"status": "ok"}, HttpTimeout("POST", "url", 10), {"status": "ok"}]
+        reporter = HttpReporter(max_series_per_payload=1, max_concurrent_requests=1)
+        with self.assertRaises(HttpTimeout):
+            reporter.flush_metrics([metric("a"), metric("b"), metric("c")])
+        assert self.submit.call_count == 3
+
+
+class TestBackgroundHttpReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.api, self.submit = patch_api(self)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def make_reporter(self, **kwargs):
+        kwargs.setdefault("retry_backoff", 0.01)
+        kwargs.setdefault("disable_telemetry", True)
+        reporter = BackgroundHttpReporter(**kwargs)
+        self.addCleanup(reporter.stop)
+        return reporter
+
+    def block_sends(self):
+        """ Make the worker wait on the returned event before each metrics post. """
+        release = threading.Event()
+        sending = threading.Event()
+
+        def send(*args, **kwargs):
+            sending.set()
+            release.wait(5)
+            return {"status": "ok"}
+
+        self.submit.side_effect = send
+        return sending, release
+
+    def sent(self, path):
+        return [decode(c[1]["body"]) for c in self.submit.call_args_list if c[0][1] == path]
+
+    def sent_metrics(self):
+        return [[m["metric"] for m in series] for series in self.sent("series")]
+
+    def test_posts_from_worker(self):
+        reporter = self.make_reporter(compress_payload=True)
+        reporter.flush_metrics([metric("a"), metric("b")])
+        reporter.flush_distributions([metric("dist")])
+        reporter.flush_events([{"title": "one"}, {"title": "two"}])
+        assert reporter.wait_for_pending(5)
+
+        assert self.sent("series") == [[metric("a"), metric("b")]]
+        assert self.sent("distribution_points") == [[metric("dist")]]
+        assert all(c[1]["body"].compressed for c in self.submit.call_args_list)
+        assert [c[1] for c in self.api.Event.create.call_args_list] == [{"title": "one"}, {"title": "two"}]
+        assert reporter.batches_sent == 4
+        assert reporter._worker.name == "BackgroundHttpReporter_worker"
+
+    def test_retries_failures(self):
+        self.submit.side_effect = [
+            HttpTimeout("POST", "url", 10),
+            # Muted connection error
+            {"errors": "Could not request POST url: connection refused"},
+            {"status": "ok"},
+        ]
+        reporter = self.make_reporter()
+        reporter.flush_metrics([metric("a")])
+        assert reporter.wait_for_pending(5)
+
+        assert self.submit.call_count == 3
+        assert (reporter.batches_sent, reporter.batches_retried, reporter.batches_dropped) == (1, 2, 0)
+
+    def test_api_errors_are_not_retried(self):
+        self.submit.return_value = {"errors": ["Invalid metric"]}
+        reporter = self.make_reporter()
+        reporter.flush_metrics([metric("a")])
+        assert reporter.wait_for_pending(5)
+
+        assert self.submit.call_count == 1
+        assert reporter.batches_retried == 0
+
+    def test_drops_after_max_retries(self):
+        self.submit.side_effect = HttpTimeout("POST", "url", 10)
+        reporter = self.make_reporter(max_retries=2)
+        reporter.flush_metrics([metric("a")])
+        assert reporter.wait_for_pending(5)
+
+        assert self.submit.call_count == 3
+        assert (reporter.batches_sent, reporter.batches_retried, reporter.batches_dropped) == (0, 2, 1)
+        # Spooled once, by the last attempt
+        assert [c[1]["spool"] for c in self.submit.call_args_list] == [False, False, True]
+
+    def test_drops_when_queue_is_full(self):
+        sending, release = self.block_sends()
+        reporter = self.make_reporter(max_queue_size=1, disable_telemetry=False)
+        reporter.flush_metrics([metric("a")])
+        assert sending.wait(5)
+        reporter.flush_metrics([metric("b")])
+        reporter.flush_metrics([metric("c")])
+        assert reporter.batches_dropped == 1
+
+        release.set()
+        assert reporter.wait_for_pending(5)
+        reporter.flush_metrics([metric("d")])
+        assert reporter.wait_for_pending(5)
+        # Dropped batches are reported once, with the next flush
+        assert self.sent_metrics() == [["a"], ["b"], ["d", "datadog.threadstats.reporter.batches_dropped"]]
+        reporter.flush_metrics([metric("e")])
+        assert reporter.wait_for_pending(5)
+        assert self.sent_metrics()[-1] == ["e"]
+
+    def test_spills_when_queue_is_full(self):
+        spill_path = os.path.join(self.tmp_dir, "spill")
+        sending, release = self.block_sends()
+        reporter = self.make_reporter(max_queue_bytes=100, spill_path=spill_path)
+        reporter.flush_metrics([metric("a")])
+        assert sending.wait(5)
+        reporter.flush_metrics([metric("b")])
+        reporter.flush_metrics([metric("c")])
+        reporter.flush_metrics([metric("d")])
+        assert (reporter.batches_spilled, reporter.batches_dropped) == (2, 0)
+        with open(spill_path) as spill_file:
+            assert [line.split(" ")[0] for line in spill_file] == ["metrics", "metrics"]
+
+        release.set()
+        assert reporter.wait_for_pending(5)
+        assert self.sent_metrics() == [["a"], ["b"], ["c"], ["d"]]
+        assert not os.path.exists(spill_path)
+
+    def test_drops_batches_larger_than_queue(self):
+        spill_path = os.path.join(self.tmp_dir, "spill")
+        reporter = self.make_reporter(max_queue_bytes=100, spill_path=spill_path)
+        reporter.flush_metrics([dict(metric("a"), tags=["tag:" + "x" * 100])])
+        assert reporter.wait_for_pending(0.5)
+        assert (reporter.batches_spilled, reporter.batches_dropped) == (0, 1)
+        assert not os.path.exists(spill_path)
+        assert not self.submit.called
+
+        # Also when left over by a previous process, which can't be queued either
+        with open(spill_path, "wb") as spill_file:
+            spill_file.write(b"metrics " + b"x" * 200 + b"\n")
+        reporter = self.make_reporter(max_queue_bytes=100, spill_path=spill_path)
+        assert reporter.wait_for_pending(0.5)
+        assert reporter.batches_dropped == 1
+        assert not self.submit.called
+
+    def test_replays_spill_of_previous_process(self):
+        spill_path = os.path.join(self.tmp_dir, "spill")
+        reporter = self.make_reporter(max_queue_size=0, spill_path=spill_path)
+        reporter.flush_metrics([metric("a")])
+        reporter.stop()
+        assert not self.submit.called
+
+        reporter = self.make_reporter(spill_path=spill_path)
+        assert reporter.wait_for_pending(5)
+        assert self.sent_metrics() == [["a"]]
+
+    def test_stop(self):
+        reporter = self.make_reporter()
+        reporter.flush_metrics([metric("a")])
+        reporter.stop()
+        assert not reporter._worker.is_alive()
+        reporter.flush_metrics([metric("b")])
+
+        assert self.sent_metrics() == [["a"]]
+        assert reporter.batches_dropped == 1
+
+    def test_idle_reporter_is_released(self):
+        # Not stopped on cleanup, which would keep a reference to it
+        reporter = BackgroundHttpReporter(disable_telemetry=True)
+        reporter.WORKER_IDLE_TIMEOUT = 0.01
+        reporter.flush_metrics([metric("a")])
+        assert reporter.wait_for_pending(5)
+        worker = reporter._worker
+        worker.join(5)
+        assert not worker.is_alive()
+
+        # Started again by the next batch
+        reporter.flush_metrics([metric("b")])
+        assert reporter.wait_for_pending(5)
+        assert self.sent_metrics() == [["a"], ["b"]]
+        reporter._worker.join(5)
+
+        reporter_ref = weakref.ref(reporter)
+        del reporter
+        gc.collect()
+        assert reporter_ref() is None
+
+    def test_stopped_at_exit(self):
+        reporters = [self.make_reporter(), self.make_reporter()]
+        assert set(reporters) <= set(_background_reporters)
+        reporters[0].flush_metrics([metric("a")])
+        _stop_background_reporters()
+        assert self.sent_metrics() == [["a"]]
+        assert all(reporter._stop_event.is_set() for reporter in reporters)
+
+    def test_threadstats_flush_in_background(self):
+        stats = ThreadStats()
+        stats.start(flush_in_thread=False, flush_in_background=True)
+        self.addCleanup(stats.reporter.stop)
+        stats.gauge("gauge", 1, timestamp=100)
+        stats.flush(200)
+        assert isinstance(stats.reporter, BackgroundHttpReporter)
+        assert stats.reporter.wait_for_pending(5)
+        assert self.sent_metrics() == [["gauge"]]
+
+
+class FakeSocket(object):
+    def __init__(self):
+        self.payloads = []
+
+    def send(self, payload):
+        self.payloads.append(payload.decode("utf-8"))
+
+
+class TestDogStatsdReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.statsd = Mock(spec=DogStatsd)
+        self.reporter = DogStatsdReporter(self.statsd)
+
+    def test_metrics(self):
+        self.reporter.flush_metrics([
+            {"metric": "gauge", "points": [[100.0, 2.5]], "type": "gauge", "host": None, "device": None,
+             "tags": ["a:b"], "interval": 10},
+            {"metric": "rate", "points": [[100.0, 0.3]], "type": "rate", "host": "myhost", "device": "sda",
+             "tags": None, "interval": 10},
+        ])
+        assert self.statsd.method_calls == [
+            call.gauge_with_timestamp("gauge", 2.5, 100, tags=["a:b"]),
+            call.count_with_timestamp("rate", 3.0, 100, tags=["host:myhost", "device:sda"]),
+            call.flush(),
+        ]
+
+    def test_distributions(self):
+        self.reporter.flush_distributions([
+            {"metric": "dist", "points": [[100.0, [1, 2]]], "type": "distribution", "host": None, "device": None,
+             "tags": ["a:b"], "interval": 10},
+        ])
+        assert self.statsd.method_calls == [
+            call.distribution("dist", 1, tags=["a:b"]),
+            call.distribution("dist", 2, tags=["a:b"]),
+            call.flush(),
+        ]
+
+    def test_events(self):
+        self.reporter.flush_events([{"title": "title", "text": "message", "host": "myhost", "alert_type": "error"}])
+        assert self.statsd.method_calls == [
+            call.event("title", "message", hostname="myhost", alert_type="error"),
+            call.flush(),
+        ]
+
+    def test_threadstats(self):
+        statsd = DogStatsd(telemetry_min_flush_interval=0, disable_telemetry=True)
+        statsd.socket = FakeSocket()
+        stats = ThreadStats(constant_tags=["env:test"])
+        stats.start(flush_in_thread=False, reporter=DogStatsdReporter(statsd))
+        stats.increment("counter", 4, timestamp=1000)
+        stats.gauge("gauge", 1.5, timestamp=1001)
+        stats.flush(2000)
+
+        assert sorted(statsd.socket.payloads) == [
+            "counter:4.0|c|#env:test|T1000\n",
+            "gauge:1.5|g|#env:test|T1000\n",
+        ]
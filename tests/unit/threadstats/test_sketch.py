@@ -0,0 +1,54 @@
+# Unless explicitly stated otherwise all files in this repository are licensed under the BSD-3-Clause License.
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2015-Present Datadog, Inc
+import random
+import unittest
+
+from datadog.threadstats.sketch import DDSketch
+
+
+class TestDDSketch(unittest.TestCase):
+
+    def assert_relative_error(self, value, expected, accuracy):
+        assert abs(value - expected) <= abs(expected) * accuracy, "%s %s" % (value, expected)
+
+    def test_empty(self):
+        assert DDSketch().quantile(0.5) is None
+
+    def test_quantiles(self):
+        sketch = DDSketch(0.02)
+        values = [random.uniform(-1000, 1000) for _ in range(10000)] + [0] * 100
+        for value in values:
+            sketch.add(value)
+        values.sort()
+
+        assert sketch.count == len(values)
+        assert sketch.zero_count == 100
+        for q in (0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1):
+            expected = values[int(q * (len(values) - 1))]
+            self.assert_relative_error(sketch.quantile(q), expected, 0.02)
+
+    def test_merge(self):
+        merged, other, full = DDSketch(), DDSketch(), DDSketch()
+        for value in range(1, 1001):
+            (merged if value % 2 else other).add(value)
+            full.add(value)
+        merged.merge(other)
+
+        assert merged.count == 1000
+        for q in (0.1, 0.5, 0.95):
+            assert merged.quantile(q) == full.quantile(q)
+
+        with self.assertRaises(ValueError):
+            merged.merge(DDSketch(0.05))
+
+    def test_bounded_bins(self):
+        sketch = DDSketch(0.01, max_bins=100)
+        for exponent in range(-50, 51):
+            sketch.add(10 ** exponent)
+
+        assert len(sketch.positives.bins) <= 100
+        assert sketch.positives.count == 101
+        # The highest values keep their accuracy, lower ones are collapsed into the lowest bucket
+        self.assert_relative_error(sketch.quantile(1), 1e50, 0.01)
+        assert sketch.quantile(0) == sketch.quantile(0.99) < 1e50
@@ -9,6 +9,7 @@ Tests for the ThreadStats class, using HTTP mode
 import logging
 import os
 import random
+import threading
 import time
 import unittest
 
@@ -18,6 +19,7 @@ from mock import patch
 # datadog
 from datadog import ThreadStats, lambda_metric, datadog_lambda_wrapper
 from datadog.threadstats.aws_lambda import _get_lambda_stats
+from datadog.threadstats.metrics import Counter, Gauge, Histogram, MetricsAggregator, Set, _IntervalBuckets
 from tests.util.contextmanagers import preserve_environment_variable, EnvVars
 
 # Silence the logger.
@@ -318,6 +320,52 @@ class TestUnitThreadStats(unittest.TestCase):
         assert_almost_equal(p95['points'][0][1], 95, 8)
         assert_almost_equal(p99['points'][0][1], 99, 8)
 
+    def test_histogram_sketch_percentiles(self):
+        dog = ThreadStats(percentiles=[0.5, 0.9, 0.999], relative_accuracy=0.01)
+        dog.start(roll_up_interval=10, flush_in_thread=False)
+        reporter = dog.reporter = MemoryReporter()
+        values = list(range(1, 100001))
+        random.shuffle(values)  # in place
+        for i in values:
+            dog.histogram('percentiles', i, 1000.0)
+        dog.timing('timing', 42, 1000.0)
+        dog.flush(2000.0)
+
+        metrics = {m['metric']: m['points'][0][1] for m in reporter.metrics}
+        assert len(metrics) == 14
+        assert metrics['percentiles.count'] == 10000
+        assert metrics['percentiles.min'] == 1
+        assert metrics['percentiles.max'] == 100000
+        for name, expected in (('50', 50000), ('90', 90000), ('99_9', 99900)):
+            value = metrics['percentiles.%spercentile' % name]
+            assert abs(value - expected) <= expected * 0.01, "%s %s" % (value, expected)
+        # Timings are histograms too
+        assert metrics['timing.99_9percentile'] == 42
+
+    def test_histogram_percentile_names(self):
+        dog = ThreadStats(percentiles=[0.01, 0.29, 0.99, 0.999, 1])
+        dog.start(roll_up_interval=10, flush_in_thread=False)
+        reporter = dog.reporter = MemoryReporter()
+        for i in range(1, 11):
+            dog.histogram('percentiles', i, 1000.0)
+        dog.flush(2000.0)
+
+        metrics = {m['metric']: m['points'][0][1] for m in reporter.metrics}
+        assert metrics['percentiles.1percentile'] == 1
+        assert metrics['percentiles.29percentile'] == 3
+        assert metrics['percentiles.99percentile'] == 10
+        assert metrics['percentiles.99_9percentile'] == 10
+        assert metrics['percentiles.100percentile'] == 10
+
+    def test_histogram_invalid_percentiles(self):
+        for percentiles in ([0], [1.5], [-0.5], [0.99, 0.99]):
+            with self.assertRaises(ValueError):
+                ThreadStats(percentiles=percentiles)
+
+    def test_histogram_sketch_invalid_accuracy(self):
+        with self.assertRaises(ValueError):
+            ThreadStats(relative_accuracy=1)
+
     def test_gauge(self):
         # Create some fake metrics.
         dog = ThreadStats()
@@ -861,3 +909,192 @@ class TestUnitThreadStats(unittest.TestCase):
 
         dists = self.sort_metrics(_get_lambda_stats().reporter.distributions)
         assert len(dists) == 2
+
+
+class TestUnitThreadStatsMetrics(unittest.TestCase):
+    """
+    Unit tests for the ThreadStats metric roll-ups.
+    """
+
+    def test_counter_running_sum(self):
+        counter = Counter('counter', None, None)
+        for _ in range(50000):
+            counter.add_point(1)
+        counter.add_point(-2)
+
+        assert counter.count == 49998
+        (metric,) = counter.flush(100, 10)
+        assert metric[1] == 4999.8
+
+    def test_histogram_running_aggregates(self):
+        histogram = Histogram('histogram', None, None)
+        values = [random.uniform(-100, 100) for _ in range(5000)]
+        for value in values:
+            histogram.add_point(value)
+
+        mean = sum(values) / len(values)
+        variance = sum((v - mean) ** 2 for v in values) / len(values)
+        assert histogram.count == len(values)
+        assert histogram.min == min(values)
+        assert histogram.max == max(values)
+        assert abs(histogram.sum - sum(values)) < 1e-6
+        assert abs(histogram.average() - mean) < 1e-9
+        assert abs(histogram.variance() - variance) < 1e-6
+        assert len(histogram.samples) == histogram.sample_size
+
+    def test_histogram_variance_is_stable(self):
+        # A naive sum of squares loses all precision with a large offset.
+        histogram = Histogram('histogram', None, None)
+        for value in (1e9 + 4, 1e9 + 7, 1e9 + 13, 1e9 + 16):
+            histogram.add_point(value)
+
+        assert histogram.average() == 1e9 + 10
+        assert histogram.variance() == 22.5
+
+    def test_empty_histogram(self):
+        histogram = Histogram('histogram', None, None)
+        assert histogram.flush(100, 10) == []
+        assert histogram.variance() == 0.0
+
+    def test_interval_buckets_overflow(self):
+        # Intervals 0 and 40 share a slot of a 4-bucket ring
+        buckets = _IntervalBuckets(10, 4)
+        buckets.get(40)['a'] = 1
+        buckets.get(0)['b'] = 2
+        buckets.get(10)['c'] = 3
+        assert list(buckets._overflow) == [0]
+
+        assert sorted(buckets.pop_expired(20)) == [(0, {'b': 2}), (10, {'c': 3})]
+        assert buckets._overflow == {}
+        assert buckets
+
+        assert buckets.pop_expired(float('inf')) == [(40, {'a': 1})]
+        assert not buckets
+
+    def test_interval_buckets_overflow_interval_stays_in_overflow(self):
+        buckets = _IntervalBuckets(10, 4)
+        buckets.get(0)['a'] = 1
+        buckets.get(40)['a'] = 2
+        assert buckets.pop_expired(10) == [(0, {'a': 1})]
+
+        # The slot is free again, but interval 40 is still pending in the overflow
+        assert buckets.get(40) == {'a': 2}
+
+    def test_aggregator_context_keys(self):
+        aggregator = MetricsAggregator(roll_up_interval=10)
+        aggregator.add_point('counter', ['b', 'a'], 5, 1, Counter)
+        aggregator.add_point('counter', ['a', 'b'], 5, 1, Counter)
+        aggregator.add_point('counter', ['b', 'a'], 5, 1, Counter)
+
+        assert aggregator.flush(10) == [(0, 0.3, 'counter', ['b', 'a'], None, 'rate', 10)]
+        assert aggregator._context_keys == {
+            ('counter', None, ('b', 'a')): ('counter', None, ('a', 'b')),
+            ('counter', None, ('a', 'b')): ('counter', None, ('a', 'b')),
+        }
+
+    def test_aggregator_merges_threads(self):
+        aggregator = MetricsAggregator(roll_up_interval=10)
+
+        def add_points(offset):
+            for value in range(offset, 1000, 4):
+                aggregator.add_point('counter', None, 5, 1, Counter)
+                aggregator.add_point('histogram', None, 5, value, Histogram)
+                aggregator.add_point('set', None, 5, value % 10, Set)
+
+        threads = [threading.Thread(target=add_points, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        aggregator.add_point('gauge', None, 5, 1, Gauge)
+        aggregator.add_point('counter', None, 25, 1, Counter)
+
+        metrics = {m[2]: m[1] for m in aggregator.flush(20)}
+        assert metrics['counter'] == 100
+        assert metrics['set'] == 10
+        assert metrics['gauge'] == 1
+        assert metrics['histogram.count'] == 100
+        assert metrics['histogram.min'] == 0
+        assert metrics['histogram.max'] == 999
+        assert abs(metrics['histogram.avg'] - 499.5) < 1e-9
+        assert abs(metrics['histogram.75percentile'] - 750) <= 1
+        assert aggregator.flush(float('inf')) == [(20, 0.1, 'counter', None, None, 'rate', 10)]
+
+    def test_aggregator_short_lived_threads(self):
+        aggregator = MetricsAggregator(roll_up_interval=10)
+
+        def add_points(value):
+            aggregator.add_point('histogram', ['a', 'b'], 5, value, Histogram)
+            aggregator.add_point('counter', None, 5, 1, Counter)
+
+        for batch in range(10):
+            threads = [threading.Thread(target=add_points, args=(batch * 50 + i,)) for i in range(50)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # Accumulators of exited threads are reused, so they don't outnumber the running threads
+        assert len(aggregator._accumulators) <= 50
+        for accumulator in aggregator._accumulators:
+            assert len(accumulator.buckets.get(0)) <= 2
+
+        metrics = {m[2]: m[1] for m in aggregator.flush(10)}
+        assert metrics['counter'] == 50
+        assert metrics['histogram.count'] == 50
+        assert metrics['histogram.min'] == 0
+        assert metrics['histogram.max'] == 499
+        # Once flushed, they are dropped
+        assert aggregator._accumulators == []
+        assert aggregator.flush(float('inf')) == []
+
+    def test_aggregator_thread_accumulators(self):
+        aggregator = MetricsAggregator(roll_up_interval=10)
+        added, done = threading.Event(), threading.Event()
+        count = [0]
+        count_lock = threading.Lock()
+
+        def add_point():
+            aggregator.add_point('counter', None, 5, 1, Counter)
+            with count_lock:
+                count[0] += 1
+                if count[0] == 16:
+                    added.set()
+            done.wait()
+
+        threads = [threading.Thread(target=add_point) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        added.wait()
+
+        # Running threads never share an accumulator
+        assert len(aggregator._accumulators) == 16
+        assert len(aggregator._spare_accumulators) == 0
+
+        # Points still pending in the accumulators of exited threads are flushed
+        done.set()
+        for thread in threads:
+            thread.join()
+        assert len(aggregator._spare_accumulators) == 16
+        aggregator.add_point('counter', None, 25, 1, Counter)
+        assert [m[1] for m in aggregator.flush(20)] == [1.6]
+        assert len(aggregator._accumulators) == 1
+        assert aggregator.flush(float('inf')) == [(20, 0.1, 'counter', None, None, 'rate', 10)]
+
+    def test_merge_metrics(self):
+        gauge, later_gauge = Gauge('gauge', None, None), Gauge('gauge', None, None)
+        later_gauge.add_point(2)
+        gauge.add_point(1)
+        later_gauge.merge(gauge)
+        assert later_gauge.value == 1
+
+        histogram, other = Histogram('histogram', None, None), Histogram('histogram', None, None)
+        full = Histogram('histogram', None, None)
+        for value in range(3000):
+            (histogram if value % 3 else other).add_point(value)
+            full.add_point(value)
+        histogram.merge(other)
+        assert histogram.count == 3000
+        assert histogram.sum == full.sum
+        assert abs(histogram.variance() - full.variance()) < 1e-6
+        assert len(histogram.samples) == histogram.sample_size